@@ -0,0 +1,176 @@
+"""Module for fetching moon data from the Astronomy API concurrently.
+
+This module provides an asyncio counterpart to `astro_client.fetch_moon_data`
+for fetching many locations and date ranges at once. All requests share a
+single HTTP session, so keep-alive connections and the authorization header
+are reused, and the number of requests in flight is bounded. The response
+store is read and written on worker threads, so its disk I/O does not stall
+the event loop, and a request that fails does not cancel the others.
+Responses are cached and returned in the same shape as
+`astro_client.fetch_moon_data`, so they can be passed straight to
+`astro_client.parse_transform_moon_data`.
+"""
+
+import asyncio
+
+import aiohttp
+
+from data_pipeline.api import astro_client
+from data_pipeline.utils import retry, utils
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30
+KEEPALIVE_TIMEOUT_SECONDS = 30
+
+
+async def fetch_moon_data(session,
+                          semaphore,
+                          latitude,
+                          longitude,
+                          from_date,
+                          to_date,
+                          time="00:00:00"):
+    """Fetches moon data for one location and date range using a session.
+
+    Timeouts, dropped connections and transient HTTP errors are retried
+    with exponential backoff and jitter.
+
+    Args:
+        session: The shared aiohttp.ClientSession to send the request with.
+        semaphore: An asyncio.Semaphore bounding the requests in flight.
+        latitude: Latitude of the location.
+        longitude: Longitude of the location.
+        from_date: Start date of the period for which to fetch data.
+        to_date: End date of the period.
+        time: Time of the day for which to fetch data. Defaults to "00:00:00".
+
+    Returns:
+        The fetched moon data or None if the fetch operation fails.
+    """
+    if latitude is None or longitude is None:
+        print(
+            "Latitude or Longitude is not provided. Aborting fetch operation."
+            )
+        return None
+
+    cache_kwargs = {
+        'from_date': from_date,
+        'to_date': to_date,
+        'time': time,
+        'latitude': latitude,
+        'longitude': longitude
+    }
+
+    cached_response = await asyncio.to_thread(
+        utils.load_cached_response, 'moon_data', **cache_kwargs)
+    if cached_response is not None:
+        return cached_response
+
+    params = astro_client.get_moon_request_params(latitude, longitude,
+                                                  from_date, to_date, time)
+    # aiohttp only accepts string query parameter values.
+    params = {key: str(value) for key, value in params.items()}
+
+    async def get_response_data():
+        # The semaphore is released while waiting to retry.
+        async with semaphore:
+            print(f"Fetching moon data for {latitude}, {longitude} "
+                  f"from {from_date} to {to_date}...")
+            async with session.get(astro_client.MOON_POSITIONS_URL,
+                                   params=params) as response:
+                if retry.is_transient_status(response.status):
+                    raise retry.TransientError(response.status)
+                if response.status == 200:
+                    return await response.json()
+
+                print(f"API Call Failed. Status Code: {response.status}")
+                print("Error response: ")
+                print(await response.text())
+                return None
+
+    try:
+        # Timeouts, dropped connections, rate limiting and server errors are
+        # retried with exponential backoff.
+        data = await retry.call_with_retry_async(
+            get_response_data,
+            transient_errors=(retry.TransientError, asyncio.TimeoutError,
+                              aiohttp.ClientConnectionError))
+    except retry.TransientError as e:
+        print(f"API Call Failed. {e}")
+        return None
+    except asyncio.TimeoutError:
+        print("The request timed out.")
+        return None
+    except aiohttp.ClientError as e:
+        print(f"An error occurred: {e}")
+        return None
+
+    if data is not None:
+        await asyncio.to_thread(utils.save_cached_response, data,
+                                'moon_data', **cache_kwargs)
+    return data
+
+
+async def _fetch_moon_data_batch(moon_data_requests, max_concurrency, time):
+    """Fetches moon data for all requests over one shared session.
+
+    Args:
+        moon_data_requests: A list of (latitude, longitude, from_date,
+            to_date) tuples.
+        max_concurrency: Maximum number of requests in flight at once.
+        time: Time of the day for which to fetch data.
+
+    Returns:
+        A list of responses in the same order as `moon_data_requests`, with
+        None for each request that raised an error.
+    """
+    headers = {'Authorization': f'Basic {astro_client.get_auth_string()}'}
+    connector = aiohttp.TCPConnector(
+        limit=max_concurrency,
+        keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS
+        )
+    timeout = aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT_SECONDS)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with aiohttp.ClientSession(headers=headers,
+                                     connector=connector,
+                                     timeout=timeout) as session:
+        # Errors are collected per request, so one failure does not cancel
+        # the rest of the batch.
+        results = await asyncio.gather(*(
+            fetch_moon_data(session, semaphore, latitude, longitude,
+                            from_date, to_date, time)
+            for latitude, longitude, from_date, to_date in moon_data_requests
+        ), return_exceptions=True)
+
+    responses = []
+    for request, result in zip(moon_data_requests, results):
+        if isinstance(result, BaseException):
+            print(f"Moon data request {request} failed: {result}")
+            result = None
+        responses.append(result)
+    return responses
+
+
+def fetch_moon_data_batch(moon_data_requests,
+                          max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                          time="00:00:00"):
+    """Fetches moon data for many locations and date ranges concurrently.
+
+    Args:
+        moon_data_requests: A list of (latitude, longitude, from_date,
+            to_date) tuples.
+        max_concurrency: Maximum number of requests in flight at once.
+        time: Time of the day for which to fetch data. Defaults to "00:00:00".
+
+    Returns:
+        A list of responses in the same order as `moon_data_requests`. Each
+        response is the fetched moon data or None if its fetch failed.
+    """
+    print(f"Fetching moon data for {len(moon_data_requests)} requests...")
+    return asyncio.run(_fetch_moon_data_batch(list(moon_data_requests),
+                                              max_concurrency, time))
+
+
+if __name__ == "__main__":
+    pass
@@ -8,14 +8,33 @@ for further processing or storage.
 
 from collections import defaultdict
 from datetime import datetime
-import json
 import os
 import configparser
 import base64
+import functools
+import numpy as np
 import requests
 
-from data_pipeline.utils import utils
-from data_pipeline.database import queries
+from data_pipeline.utils import retry, utils
+from data_pipeline.database import storage
+from data_pipeline.database.schema import (
+    MOON_DATA_PARAMS_QUERY, NEW_MOON_DATA_PARAMS_CONDITION,
+    SEASON_MOON_DATA_PARAMS_CONDITION)
+
+MOON_POSITIONS_URL = (
+    'https://api.astronomyapi.com/api/v2/bodies/positions/moon'
+    )
+
+# Limits for planning moon data request windows. Game dates at one arena
+# that are at most DEFAULT_MAX_GAP_DAYS apart share a request window, and no
+# window spans more than MAX_WINDOW_DAYS.
+DEFAULT_MAX_GAP_DAYS = 14
+MAX_WINDOW_DAYS = 366
+
+# Observer location of moon data shared by every arena, the geographic
+# center of the contiguous United States, whose time zone lies between those
+# of the eastern and western arenas.
+SHARED_MOON_DATA_LOCATION = (39.83, -98.58)
 
 
 def get_credentials():
@@ -34,9 +53,13 @@ def get_credentials():
     return application_id, application_secret
 
 
+@functools.lru_cache(maxsize=None)
 def get_auth_string():
     """Generates an authorization string for API requests.
 
+    The credentials file is only read on the first call; later calls return
+    the cached string.
+
     Returns:
         A base64 encoded authorization string.
     """
@@ -46,9 +69,36 @@ def get_auth_string():
     return auth_string
 
 
+def get_moon_request_params(latitude, longitude, from_date, to_date, time):
+    """Builds the query parameters for a moon positions request.
+
+    Args:
+        latitude: Latitude of the location.
+        longitude: Longitude of the location.
+        from_date: Start date of the period for which to fetch data.
+        to_date: End date of the period.
+        time: Time of the day for which to fetch data.
+
+    Returns:
+        A dictionary of query parameters for the Astronomy API.
+    """
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'elevation': '0',
+        'from_date': from_date,
+        'to_date': to_date,
+        'time': time,
+        'output': 'rows'
+    }
+
+
 def fetch_moon_data(latitude, longitude, from_date, to_date, time="00:00:00"):
     """Fetches moon data from the API for specified location and date range.
 
+    Timeouts, dropped connections and transient HTTP errors are retried
+    with exponential backoff and jitter, see `retry.call_with_retry`.
+
     Args:
         latitude: Latitude of the location.
         longitude: Longitude of the location.
@@ -65,53 +115,51 @@ def fetch_moon_data(latitude, longitude, from_date, to_date, time="00:00:00"):
             )
         return None
 
-    if utils.check_file_exists('moon_data',
-                               from_date=from_date,
-                               to_date=to_date,
-                               time=time,
-                               latitude=latitude,
-                               longitude=longitude):
-        print("File already exists with requested data.")
-        print("Returning file contents instead.")
-        file_path = utils.generate_file_name('moon_data',
-                                             from_date=from_date,
-                                             to_date=to_date,
-                                             time=time,
-                                             latitude=latitude,
-                                             longitude=longitude)
-        with open(file_path, "r", encoding="utf-8") as file:
-            return json.load(file)
+    cached_response = utils.load_cached_response('moon_data',
+                                                 from_date=from_date,
+                                                 to_date=to_date,
+                                                 time=time,
+                                                 latitude=latitude,
+                                                 longitude=longitude)
+    if cached_response is not None:
+        print("Cached response exists with requested data.")
+        print("Returning cached response instead.")
+        return cached_response
 
     else:
         print("Fetching moon data...")
         auth_string = get_auth_string()
         headers = {'Authorization': f'Basic {auth_string}'}
-        test_url = 'https://api.astronomyapi.com/api/v2/bodies/positions/moon'
-        params = {
-            'latitude': latitude,
-            'longitude': longitude,
-            'elevation': '0',
-            'from_date': from_date,
-            'to_date': to_date,
-            'time': time,
-            'output': 'rows'
-        }
+        params = get_moon_request_params(latitude, longitude,
+                                         from_date, to_date, time)
 
-        try:
-            response = requests.get(test_url,
+        def get_response():
+            response = requests.get(MOON_POSITIONS_URL,
                                     headers=headers,
                                     params=params,
                                     timeout=10)
+            if retry.is_transient_status(response.status_code):
+                raise retry.TransientError(response.status_code)
+            return response
+
+        try:
+            # Timeouts, dropped connections, rate limiting and server
+            # errors are retried with exponential backoff.
+            response = retry.call_with_retry(
+                get_response,
+                transient_errors=(retry.TransientError,
+                                  requests.exceptions.Timeout,
+                                  requests.exceptions.ConnectionError))
 
             if response.status_code == 200:
                 print("API Call Successful. Data received.")
-                utils.save_data_to_file(response.json(),
-                                        'moon_data',
-                                        from_date=from_date,
-                                        to_date=to_date,
-                                        time=time,
-                                        latitude=latitude,
-                                        longitude=longitude)
+                utils.save_cached_response(response.json(),
+                                           'moon_data',
+                                           from_date=from_date,
+                                           to_date=to_date,
+                                           time=time,
+                                           latitude=latitude,
+                                           longitude=longitude)
                 return response.json()
 
             print(f"API Call Failed. Status Code: {response.status_code}")
@@ -119,6 +167,9 @@ def fetch_moon_data(latitude, longitude, from_date, to_date, time="00:00:00"):
             print(response.text)
             return None
 
+        except retry.TransientError as e:
+            print(f"API Call Failed. {e}")
+            return None
         except requests.exceptions.Timeout:
             print("The request timed out.")
             return None
@@ -127,93 +178,302 @@ def fetch_moon_data(latitude, longitude, from_date, to_date, time="00:00:00"):
             return None
 
 
-def get_moon_data_params():
+def iter_moon_data_params(new_games_only=False, seasons=None):
+    """Yields the parameters needed to retrieve moon data for each game.
+
+    The home arena of each game is resolved by the database, which returns
+    exactly one row per game, and rows are yielded as they are read, so
+    callers can plan requests without holding every game in memory.
+
+    Args:
+        new_games_only: Whether to skip games that already have a moon event
+            at their arena on their date. Defaults to False.
+        seasons: Optional. A list of seasons to limit the games to.
+
+    Yields:
+        Tuples containing game ID, game date, latitude, and longitude. Games
+        whose home team has no location are reported and skipped.
+    """
+    query_sql = MOON_DATA_PARAMS_QUERY
+    params = None
+    if new_games_only:
+        query_sql += NEW_MOON_DATA_PARAMS_CONDITION
+    if seasons is not None:
+        query_sql += SEASON_MOON_DATA_PARAMS_CONDITION
+        params = (list(seasons),)
+
+    for game_id, game_date, latitude, longitude in (
+            storage.iter_query_records(query_sql, params)):
+        if latitude is None or longitude is None:
+            print(f"Could not find arena location for game {game_id}.")
+            continue
+        yield game_id, game_date, latitude, longitude
+
+
+def get_moon_data_params(new_games_only=False, seasons=None):
     """Retrieves parameters needed to retrieve moon data for each game.
 
+    Args:
+        new_games_only: Whether to skip games that already have a moon event
+            at their arena on their date. Defaults to False.
+        seasons: Optional. A list of seasons to limit the games to.
+
     Returns:
-        A set of tuples containing game ID, game date, latitude, and
-        longitude for each game. If no records are found or an error
-        occurs, returns an empty set.
+        A list of tuples containing game ID, game date, latitude, and
+        longitude, one per game. If no records are found or an error
+        occurs, returns an empty list.
     """
-    column_names = ['game_id', 'matchup', 'game_date']
-    table_name = 'team_game_logs'
-    records = queries.get_distinct_records(column_names, table_name)
+    return list(iter_moon_data_params(new_games_only, seasons))
 
-    moon_data_params = []
 
-    if records is None:
-        print("No records found or an error occurred.")
-        return moon_data_params
+def _split_windows(games, max_gap_days, max_window_days):
+    """Splits games sorted by date into contiguous date windows.
 
-    all_team_details = queries.get_records('team_details',
-                                           columns=['abbreviation',
-                                                    'latitude',
-                                                    'longitude'])
-    team_details_dict = {detail[0]: (detail[1], detail[2])
-                         for detail in all_team_details}
+    Args:
+        games: A list of tuples with the game date as their second item,
+            sorted by game date.
+        max_gap_days: Largest number of days between two game dates that
+            are still fetched in the same window.
+        max_window_days: Largest number of days a single window may span.
 
-    for record in records:
-        game_id, matchup, game_date = record
+    Returns:
+        A list of windows, each a list of games.
+    """
+    windows = [[games[0]]]
+    for game in games[1:]:
+        window_start = windows[-1][0][1].date()
+        previous_date = windows[-1][-1][1].date()
+        game_date = game[1].date()
+        if ((game_date - previous_date).days > max_gap_days
+                or (game_date - window_start).days >= max_window_days):
+            windows.append([game])
+        else:
+            windows[-1].append(game)
+    return windows
+
+
+def get_days_requested(moon_data_windows):
+    """Counts the days covered by planned moon data requests.
 
-        try:
-            home_team = utils.get_home_team(matchup)
-            latitude, longitude = team_details_dict.get(home_team,
-                                                        (None, None))
-            if latitude is None or longitude is None:
-                print(f"Could not find team details for {home_team}.")
-                continue
-        except ValueError as e:
-            print(f"Error determining home team for game {game_id}: {e}")
-            continue
+    Args:
+        moon_data_windows: A list of planned requests, each a tuple
+            containing latitude, longitude, start date and end date.
 
-        moon_data_params.append((game_id, game_date, latitude, longitude))
+    Returns:
+        The total number of days requested.
+    """
+    return sum(
+        (datetime.strptime(to_date, '%Y-%m-%d')
+         - datetime.strptime(from_date, '%Y-%m-%d')).days + 1
+        for _, _, from_date, to_date, *_ in moon_data_windows
+    )
 
-    moon_data_params_set = set(moon_data_params)
 
-    return moon_data_params_set
+def _plan_windows(moon_data_params, max_gap_days, max_window_days):
+    """Plans request windows per location. See `plan_moon_data_windows`."""
+    loc_dict = defaultdict(list)
+    for game_id, game_date, lat, lon in moon_data_params:
+        loc_dict[(lat, lon)].append((game_id, game_date))
 
+    results = []
+    for (lat, lon), games in loc_dict.items():
+        games.sort(key=lambda x: x[1])
+        for window in _split_windows(games, max_gap_days, max_window_days):
+            results.append((lat, lon,
+                            window[0][1].strftime('%Y-%m-%d'),
+                            window[-1][1].strftime('%Y-%m-%d'),
+                            window))
+    return results
+
+
+def plan_moon_data_windows(moon_data_params,
+                           max_gap_days=DEFAULT_MAX_GAP_DAYS,
+                           max_window_days=MAX_WINDOW_DAYS):
+    """Plans the fewest date windows covering every game date per location.
 
-def clean_moon_data_params(moon_data_params):
-    """Cleans moon data parameters to be used by Astronomy API.
+    Game dates at each location are sorted and merged into contiguous
+    windows. A new window starts when the gap to the previous game date is
+    larger than `max_gap_days`, or when extending the window would make it
+    longer than `max_window_days`. Larger gaps mean fewer requests but more
+    days fetched that have no game.
 
     Args:
-        moon_data_params: A set of tuples, each containing a game ID, game
-            date, latitude, and longitude.
+        moon_data_params: An iterable of tuples, each containing a game ID,
+            game date, latitude, and longitude.
+        max_gap_days: Largest number of days between two game dates that
+            are still fetched in the same window.
+        max_window_days: Largest number of days a single window may span.
 
     Returns:
         A list of tuples, each containing latitude, longitude, the start date
-        of the year, the end date of the year, and a list of game IDs with
-        dates for that location and year.
+        of the window, the end date of the window, and a list of game IDs
+        with dates in that window.
     """
-    # Initialize a dictionary to group data by location and year
-    loc_year_dict = defaultdict(lambda: defaultdict(list))
-    for game_id, game_date, lat, lon in moon_data_params:
-        year = game_date.year
-        loc_year_dict[(lat, lon)][year].append((game_id, game_date))
+    results = _plan_windows(moon_data_params, max_gap_days, max_window_days)
+    days_requested = get_days_requested(results)
+    game_days = sum(len({game_date.date() for _, game_date in window[4]})
+                    for window in results)
+
+    print(f"Planned {len(results)} moon data requests.")
+    print(f"Days requested: {days_requested}")
+    print(f"Days with games: {game_days}")
+    if game_days:
+        print(f"Days requested per day used: "
+              f"{days_requested / game_days:.2f}")
+
+    return results
+
+
+def plan_shared_moon_data_windows(moon_data_params,
+                                  max_gap_days=DEFAULT_MAX_GAP_DAYS,
+                                  max_window_days=MAX_WINDOW_DAYS):
+    """Plans date windows of moon data shared by every arena.
+
+    The moon's phase, elongation, magnitude, distance and position among
+    the stars are nearly the same from every arena on a given date, so they
+    are requested once per date at SHARED_MOON_DATA_LOCATION instead of once
+    per arena, and only the altitude and azimuth are derived per arena, see
+    `moon_ephemeris.derive_arena_responses`. The game dates of all arenas
+    are merged into windows as in `plan_moon_data_windows`.
+
+    Args:
+        moon_data_params: An iterable of tuples, each containing a game ID,
+            game date, latitude, and longitude.
+        max_gap_days: Largest number of days between two game dates that
+            are still fetched in the same window.
+        max_window_days: Largest number of days a single window may span.
+
+    Returns:
+        A tuple of the planned requests and the number of days the same
+        games would request when planned per arena. Each request is a tuple
+        containing the shared latitude and longitude, the start date of the
+        window, the end date of the window, and a list of (game ID, game
+        date, latitude, longitude) tuples of the games in that window.
+    """
+    games = sorted(moon_data_params, key=lambda game: game[1])
+    latitude, longitude = SHARED_MOON_DATA_LOCATION
 
     results = []
-    for (lat, lon), years in loc_year_dict.items():
-        for year, games in years.items():
-            # Sort games by date within each year
-            games.sort(key=lambda x: x[1])
-            # Include both game_id and game_date in the list
-            game_id_dates = [(game[0], game[1]) for game in games]
-            # Construct the from_date and to_date for each year
-            from_date = datetime(year, 1, 1).strftime('%Y-%m-%d')
-            to_date = datetime(year, 12, 31).strftime('%Y-%m-%d')
-            # Append the organized data to the results list
-            results.append((lat, lon, from_date, to_date, game_id_dates))
+    if games:
+        for window in _split_windows(games, max_gap_days, max_window_days):
+            results.append((latitude, longitude,
+                            window[0][1].strftime('%Y-%m-%d'),
+                            window[-1][1].strftime('%Y-%m-%d'),
+                            window))
 
-    return results
+    arena_windows = _plan_windows(games, max_gap_days, max_window_days)
+    arena_days_requested = get_days_requested(arena_windows)
+
+    print(f"Planned {len(results)} shared moon data requests "
+          f"instead of {len(arena_windows)} per arena.")
+    print(f"API calls saved: {len(arena_windows) - len(results)}")
+    print(f"Days requested: {get_days_requested(results)} "
+          f"instead of {arena_days_requested} per arena")
+
+    return results, arena_days_requested
+
+
+def report_shared_response_bytes(moon_data_windows, response_bytes,
+                                 arena_days_requested):
+    """Prints the response bytes saved by sharing moon data across arenas.
+
+    The bytes the per-arena requests would have returned are estimated from
+    the bytes per day of the shared responses.
+
+    Args:
+        moon_data_windows: The shared requests, as planned by
+            `plan_shared_moon_data_windows`.
+        response_bytes: Total size in bytes of the shared responses.
+        arena_days_requested: Number of days the requests would cover when
+            planned per arena.
+    """
+    days_requested = get_days_requested(moon_data_windows)
+    if not days_requested:
+        return
+    arena_bytes = round(response_bytes / days_requested
+                        * arena_days_requested)
+    print(f"Moon data response bytes: {response_bytes} shared, "
+          f"about {arena_bytes} per arena")
+    print(f"Moon data response bytes saved: {arena_bytes - response_bytes}")
+
+
+def _get_game_ids_by_date(game_id_dates, dates):
+    """Looks up the game played on each date with a sorted array search.
+
+    Args:
+        game_id_dates: A list of tuples containing game IDs and their
+            corresponding dates.
+        dates: A datetime64[D] array of dates to look up.
+
+    Returns:
+        A tuple of an object array with the game ID for each date, None
+        where no game was played on that date, and a boolean array marking
+        the dates with a game.
+    """
+    game_ids = np.empty(len(dates), dtype=object)
+    if not game_id_dates:
+        return game_ids, np.zeros(len(dates), dtype=bool)
+
+    ids, game_dates = zip(*game_id_dates)
+    game_days = np.array(game_dates, dtype='datetime64[D]')
+    # Keep the last game listed for a date, as a dict keyed on date would.
+    game_days, last_index = np.unique(game_days[::-1], return_index=True)
+    day_game_ids = np.array(ids, dtype=object)[::-1][last_index]
+
+    positions = np.searchsorted(game_days, dates)
+    positions = np.minimum(positions, len(game_days) - 1)
+    matched = game_days[positions] == dates
+    game_ids[matched] = day_game_ids[positions[matched]]
+    return game_ids, matched
+
+
+def _get_field(values, *path):
+    """Looks up a nested field in every item of a list in one pass per key.
+
+    Args:
+        values: A list of dictionaries, or None where an item is missing.
+        *path: The keys leading to the field.
+
+    Returns:
+        A list with the field of each item, None where the item or any key
+        on the path is missing.
+    """
+    for key in path:
+        values = [value.get(key) if isinstance(value, dict) else None
+                  for value in values]
+    return values
+
+
+def _parse_local_dates(date_strs):
+    """Parses the local calendar dates of ISO 8601 times in bulk.
+
+    Args:
+        date_strs: A list of ISO 8601 local times, None where missing.
+
+    Returns:
+        A datetime64[D] array of dates, NaT where the time was missing.
+    """
+    date_strs = np.array(date_strs, dtype=object)
+    date_strs[np.equal(date_strs, None)] = ''
+    # The first ten characters of an ISO 8601 time are its calendar date,
+    # and an empty string parses as NaT.
+    return date_strs.astype('U10').astype('datetime64[D]')
 
 
 def parse_transform_moon_data(response, game_id_dates):
-    """Transforms moon data from API response into a structured format.
+    """Transforms moon data from API response into moon_events rows.
 
     Parses the API response to extract moon data and associates it with
-    corresponding game IDs based on dates. Constructs a list of rows with
-    detailed moon event information for each date in the response that matches
-    the game dates.
+    corresponding game IDs based on dates. The positions are flattened in
+    one pass, their dates are parsed in bulk and joined against the game
+    dates with an array lookup, and only positions on a game date are
+    kept. Each field is then extracted as a whole column and the rows are
+    assembled from the columns. Positions without a date or without a game
+    on their date are dropped, and a response whose observer location does
+    not resolve to an arena is reported and yields no rows, as moon_events
+    requires an arena. The observer location, phase and
+    constellation are stored as IDs of the arenas, moon_phases and
+    constellations lookup tables, which are added to as new values appear.
 
     Args:
         response: The API response containing moon data.
@@ -224,63 +484,70 @@ def parse_transform_moon_data(response, game_id_dates):
         A tuple containing the headers and records of the transformed data.
     """
     print("Processing moon data...")
-    game_date_dict = {
-        game_date.strftime('%Y-%m-%d'): game_id
-        for game_id, game_date in game_id_dates
-    }
-
-    observer_location = response.get('data', {}
-                                     ).get('observer', {}
-                                           ).get('location', {})
+    data = response.get('data', {})
+    observer_location = data.get('observer', {}).get('location', {})
     latitude = observer_location.get('latitude')
     longitude = observer_location.get('longitude')
 
     headers = [
-        'moon_event_id', 'date', 'latitude', 'longitude', 'body_id',
-        'body_name', 'distance_from_earth_au', 'distance_from_earth_km',
+        'arena_id', 'date', 'constellation_id', 'phase_id',
+        'distance_from_earth_au', 'distance_from_earth_km',
         'horizontal_position_altitude_degrees',
         'horizontal_position_azimuth_degrees',
         'equatorial_position_right_ascension',
         'equatorial_position_declination',
-        'position_constellation_name', 'elongation', 'magnitude',
-        'phase_string', 'game_id'
+        'elongation', 'magnitude', 'game_id'
+    ]
+
+    positions = [position for row in data.get('rows', [])
+                 for position in row.get('positions', [])]
+
+    dates = _parse_local_dates(_get_field(positions, 'date'))
+    game_ids, matched = _get_game_ids_by_date(game_id_dates, dates)
+    if not matched.any():
+        return headers, []
+
+    location = (latitude, longitude)
+    arena_id = None
+    if None not in location:
+        arena_id = storage.get_lookup_ids('arenas', [location]).get(location)
+    if arena_id is None:
+        print(f"Could not resolve the arena at latitude {latitude}, "
+              f"longitude {longitude}; skipping {matched.sum()} moon "
+              f"events.")
+        return headers, []
+
+    game_indexes = np.flatnonzero(matched)
+    positions = [positions[index] for index in game_indexes]
+    sky_positions = _get_field(positions, 'position')
+    horizontal = _get_field(sky_positions, 'horizontal')
+    equatorial = _get_field(sky_positions, 'equatorial')
+    extra_info = _get_field(positions, 'extraInfo')
+    distance = _get_field(positions, 'distance', 'fromEarth')
+    phases = _get_field(extra_info, 'phase', 'string')
+    constellations = _get_field(sky_positions, 'constellation', 'name')
+
+    phase_ids = storage.get_lookup_ids('moon_phases', phases)
+    constellation_ids = storage.get_lookup_ids('constellations',
+                                               constellations)
+
+    columns = [
+        [arena_id] * len(positions),
+        np.datetime_as_string(dates[game_indexes]).tolist(),
+        list(map(constellation_ids.get, constellations)),
+        list(map(phase_ids.get, phases)),
+        _get_field(distance, 'au'),
+        _get_field(distance, 'km'),
+        _get_field(horizontal, 'altitude', 'degrees'),
+        _get_field(horizontal, 'azimuth', 'degrees'),
+        _get_field(equatorial, 'rightAscension', 'hours'),
+        _get_field(equatorial, 'declination', 'degrees'),
+        _get_field(extra_info, 'elongation'),
+        _get_field(extra_info, 'magnitude'),
+        game_ids[game_indexes].tolist(),
     ]
 
-    rows = []
-
-    for row in response.get('data', {}).get('rows', []):
-        body = row.get('body', {})
-        for position in row.get('positions', []):
-            date_str = position.get('date')
-            date_obj = datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-            date_key = date_obj.strftime('%Y-%m-%d')
-
-            moon_event_id = f"{date_str}_{latitude}_{longitude}"
-            game_id = game_date_dict.get(date_key, 'null')
-
-            event_row = [
-                moon_event_id, date_str, latitude, longitude,
-                body.get('id'), body.get('name'),
-                position.get('distance', {}).get('fromEarth', {}).get('au'),
-                position.get('distance', {}).get('fromEarth', {}).get('km'),
-                position.get('position', {}).get('horizontal', {}).get(
-                    'altitude', {}).get('degrees'),
-                position.get('position', {}).get('horizontal', {}).get(
-                    'azimuth', {}).get('degrees'),
-                position.get('position', {}).get('equatorial', {}).get(
-                    'rightAscension', {}).get('hours'),
-                position.get('position', {}).get('equatorial', {}).get(
-                    'declination', {}).get('degrees'),
-                position.get('position', {}).get('constellation', {}).get(
-                    'name'),
-                position.get('extraInfo', {}).get('elongation'),
-                position.get('extraInfo', {}).get('magnitude'),
-                position.get('extraInfo', {}).get('phase', {}).get('string'),
-                game_id
-            ]
-            rows.append(event_row)
-
-    return headers, rows
+    return headers, list(zip(*columns))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,744 @@
+"""Module for computing moon data locally with a vectorized lunar ephemeris.
+
+This module computes the moon fields otherwise fetched from the Astronomy API
+(distance, horizontal and equatorial position, constellation, elongation,
+magnitude and phase) with NumPy, for whole arrays of times and locations at
+once. It provides a drop-in replacement for `astro_client.fetch_moon_data`
+that returns the same `data.rows[].positions[]` structure, so moon data can
+be produced without any network calls. It also derives each arena's moon
+data from data shared by every arena, computing only the fields that depend
+on the observer's location.
+
+The moon's position uses the principal periodic terms of the ELP-2000/82
+lunar theory as given in Meeus, Astronomical Algorithms (chapter 47), and the
+sun's position uses the low accuracy solar theory (chapter 25). Positions are
+accurate to a few hundredths of a degree. Constellations are assigned from
+the moon's ecliptic longitude using the IAU boundaries where they cross the
+ecliptic, which is exact for the zodiac but cannot place the moon in the
+neighbouring non-zodiacal constellations it occasionally grazes.
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+AU_KM = 149597870.7
+EARTH_RADIUS_KM = 6378.14
+MOON_MEAN_DISTANCE_KM = 385000.6
+
+# Annual general precession in right ascension (m) and declination (n), in
+# degrees per year.
+PRECESSION_M = 0.0128123
+PRECESSION_N = 0.0055675
+OBLIQUITY_J2000 = 23.4392911
+J2000 = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+
+# Half-width, in degrees of sun-moon longitude difference, of the window in
+# which the principal phases (new, first quarter, full, last quarter) are
+# reported instead of the intermediate phases.
+PHASE_EVENT_HALF_WIDTH_DEGREES = 0.5
+
+# Periodic terms for the moon's longitude and distance:
+# (D, M, M', F, longitude coefficient, distance coefficient).
+MOON_LONGITUDE_DISTANCE_TERMS = np.array([
+    (0, 0, 1, 0, 6288774, -20905355),
+    (2, 0, -1, 0, 1274027, -3699111),
+    (2, 0, 0, 0, 658314, -2955968),
+    (0, 0, 2, 0, 213618, -569925),
+    (0, 1, 0, 0, -185116, 48888),
+    (0, 0, 0, 2, -114332, -3149),
+    (2, 0, -2, 0, 58793, 246158),
+    (2, -1, -1, 0, 57066, -152138),
+    (2, 0, 1, 0, 53322, -170733),
+    (2, -1, 0, 0, 45758, -204586),
+    (0, 1, -1, 0, -40923, -129620),
+    (1, 0, 0, 0, -34720, 108743),
+    (0, 1, 1, 0, -30383, 104755),
+    (2, 0, 0, -2, 15327, 10321),
+    (0, 0, 1, 2, -12528, 0),
+    (0, 0, 1, -2, 10980, 79661),
+    (4, 0, -1, 0, 10675, -34782),
+    (0, 0, 3, 0, 10034, -23210),
+    (4, 0, -2, 0, 8548, -21636),
+    (2, 1, -1, 0, -7888, 24208),
+    (2, 1, 0, 0, -6766, 30824),
+    (1, 0, -1, 0, -5163, -8379),
+    (1, 1, 0, 0, 4987, -16675),
+    (2, -1, 1, 0, 4036, -12831),
+    (2, 0, 2, 0, 3994, -10445),
+    (4, 0, 0, 0, 3861, -11650),
+    (2, 0, -3, 0, 3665, 14403),
+    (0, 1, -2, 0, -2689, -7003),
+    (2, 0, -1, 2, -2602, 0),
+    (2, -1, -2, 0, 2390, 10056),
+    (1, 0, 1, 0, -2348, 6322),
+    (2, -2, 0, 0, 2236, -9884),
+], dtype=float)
+
+# Periodic terms for the moon's latitude: (D, M, M', F, coefficient).
+MOON_LATITUDE_TERMS = np.array([
+    (0, 0, 0, 1, 5128122),
+    (0, 0, 1, 1, 280602),
+    (0, 0, 1, -1, 277693),
+    (2, 0, 0, -1, 173237),
+    (2, 0, -1, 1, 55413),
+    (2, 0, -1, -1, 46271),
+    (2, 0, 0, 1, 32573),
+    (0, 0, 2, 1, 17198),
+    (2, 0, 1, -1, 9266),
+    (0, 0, 2, -1, 8822),
+    (2, -1, 0, -1, 8216),
+    (2, 0, -2, -1, 4324),
+    (2, 0, 1, 1, 4200),
+    (2, 1, 0, -1, -3359),
+    (2, -1, -1, 1, 2463),
+    (2, -1, 0, 1, 2211),
+    (2, -1, -1, -1, 2065),
+    (0, 1, -1, -1, -1870),
+    (4, 0, -1, -1, 1828),
+    (0, 1, 0, 1, -1794),
+], dtype=float)
+
+# J2000 ecliptic longitudes at which the ecliptic enters each constellation.
+CONSTELLATION_BOUNDARIES = np.array([
+    28.69, 53.42, 90.14, 118.26, 138.18, 174.16,
+    218.02, 241.15, 247.71, 266.26, 299.67, 327.87, 351.57,
+])
+CONSTELLATION_NAMES = np.array([
+    'Pisces', 'Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo',
+    'Libra', 'Scorpius', 'Ophiuchus', 'Sagittarius', 'Capricornus',
+    'Aquarius', 'Pisces',
+], dtype=object)
+
+# Boundaries, in sun-moon longitude difference, between the eight phases.
+PHASE_BOUNDARIES = np.array([
+    0, 90, 90, 180, 180, 270, 270, 360,
+]) + PHASE_EVENT_HALF_WIDTH_DEGREES * np.array([1, -1, 1, -1, 1, -1, 1, -1])
+PHASE_NAMES = np.array([
+    'New Moon', 'Waxing Crescent', 'First Quarter', 'Waxing Gibbous',
+    'Full Moon', 'Waning Gibbous', 'Last Quarter', 'Waning Crescent',
+    'New Moon',
+], dtype=object)
+
+# Approximate time zone boundaries for the locations of NBA arenas, as
+# (westernmost longitude, time zone), checked from east to west. Phoenix
+# does not observe daylight saving time and is handled separately.
+NBA_TIME_ZONE_BOUNDARIES = [
+    (-87.0, 'America/New_York'),
+    (-102.0, 'America/Chicago'),
+    (-114.5, 'America/Denver'),
+    (-180.0, 'America/Los_Angeles'),
+]
+PHOENIX_ARENA = (33.45, -112.07)
+
+# Numeric fields that are shared by every arena when moon data is shared,
+# as keys of `compute_moon_positions`, with their units.
+SHARED_NUMERIC_FIELDS = {
+    'distance_km': 'km',
+    'right_ascension_hours': 'h',
+    'declination': 'deg',
+    'elongation': 'deg',
+    'magnitude': 'mag',
+}
+
+# Text fields that are shared by every arena when moon data is shared.
+SHARED_TEXT_FIELDS = ['phase_string', 'constellation']
+
+
+def julian_day(utc_times):
+    """Converts UTC times to Julian days.
+
+    Args:
+        utc_times: Array of numpy datetime64 values in UTC.
+
+    Returns:
+        An array of Julian days.
+    """
+    seconds = (np.asarray(utc_times, dtype='datetime64[s]')
+               .astype('int64').astype(float))
+    return UNIX_EPOCH_JD + seconds / 86400.0
+
+
+def _sum_terms(terms, arguments, eccentricity, column):
+    """Sums one column of a periodic term table.
+
+    Args:
+        terms: Table of periodic terms, the first four columns being the
+            multiples of D, M, M' and F.
+        arguments: Array of shape (4, n) holding D, M, M' and F in radians.
+        eccentricity: Array of the eccentricity correction E.
+        column: Index of the coefficient column to sum.
+
+    Returns:
+        A tuple of the sine sum and cosine sum of the column.
+    """
+    angles = terms[:, :4] @ arguments
+    correction = eccentricity ** np.abs(terms[:, 1])[:, None]
+    coefficients = terms[:, column][:, None] * correction
+    return ((coefficients * np.sin(angles)).sum(axis=0),
+            (coefficients * np.cos(angles)).sum(axis=0))
+
+
+def moon_geocentric_position(jd):
+    """Computes the moon's apparent geocentric position.
+
+    Args:
+        jd: Array of Julian days, of any shape.
+
+    Returns:
+        A dictionary of arrays shaped like jd with the ecliptic longitude and
+        latitude in degrees, the distance in kilometers, the obliquity of the
+        ecliptic in degrees, the nutation in longitude in degrees and the
+        sun's apparent longitude in degrees and distance in kilometers.
+    """
+    # The periodic terms are summed over flat arrays of times.
+    shape = np.shape(jd)
+    t = (np.ravel(jd) - J2000) / 36525.0
+
+    mean_longitude = (218.3164477 + 481267.88123421 * t
+                      - 0.0015786 * t**2 + t**3 / 538841 - t**4 / 65194000)
+    elongation = (297.8501921 + 445267.1114034 * t
+                  - 0.0018819 * t**2 + t**3 / 545868 - t**4 / 113065000)
+    sun_anomaly = (357.5291092 + 35999.0502909 * t
+                   - 0.0001536 * t**2 + t**3 / 24490000)
+    moon_anomaly = (134.9633964 + 477198.8675055 * t
+                    + 0.0087414 * t**2 + t**3 / 69699 - t**4 / 14712000)
+    latitude_argument = (93.2720950 + 483202.0175233 * t
+                         - 0.0036539 * t**2 - t**3 / 3526000
+                         + t**4 / 863310000)
+    a1 = np.radians(119.75 + 131.849 * t)
+    a2 = np.radians(53.09 + 479264.290 * t)
+    a3 = np.radians(313.45 + 481266.484 * t)
+    eccentricity = 1 - 0.002516 * t - 0.0000074 * t**2
+
+    arguments = np.radians(np.vstack([
+        elongation, sun_anomaly, moon_anomaly, latitude_argument
+    ]))
+    lp = np.radians(mean_longitude)
+    f = arguments[3]
+    mp = arguments[2]
+
+    sum_l, _ = _sum_terms(MOON_LONGITUDE_DISTANCE_TERMS, arguments,
+                          eccentricity, 4)
+    _, sum_r = _sum_terms(MOON_LONGITUDE_DISTANCE_TERMS, arguments,
+                          eccentricity, 5)
+    sum_b, _ = _sum_terms(MOON_LATITUDE_TERMS, arguments, eccentricity, 4)
+
+    sum_l += 3958 * np.sin(a1) + 1962 * np.sin(lp - f) + 318 * np.sin(a2)
+    sum_b += (-2235 * np.sin(lp) + 382 * np.sin(a3)
+              + 175 * np.sin(a1 - f) + 175 * np.sin(a1 + f)
+              + 127 * np.sin(lp - mp) - 115 * np.sin(lp + mp))
+
+    # Nutation and obliquity of the ecliptic.
+    node = np.radians(125.04452 - 1934.136261 * t)
+    sun_mean_longitude = np.radians(280.4665 + 36000.7698 * t)
+    nutation_longitude = (-17.20 * np.sin(node)
+                          - 1.32 * np.sin(2 * sun_mean_longitude)
+                          - 0.23 * np.sin(2 * lp)
+                          + 0.21 * np.sin(2 * node)) / 3600
+    nutation_obliquity = (9.20 * np.cos(node)
+                          + 0.57 * np.cos(2 * sun_mean_longitude)
+                          + 0.10 * np.cos(2 * lp)
+                          - 0.09 * np.cos(2 * node)) / 3600
+    obliquity = (23.439291 - 0.0130042 * t + nutation_obliquity)
+
+    # Sun's apparent longitude and distance.
+    sun_m = np.radians(sun_anomaly)
+    equation_of_center = ((1.914602 - 0.004817 * t - 0.000014 * t**2)
+                          * np.sin(sun_m)
+                          + (0.019993 - 0.000101 * t) * np.sin(2 * sun_m)
+                          + 0.000289 * np.sin(3 * sun_m))
+    sun_true_longitude = (280.46646 + 36000.76983 * t + 0.0003032 * t**2
+                          + equation_of_center)
+    orbit_eccentricity = 0.016708634 - 0.000042037 * t
+    sun_true_anomaly = sun_m + np.radians(equation_of_center)
+    sun_distance = (1.000001018 * (1 - orbit_eccentricity**2)
+                    / (1 + orbit_eccentricity * np.cos(sun_true_anomaly))
+                    * AU_KM)
+    sun_longitude = sun_true_longitude - 0.00569 - 0.00478 * np.sin(node)
+
+    position = {
+        'longitude': np.mod(mean_longitude + sum_l / 1e6
+                            + nutation_longitude, 360),
+        'latitude': sum_b / 1e6,
+        'distance_km': 385000.56 + sum_r / 1000,
+        'obliquity': obliquity,
+        'nutation_longitude': nutation_longitude,
+        'sun_longitude': np.mod(sun_longitude, 360),
+        'sun_distance_km': sun_distance,
+    }
+    return {field: values.reshape(shape)
+            for field, values in position.items()}
+
+
+def compute_moon_positions(utc_times, latitudes, longitudes):
+    """Computes moon data for arrays of times and observer locations.
+
+    All inputs are broadcast against each other, so a single location can
+    be combined with many times and vice versa. Like the Astronomy API, the
+    distance, equatorial and horizontal positions are topocentric, the
+    equatorial position is referred to the J2000 equinox and the altitude
+    includes atmospheric refraction.
+
+    Args:
+        utc_times: Array of numpy datetime64 values in UTC.
+        latitudes: Array of observer latitudes in degrees.
+        longitudes: Array of observer longitudes in degrees, east positive.
+
+    Returns:
+        A dictionary of arrays keyed by field: 'distance_au', 'distance_km',
+        'altitude', 'azimuth', 'right_ascension_hours', 'declination',
+        'constellation', 'elongation', 'magnitude' and 'phase_string'.
+    """
+    jd = julian_day(utc_times)
+    jd, latitudes, longitudes = np.broadcast_arrays(
+        jd, np.asarray(latitudes, dtype=float),
+        np.asarray(longitudes, dtype=float))
+    t = (jd - J2000) / 36525.0
+
+    moon = moon_geocentric_position(jd)
+    lam = np.radians(moon['longitude'])
+    beta = np.radians(moon['latitude'])
+    eps = np.radians(moon['obliquity'])
+    distance = moon['distance_km']
+
+    # Geocentric equatorial position vector of the moon.
+    moon_x = distance * np.cos(beta) * np.cos(lam)
+    moon_y = distance * (np.cos(beta) * np.sin(lam) * np.cos(eps)
+                         - np.sin(beta) * np.sin(eps))
+    moon_z = distance * (np.cos(beta) * np.sin(lam) * np.sin(eps)
+                         + np.sin(beta) * np.cos(eps))
+
+    # Geocentric position vector of the observer at sea level, using the
+    # apparent sidereal time at the observer's longitude.
+    sidereal_time = np.radians(
+        280.46061837 + 360.98564736629 * (jd - J2000)
+        + 0.000387933 * t**2 - t**3 / 38710000
+        + moon['nutation_longitude'] * np.cos(eps) + longitudes)
+    phi = np.radians(latitudes)
+    reduced_latitude = np.arctan(0.99664719 * np.tan(phi))
+    observer_xy = EARTH_RADIUS_KM * np.cos(reduced_latitude)
+    observer_z = EARTH_RADIUS_KM * 0.99664719 * np.sin(reduced_latitude)
+
+    # Topocentric equatorial position of the moon.
+    topo_x = moon_x - observer_xy * np.cos(sidereal_time)
+    topo_y = moon_y - observer_xy * np.sin(sidereal_time)
+    topo_z = moon_z - observer_z
+    topo_distance = np.sqrt(topo_x**2 + topo_y**2 + topo_z**2)
+    right_ascension = np.arctan2(topo_y, topo_x)
+    declination = np.arcsin(topo_z / topo_distance)
+
+    hour_angle = sidereal_time - right_ascension
+    altitude = np.degrees(np.arcsin(
+        np.sin(phi) * np.sin(declination)
+        + np.cos(phi) * np.cos(declination) * np.cos(hour_angle)))
+    azimuth = np.degrees(np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(phi)
+        - np.tan(declination) * np.cos(phi))) + 180
+
+    # Precess the topocentric equatorial position back to the J2000 equinox,
+    # which is the frame the Astronomy API reports it in.
+    years = (jd - J2000) / 365.25
+    precession_ra = np.radians(
+        (PRECESSION_M + PRECESSION_N * np.sin(right_ascension)
+         * np.tan(declination)) * years)
+    precession_dec = np.radians(
+        PRECESSION_N * np.cos(right_ascension) * years)
+    right_ascension_j2000 = right_ascension - precession_ra
+    declination_j2000 = declination - precession_dec
+
+    # Atmospheric refraction, tapered off below the horizon.
+    refraction_altitude = np.maximum(altitude, -1.0)
+    refraction = (1.02 / np.tan(np.radians(
+        refraction_altitude + 10.3 / (refraction_altitude + 5.11)))) / 60
+    refraction = np.where(altitude < -1.0,
+                          refraction * (altitude + 90) / 89, refraction)
+
+    # Elongation from the sun, phase angle and visual magnitude.
+    longitude_difference = np.mod(moon['longitude']
+                                  - moon['sun_longitude'], 360)
+    elongation = np.arccos(np.cos(beta)
+                           * np.cos(np.radians(longitude_difference)))
+    sun_distance = moon['sun_distance_km']
+    phase_angle = np.arctan2(sun_distance * np.sin(elongation),
+                             distance - sun_distance * np.cos(elongation))
+    heliocentric_distance = np.sqrt(
+        sun_distance**2 + distance**2
+        - 2 * sun_distance * distance * np.cos(elongation)) / AU_KM
+    magnitude = (-12.717 + 1.49 * np.abs(phase_angle)
+                 + 0.0431 * phase_angle**4
+                 + 5 * np.log10(heliocentric_distance
+                                * distance / MOON_MEAN_DISTANCE_KM))
+
+    # Ecliptic longitude of the topocentric J2000 position, used to look up
+    # the constellation.
+    obliquity_j2000 = np.radians(OBLIQUITY_J2000)
+    longitude_j2000 = np.mod(np.degrees(np.arctan2(
+        np.sin(right_ascension_j2000) * np.cos(obliquity_j2000)
+        + np.tan(declination_j2000) * np.sin(obliquity_j2000),
+        np.cos(right_ascension_j2000))), 360)
+
+    return {
+        'distance_au': topo_distance / AU_KM,
+        'distance_km': topo_distance,
+        'altitude': altitude + refraction,
+        'azimuth': np.mod(azimuth, 360),
+        'right_ascension_hours': np.mod(np.degrees(right_ascension_j2000),
+                                        360) / 15,
+        'declination': np.degrees(declination_j2000),
+        'constellation': CONSTELLATION_NAMES[
+            np.searchsorted(CONSTELLATION_BOUNDARIES, longitude_j2000)],
+        'elongation': np.degrees(elongation),
+        'magnitude': magnitude,
+        'phase_string': PHASE_NAMES[
+            np.searchsorted(PHASE_BOUNDARIES, longitude_difference)],
+    }
+
+
+def get_utc_offset(latitude, longitude):
+    """Approximates the UTC offset the Astronomy API uses for an NBA arena.
+
+    The Astronomy API applies one fixed UTC offset to every date it returns
+    for a location, which for our stored data is the location's daylight
+    saving time offset. The same offset is used here so computed rows line
+    up with previously fetched ones.
+
+    Args:
+        latitude: Latitude of the arena.
+        longitude: Longitude of the arena.
+
+    Returns:
+        A timedelta holding the arena's UTC offset.
+    """
+    if (abs(latitude - PHOENIX_ARENA[0]) < 1
+            and abs(longitude - PHOENIX_ARENA[1]) < 1):
+        zone_name = 'America/Phoenix'
+    else:
+        zone_name = next(
+            zone for westernmost_longitude, zone in NBA_TIME_ZONE_BOUNDARIES
+            if longitude >= westernmost_longitude
+            )
+    return datetime(2020, 7, 1, tzinfo=ZoneInfo(zone_name)).utcoffset()
+
+
+def get_local_times(from_date, to_date, time):
+    """Lists the local observation times for a date range.
+
+    Args:
+        from_date: Start date of the period, formatted as 'YYYY-MM-DD'.
+        to_date: End date of the period, formatted as 'YYYY-MM-DD'.
+        time: Local time of day, formatted as 'HH:MM:SS'.
+
+    Returns:
+        An array of numpy datetime64 local times, one per day in the range.
+    """
+    days = np.arange(np.datetime64(from_date, 'D'),
+                     np.datetime64(to_date, 'D') + 1)
+    time_of_day = (np.datetime64(f"1970-01-01T{time}", 's')
+                   - np.datetime64('1970-01-01', 's'))
+    return days.astype('datetime64[s]') + time_of_day
+
+
+def _format_offset(utc_offset):
+    """Formats a UTC offset as '+HH:MM' or '-HH:MM'."""
+    minutes = int(utc_offset.total_seconds() // 60)
+    sign = '-' if minutes < 0 else '+'
+    hours, minutes = divmod(abs(minutes), 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+def _build_response(latitude, longitude, local_times, utc_offset,
+                    positions):
+    """Builds an Astronomy API style response from computed moon data.
+
+    Args:
+        latitude: Latitude of the observer.
+        longitude: Longitude of the observer.
+        local_times: Array of local observation times.
+        utc_offset: The UTC offset of the local times.
+        positions: Dictionary of arrays from `compute_moon_positions`.
+
+    Returns:
+        A dictionary shaped like the Astronomy API moon positions response.
+    """
+    offset = _format_offset(utc_offset)
+    dates = [f"{date}.000{offset}"
+             for date in np.datetime_as_string(local_times, unit='s')]
+    formatted = {
+        field: [f"{value:.{decimals}f}" for value in
+                positions[field].tolist()]
+        for field, decimals in [('distance_au', 5), ('distance_km', 5),
+                                ('altitude', 2), ('azimuth', 2),
+                                ('right_ascension_hours', 2),
+                                ('declination', 2)]
+    }
+    elongations = np.round(positions['elongation'], 5).tolist()
+    magnitudes = np.round(positions['magnitude'], 5).tolist()
+
+    rows = []
+    for index, date in enumerate(dates):
+        rows.append({
+            'date': date,
+            'distance': {'fromEarth': {
+                'au': formatted['distance_au'][index],
+                'km': formatted['distance_km'][index],
+            }},
+            'position': {
+                'horizontal': {
+                    'altitude': {'degrees': formatted['altitude'][index]},
+                    'azimuth': {'degrees': formatted['azimuth'][index]},
+                },
+                'equatorial': {
+                    'rightAscension': {
+                        'hours': formatted['right_ascension_hours'][index]},
+                    'declination': {
+                        'degrees': formatted['declination'][index]},
+                },
+                'constellation': {
+                    'name': positions['constellation'][index]},
+            },
+            'extraInfo': {
+                'elongation': elongations[index],
+                'magnitude': magnitudes[index],
+                'phase': {'string': positions['phase_string'][index]},
+            },
+        })
+
+    return {
+        'data': {
+            'observer': {'location': {
+                'latitude': latitude,
+                'longitude': longitude,
+                'elevation': 0,
+            }},
+            'rows': [{
+                'body': {'id': 'moon', 'name': 'Moon'},
+                'positions': rows,
+            }],
+        }
+    }
+
+
+def fetch_moon_data_batch(moon_data_requests, time="00:00:00"):
+    """Computes moon data for many locations and date ranges at once.
+
+    The observation times of every request are concatenated so the
+    ephemeris is evaluated in a single vectorized pass.
+
+    Args:
+        moon_data_requests: A list of (latitude, longitude, from_date,
+            to_date) tuples.
+        time: Local time of the day to compute data for. Defaults to
+            "00:00:00".
+
+    Returns:
+        A list of responses in the same order as `moon_data_requests`, each
+        shaped like the Astronomy API moon positions response.
+    """
+    moon_data_requests = list(moon_data_requests)
+    print(f"Computing moon data for {len(moon_data_requests)} requests...")
+
+    utc_offsets = [get_utc_offset(latitude, longitude)
+                   for latitude, longitude, _, _ in moon_data_requests]
+    all_local_times = [
+        get_local_times(from_date, to_date, time)
+        for _, _, from_date, to_date in moon_data_requests
+    ]
+    counts = [len(local_times) for local_times in all_local_times]
+    utc_times = np.concatenate([
+        local_times - np.timedelta64(utc_offset)
+        for local_times, utc_offset in zip(all_local_times, utc_offsets)
+    ]) if moon_data_requests else np.array([], dtype='datetime64[s]')
+    latitudes = np.repeat([request[0] for request in moon_data_requests],
+                          counts)
+    longitudes = np.repeat([request[1] for request in moon_data_requests],
+                           counts)
+
+    positions = compute_moon_positions(utc_times, latitudes, longitudes)
+
+    responses = []
+    start = 0
+    for (latitude, longitude, _, _), local_times, utc_offset, count in zip(
+            moon_data_requests, all_local_times, utc_offsets, counts):
+        request_positions = {
+            field: values[start:start + count]
+            for field, values in positions.items()
+        }
+        responses.append(_build_response(latitude, longitude, local_times,
+                                         utc_offset, request_positions))
+        start += count
+
+    return responses
+
+
+def fetch_moon_data(latitude, longitude, from_date, to_date, time="00:00:00"):
+    """Computes moon data for a location and date range.
+
+    Drop-in replacement for `astro_client.fetch_moon_data` that computes the
+    data locally instead of calling the Astronomy API.
+
+    Args:
+        latitude: Latitude of the location.
+        longitude: Longitude of the location.
+        from_date: Start date of the period for which to compute data.
+        to_date: End date of the period.
+        time: Local time of the day to compute data for. Defaults to
+            "00:00:00".
+
+    Returns:
+        The computed moon data or None if the location is not provided.
+    """
+    if latitude is None or longitude is None:
+        print(
+            "Latitude or Longitude is not provided. Aborting fetch operation."
+            )
+        return None
+
+    return fetch_moon_data_batch(
+        [(latitude, longitude, from_date, to_date)], time)[0]
+
+
+def derive_arena_responses(shared_response, games, time="00:00:00"):
+    """Derives each arena's moon data from data shared by every arena.
+
+    Every field of the shared response is kept except the altitude and
+    azimuth, which depend on where the moon is seen from and are computed
+    for each arena at the local time of day there. All arenas and dates are
+    computed in one vectorized pass. The ephemeris is also evaluated for the
+    shared location, so the error of sharing the other fields can be
+    bounded by how much they differ between each arena and the shared
+    location.
+
+    Args:
+        shared_response: A moon positions response for the shared location.
+        games: A list of (game ID, game date, latitude, longitude) tuples
+            of the games in the response's date range.
+        time: Local time of the day the data is for. Defaults to
+            "00:00:00".
+
+    Returns:
+        A tuple of a list of (response, game_id_dates) tuples, one per
+        arena, with responses shaped like the Astronomy API response for
+        that arena, and a dictionary mapping each shared field to an array
+        of its absolute differences between the arenas and the shared
+        location, or a mismatch flag for text fields.
+    """
+    if not shared_response:
+        return [], {}
+
+    data = shared_response.get('data', {})
+    location = data.get('observer', {}).get('location', {})
+    shared_latitude = float(location.get('latitude'))
+    shared_longitude = float(location.get('longitude'))
+    positions_by_date = {
+        position.get('date', '')[:10]: position
+        for row in data.get('rows', [])
+        for position in row.get('positions', [])
+    }
+
+    arena_games = {}
+    for game_id, game_date, latitude, longitude in games:
+        arena_games.setdefault((latitude, longitude), []).append(
+            (game_id, game_date))
+
+    # One entry per arena and game date that the shared response covers.
+    entries = [
+        (latitude, longitude, date)
+        for (latitude, longitude), game_id_dates in arena_games.items()
+        for date in sorted({game_date.strftime('%Y-%m-%d')
+                            for _, game_date in game_id_dates})
+        if date in positions_by_date
+    ]
+    if not entries:
+        return [], {}
+
+    latitudes, longitudes, dates = (np.array(values) for values in
+                                    zip(*entries))
+    local_times = np.array([f"{date}T{time}" for date in dates],
+                           dtype='datetime64[s]')
+    utc_offsets = np.array([
+        np.timedelta64(get_utc_offset(latitude, longitude))
+        for latitude, longitude in zip(latitudes, longitudes)
+    ]).astype('timedelta64[s]')
+    shared_utc_offset = np.timedelta64(
+        get_utc_offset(shared_latitude, shared_longitude)).astype(
+            'timedelta64[s]')
+
+    arena = compute_moon_positions(local_times - utc_offsets,
+                                   latitudes.astype(float),
+                                   longitudes.astype(float))
+    shared = compute_moon_positions(local_times - shared_utc_offset,
+                                    shared_latitude, shared_longitude)
+
+    field_errors = {
+        field: np.abs(arena[field] - shared[field])
+        for field in SHARED_NUMERIC_FIELDS
+    }
+    # Right ascension wraps around at 24 hours.
+    field_errors['right_ascension_hours'] = np.minimum(
+        field_errors['right_ascension_hours'],
+        24 - field_errors['right_ascension_hours'])
+    for field in SHARED_TEXT_FIELDS:
+        field_errors[field] = arena[field] != shared[field]
+
+    altitudes = [f"{value:.2f}" for value in arena['altitude'].tolist()]
+    azimuths = [f"{value:.2f}" for value in arena['azimuth'].tolist()]
+
+    arena_positions = {}
+    for index, (latitude, longitude, date) in enumerate(entries):
+        position = positions_by_date[date]
+        sky_position = dict(position.get('position', {}), horizontal={
+            'altitude': {'degrees': altitudes[index]},
+            'azimuth': {'degrees': azimuths[index]},
+        })
+        arena_positions.setdefault((latitude, longitude), []).append(
+            dict(position, position=sky_position))
+
+    responses = []
+    for (latitude, longitude), positions in arena_positions.items():
+        response = {
+            'data': {
+                'observer': {'location': {
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'elevation': 0,
+                }},
+                'rows': [{
+                    'body': {'id': 'moon', 'name': 'Moon'},
+                    'positions': positions,
+                }],
+            }
+        }
+        responses.append((response, arena_games[(latitude, longitude)]))
+
+    return responses, field_errors
+
+
+def report_shared_field_errors(field_errors):
+    """Prints error bounds of sharing moon data across arenas.
+
+    Args:
+        field_errors: A list of dictionaries returned by
+            `derive_arena_responses`.
+    """
+    field_errors = [errors for errors in field_errors if errors]
+    if not field_errors:
+        return
+
+    print("Shared moon data error bounds (arena vs shared location):")
+    for field, unit in SHARED_NUMERIC_FIELDS.items():
+        errors = np.concatenate([errors[field] for errors in field_errors])
+        print(f"  {field}: max {errors.max():.4f} {unit}, "
+              f"95th percentile {np.percentile(errors, 95):.4f} {unit}")
+    for field in SHARED_TEXT_FIELDS:
+        mismatches = np.concatenate([errors[field]
+                                     for errors in field_errors])
+        print(f"  {field}: differs on {mismatches.mean():.2%} "
+              f"of arena dates")
+
+
+if __name__ == "__main__":
+    pass
@@ -3,16 +3,22 @@
 This module interfaces with the NBA API through the use of the nba_api package.
 It supports fetching data for different endpoints such as player game logs,
 team game logs, and team details, and saving the fetched data to a file. It
-also provides functionality to parse and transform the raw JSON data into a
-more usable format.
+also provides functionality to parse and transform the raw JSON data into
+typed NumPy columns or rows. Fetches can be run concurrently across a
+thread pool, with a shared token-bucket rate limiter keeping request volume
+within what stats.nba.com tolerates.
 """
 
 import json
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy as np
+import requests
 from nba_api.stats import endpoints
 
-from data_pipeline.utils import utils
+from data_pipeline.utils import retry, utils
 
 ENDPOINT_MAP = {
     'playergamelogs': {
@@ -29,30 +35,100 @@ ENDPOINT_MAP = {
     },
 }
 
+# Defaults for concurrent fetching. stats.nba.com starts refusing clients
+# that sustain much more than one request per second.
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+DEFAULT_BURST = 2
 
-def fetch_nba_data(endpoint, **kwargs):
+
+class RateLimiter:
+    """Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `burst`. Each
+    request consumes one token, blocking until one is available.
+
+    Attributes:
+        rate: Number of tokens added per second.
+        burst: Maximum number of tokens the bucket can hold.
+        requests_made: Number of requests that have acquired a token.
+        throttled_seconds: Total time callers spent waiting for a token.
+    """
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.requests_made = 0
+        self.throttled_seconds = 0.0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._last_refill) * self.rate
+                    )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requests_made += 1
+                    self.throttled_seconds += waited
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def report(self):
+        """Prints the number of requests made and time spent throttled."""
+        print(f"Rate limited requests made: {self.requests_made}")
+        print(f"Time spent throttled: {self.throttled_seconds:.2f}s")
+
+
+def fetch_nba_data(endpoint, rate_limiter=None, refresh=False, **kwargs):
     """Fetches NBA data from the specified endpoint.
 
+    stats.nba.com often times out or drops connections under load, so those
+    failures are retried with exponential backoff and jitter.
+
     Args:
         endpoint: The API endpoint to fetch data from.
+        rate_limiter: Optional. A RateLimiter to acquire a token from before
+            calling the API. Cached responses do not consume a token.
+        refresh: Whether to skip the cached response and call the API. The
+            new response still replaces the cached one. Defaults to False.
         **kwargs: Additional keyword arguments to pass to the API call.
 
     Returns:
-        The fetched data as a JSON object.
+        The fetched data as a decoded JSON object.
 
     Raises:
         ValueError: If the endpoint is not supported or found in the NBA API.
+        requests.exceptions.RequestException: If the request failed after
+            all retries.
     """
     print("Fetching NBA data...")
     if endpoint not in ENDPOINT_MAP:
         raise ValueError(f"Unsupported endpoint: {endpoint}")
 
-    if utils.check_file_exists(endpoint, **kwargs):
-        print("File already exists with requested data.")
-        print("Returning file contents instead.")
-        file_path = utils.generate_file_name(endpoint, **kwargs)
-        with open(file_path, "r", encoding="utf-8") as file:
-            return json.load(file)
+    cached_response = (None if refresh
+                       else utils.load_cached_response(endpoint, **kwargs))
+    if isinstance(cached_response, str):
+        # Earlier versions cached the undecoded response text. Decode it
+        # once and cache the decoded response in its place.
+        cached_response = json.loads(cached_response)
+        utils.save_cached_response(cached_response, endpoint, **kwargs)
+    if cached_response is not None:
+        print("Cached response exists with requested data.")
+        print("Returning cached response instead.")
+        return cached_response
 
     else:
         endpoint_function_name = ENDPOINT_MAP[endpoint]['resource']
@@ -62,31 +138,125 @@ def fetch_nba_data(endpoint, **kwargs):
             raise ValueError(
                 f"{endpoint_function_name} not found in nba_api")
 
-        response = fetch_endpoint(**kwargs).get_json()
-        utils.save_data_to_file(response, endpoint, **kwargs)
-        print("Successfully fetched NBA data and saved to json folder.")
+        def get_response():
+            # Every attempt, retries included, waits for its own token.
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            return fetch_endpoint(**kwargs).get_dict()
+
+        response = retry.call_with_retry(
+            get_response,
+            transient_errors=(requests.exceptions.Timeout,
+                              requests.exceptions.ConnectionError))
+        utils.save_cached_response(response, endpoint, **kwargs)
+        print("Successfully fetched NBA data and saved to response store.")
 
         return response
 
 
-def parse_transform_nba_data(response,
-                             resultset_name,
-                             first_primary_key=None,
-                             second_primary_key=None):
-    """Parses and transforms NBA data from a raw JSON response.
+def fetch_nba_data_concurrent(fetch_requests,
+                              max_workers=DEFAULT_MAX_WORKERS,
+                              rate_limiter=None,
+                              refresh=False):
+    """Fetches NBA data for many requests across a thread pool.
+
+    Each request is fetched with `fetch_nba_data`, so cached responses are
+    reused and new responses are saved as usual. Results are yielded as soon
+    as each fetch completes, letting callers parse and insert one response
+    while the others are still in flight.
 
     Args:
-        response: The raw JSON response from the NBA API.
-        result_set_name: The name of the result set to extract data from.
+        fetch_requests: An iterable of (endpoint, kwargs) tuples, where
+            kwargs is a dictionary of arguments for the API call.
+        max_workers: Number of threads fetching concurrently.
+        rate_limiter: Optional. A RateLimiter shared by all workers. Defaults
+            to a new RateLimiter with the module defaults.
+        refresh: Whether to skip cached responses and call the API for
+            every request. Defaults to False.
+
+    Yields:
+        Tuples of (endpoint, kwargs, response) in completion order. The
+        response is None if the request failed after all retries.
+
+    Raises:
+        ValueError: If an endpoint is not supported or found in the NBA API.
+    """
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch_nba_data, endpoint,
+                                rate_limiter=rate_limiter, refresh=refresh,
+                                **kwargs):
+                (endpoint, kwargs)
+                for endpoint, kwargs in fetch_requests
+            }
+            for future in as_completed(futures):
+                endpoint, kwargs = futures[future]
+                try:
+                    response = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"Failed to fetch NBA data from {endpoint}: {e}")
+                    response = None
+                yield endpoint, kwargs, response
+    finally:
+        rate_limiter.report()
+
+
+def _to_typed_column(values):
+    """Converts a column of JSON values to the narrowest NumPy array.
+
+    Columns holding only integers or only numbers become int64 or float64
+    arrays. Anything else, including columns with missing values, stays an
+    object array so None is preserved.
+
+    Args:
+        values: A tuple of values from one column of a result set.
+
+    Returns:
+        A NumPy array holding the column.
+    """
+    value_types = set(map(type, values))
+    if value_types == {int}:
+        return np.array(values, dtype=np.int64)
+    if value_types and value_types <= {int, float}:
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=object)
+
+
+def _join_key_columns(first_column, second_column):
+    """Builds composite key values of the form 'first_second'."""
+    return np.char.add(np.char.add(first_column.astype(str), '_'),
+                       second_column.astype(str)).astype(object)
+
+
+def parse_nba_data_columns(response,
+                           resultset_name,
+                           first_primary_key=None,
+                           second_primary_key=None):
+    """Parses an NBA result set into typed columns in a single pass.
+
+    The row set is transposed once into columns, each column is converted to
+    a typed NumPy array, game dates are parsed in bulk and composite keys are
+    built with vectorized string operations.
+
+    Args:
+        response: The raw JSON response from the NBA API, either as a string
+            or already decoded.
+        resultset_name: The name of the result set to extract data from.
         first_primary_key: Optional. The first column to use as part of a
             composite primary key.
         second_primary_key: Optional. The second column to use as part of a
             composite primary key.
 
     Returns:
-        A tuple containing the headers and records of the transformed data.
+        A tuple containing the headers and a list of NumPy arrays, one per
+        header, or (None, None) if the result set is not found.
     """
-    response_json = json.loads(response)
+    response_json = (json.loads(response) if isinstance(response, str)
+                     else response)
     result_set = next((
         item for item in response_json['resultSets']
         if item['name'] == resultset_name), None
@@ -96,43 +266,65 @@ def parse_transform_nba_data(response,
         print(f"No result set found with the name: {resultset_name}")
         return None, None
 
-    headers = result_set['headers']
-    records = result_set['rowSet']
+    headers = [header.lower() for header in result_set['headers']]
+    rows = result_set['rowSet']
 
-    headers = [header.lower() for header in headers]
+    if rows:
+        columns = [_to_typed_column(values) for values in zip(*rows)]
+    else:
+        columns = [np.array([], dtype=object) for _ in headers]
 
     if 'game_date' in headers:
         game_date_index = headers.index('game_date')
-        records = [
-            record[:game_date_index] + [
-                datetime.strptime(record[game_date_index], '%Y-%m-%dT%H:%M:%S')
-                ] + record[game_date_index + 1:]
-            if record[game_date_index] else record
-            for record in records
-        ]
+        game_dates = columns[game_date_index]
+        columns[game_date_index] = np.array(
+            [value if value else None for value in game_dates],
+            dtype='datetime64[s]')
 
     if resultset_name == 'PlayerGameLogs':
         headers.append('team_id_game_id')
-        team_id_index = headers.index('team_id')
-        game_id_index = headers.index('game_id')
-        records = [
-            record + [f"{record[team_id_index]}_{record[game_id_index]}"]
-            for record in records
-        ]
+        columns.append(_join_key_columns(columns[headers.index('team_id')],
+                                         columns[headers.index('game_id')]))
 
     if first_primary_key and second_primary_key:
         new_primary_key = f"{first_primary_key}_{second_primary_key}"
-        headers.append(new_primary_key.lower())
-
         first_key_index = headers.index(first_primary_key.lower())
         second_key_index = headers.index(second_primary_key.lower())
+        headers.append(new_primary_key.lower())
+        columns.append(_join_key_columns(columns[first_key_index],
+                                         columns[second_key_index]))
+
+    return headers, columns
+
+
+def parse_transform_nba_data(response,
+                             resultset_name,
+                             first_primary_key=None,
+                             second_primary_key=None):
+    """Parses and transforms NBA data from a raw JSON response.
+
+    Adapter over `parse_nba_data_columns` for callers that work with rows.
+    Values are converted to native Python types, with dates becoming
+    datetime objects and missing dates becoming None.
+
+    Args:
+        response: The raw JSON response from the NBA API.
+        result_set_name: The name of the result set to extract data from.
+        first_primary_key: Optional. The first column to use as part of a
+            composite primary key.
+        second_primary_key: Optional. The second column to use as part of a
+            composite primary key.
 
-        records = [
-            record + [f"{record[first_key_index]}_{record[second_key_index]}"]
-            for record in records
-        ]
+    Returns:
+        A tuple containing the headers and records of the transformed data.
+    """
+    headers, columns = parse_nba_data_columns(response, resultset_name,
+                                              first_primary_key,
+                                              second_primary_key)
+    if headers is None:
+        return None, None
 
-    return headers, records
+    return headers, list(zip(*(column.tolist() for column in columns)))
 
 
 if __name__ == "__main__":
@@ -4,82 +4,413 @@ This module is designed for fetching, transforming, and inserting data related
 to NBA player game logs, team game logs, team details, and astronomical
 (moon-related) events into a database. It leverages external APIs to gather
 NBA game data and moon phase data, then processes and inserts this data into
-specific database tables for further analysis or presentation.
+specific database tables for further analysis or presentation. Progress is
+recorded per work unit in the ingestion journal, so an interrupted run can
+be resumed without redoing the units that were already stored. Payloads
+whose content hash matches the one last loaded for their work unit are not
+parsed or inserted again, and changed payloads only rewrite the rows that
+changed.
 """
-from data_pipeline.api import nba_client, astro_client
-from data_pipeline.database import queries
+import json
+import threading
 
+from data_pipeline.api import (nba_client, astro_client, astro_async_client,
+                               moon_ephemeris)
+from data_pipeline.database import storage
+from data_pipeline.utils import utils
+from data_pipeline.utils.journal import get_journal
 
-def fetch_and_insert_player_team_logs_data(seasons):
+
+# Game log endpoints and the tables their result sets are stored in.
+GAME_LOG_DATA_MAP = {
+    'playergamelogs': {
+        'table_name': 'player_game_logs',
+        'resultSets': 'PlayerGameLogs',
+        'table_primary_key': 'player_id_game_id',
+        'first_primary_key': 'player_id',
+        'second_primary_key': 'game_id'
+    },
+    'teamgamelogs': {
+        'table_name': 'team_game_logs',
+        'resultSets': 'TeamGameLogs',
+        'table_primary_key': 'team_id_game_id',
+        'first_primary_key': 'team_id',
+        'second_primary_key': 'game_id'
+    },
+}
+
+# Team details stages of different seasons run one at a time, so a team
+# seen in several seasons is only fetched by the first of them.
+_team_details_lock = threading.Lock()
+
+
+def _is_unchanged(unit_key, content_hash, loaded_hashes):
+    """Checks whether a work unit's payload was already loaded as is."""
+    if loaded_hashes.get(unit_key) != content_hash:
+        return False
+    print(f"Skipping {unit_key}, unchanged since it was last loaded.")
+    return True
+
+
+def _check_failed_units(stage, failed_units, total_units):
+    """Fails a stage if any of its work units failed.
+
+    Raising makes the scheduler skip the stages that depend on this one,
+    and the next run resumes the failed units from the journal.
+
+    Raises:
+        RuntimeError: If failed_units is not zero.
+    """
+    if failed_units:
+        raise RuntimeError(f"{failed_units} of {total_units} {stage} work "
+                           f"units failed; rerun to resume them")
+
+
+def reset_player_team_logs(seasons):
+    """Empties the player and team logs of seasons so they can be reloaded.
+
+    The seasons' rows are removed from the game log tables, swapping out
+    their partitions where the tables are partitioned, and the payload
+    hashes of their work units are forgotten, so the next load stores the
+    seasons again even if their payloads did not change.
+
+    Args:
+        seasons: A list of seasons to reset.
+    """
+    for table in GAME_LOG_DATA_MAP.values():
+        for season in seasons:
+            storage.reset_season(table['table_name'], season)
+    storage.delete_payload_hashes([
+        f"{endpoint}:{season}"
+        for endpoint in GAME_LOG_DATA_MAP for season in seasons
+    ])
+
+
+def fetch_and_insert_player_team_logs_data(
+        seasons,
+        max_workers=nba_client.DEFAULT_MAX_WORKERS,
+        incremental=False,
+        rate_limiter=None,
+        refresh=False):
     """Fetches and stores player and team logs for the specified seasons.
 
+    In incremental mode, seasons with a watermark are only fetched from the
+    date of their latest ingested game onwards, bypassing cached responses
+    so newly played games are picked up. Watermarks are updated after every
+    run.
+
     Args:
         seasons: A list of seasons to fetch data for.
+        max_workers: Number of threads fetching from the NBA API at once.
+        incremental: Whether to fetch only games newer than each season's
+            watermark. Defaults to False.
+        rate_limiter: Optional. A RateLimiter to share with other fetches
+            running at the same time.
+        refresh: Whether to call the API instead of using cached responses,
+            as incremental runs always do. Defaults to False.
+
+    Raises:
+        RuntimeError: If any work unit failed. The units that succeeded are
+            kept and the next run resumes the failed ones.
     """
-    data_map = {
-        'playergamelogs': {
-            'table_name': 'player_game_logs',
-            'resultSets': 'PlayerGameLogs',
-            'table_primary_key': 'player_id_game_id',
-            'first_primary_key': 'player_id',
-            'second_primary_key': 'game_id'
-        },
-        'teamgamelogs': {
-            'table_name': 'team_game_logs',
-            'resultSets': 'TeamGameLogs',
-            'table_primary_key': 'team_id_game_id',
-            'first_primary_key': 'team_id',
-            'second_primary_key': 'game_id'
-        },
-    }
-
-    for season in seasons:
-        for endpoint, table in data_map.items():
-            response = nba_client.fetch_nba_data(endpoint,
-                                                 season_nullable=season)
-            headers, records = nba_client.parse_transform_nba_data(
-                response, table['resultSets'],
-                table['first_primary_key'], table['second_primary_key']
-            )
-            queries.insert_new_data(table['table_name'],
-                                    table['table_primary_key'],
-                                    headers, records)
+    # Each endpoint and season is a work unit in the journal, so a resumed
+    # run skips the ones that were already stored.
+    journal = get_journal()
+    fetch_requests = []
+    for endpoint, table in GAME_LOG_DATA_MAP.items():
+        watermarks = (storage.get_watermarks(table['table_name'])
+                      if incremental else {})
+        for season in seasons:
+            if journal.is_done(f"{endpoint}:{season}"):
+                print(f"Skipping {endpoint} {season}, already ingested.")
+                continue
+            kwargs = {'season_nullable': season}
+            if season in watermarks:
+                last_game_date, last_game_id = watermarks[season]
+                print(f"{table['table_name']} {season} watermark: "
+                      f"{last_game_id} on {last_game_date:%Y-%m-%d}")
+                # Games on the watermark date itself are fetched again in
+                # case the day was only partly ingested; duplicates are
+                # skipped on insert.
+                kwargs['date_from_nullable'] = (
+                    last_game_date.strftime('%m/%d/%Y'))
+            fetch_requests.append((endpoint, kwargs))
+    journal.add_units('game_logs', [
+        f"{endpoint}:{kwargs['season_nullable']}"
+        for endpoint, kwargs in fetch_requests
+    ])
+
+    # Payloads that did not change since they were last loaded are skipped
+    # before they are parsed.
+    loaded_hashes = storage.get_payload_hashes()
+    payload_hashes = {}
+    failed_units = 0
+    for endpoint, kwargs, response in nba_client.fetch_nba_data_concurrent(
+            fetch_requests, max_workers=max_workers,
+            rate_limiter=rate_limiter, refresh=incremental or refresh):
+        unit_key = f"{endpoint}:{kwargs['season_nullable']}"
+        if response is None:
+            journal.mark_failed('game_logs', unit_key, "fetch failed")
+            failed_units += 1
+            continue
+
+        content_hash = utils.get_response_hash(response, endpoint, **kwargs)
+        if _is_unchanged(unit_key, content_hash, loaded_hashes):
+            journal.mark_done('game_logs', unit_key)
+            continue
+
+        table = GAME_LOG_DATA_MAP[endpoint]
+        headers, columns = nba_client.parse_nba_data_columns(
+            response, table['resultSets'],
+            table['first_primary_key'], table['second_primary_key']
+        )
+        records_written = storage.upsert_changed_data(
+            table['table_name'], table['table_primary_key'], headers,
+            columns=columns)
+        if records_written is None:
+            journal.mark_failed('game_logs', unit_key, "insert failed")
+            failed_units += 1
+            continue
+        journal.mark_done('game_logs', unit_key)
+        payload_hashes[unit_key] = content_hash
+
+    storage.update_payload_hashes(payload_hashes)
+    for table in GAME_LOG_DATA_MAP.values():
+        storage.update_watermarks(table['table_name'], seasons)
+    # Moon events refer to games, which are taken from the team game logs.
+    storage.update_games(seasons)
+
+    _check_failed_units('game_logs', failed_units, len(fetch_requests))
+
 
+def fetch_and_insert_team_details(
+        max_workers=nba_client.DEFAULT_MAX_WORKERS,
+        incremental=False,
+        rate_limiter=None):
+    """Adds team details data based on team_id from team_game_logs.
 
-def fetch_and_insert_team_details():
-    """Adds team details data based on team_id from team_game_logs."""
-    unique_team_ids = queries.get_distinct_records(['team_id'],
+    Teams whose details were already stored in this run are skipped, so the
+    stage can run once per season as each season's game logs are loaded.
+
+    Args:
+        max_workers: Number of threads fetching from the NBA API at once.
+        incremental: Whether to only fetch details for teams that are not
+            in team_details yet. Defaults to False.
+        rate_limiter: Optional. A RateLimiter to share with other fetches
+            running at the same time.
+
+    Raises:
+        RuntimeError: If any work unit failed. The units that succeeded are
+            kept and the next run resumes the failed ones.
+    """
+    with _team_details_lock:
+        _fetch_and_insert_team_details(max_workers, incremental,
+                                       rate_limiter)
+
+
+def _fetch_and_insert_team_details(max_workers, incremental, rate_limiter):
+    """Adds team details data. See `fetch_and_insert_team_details`."""
+    unique_team_ids = storage.get_distinct_records(['team_id'],
                                                    'team_game_logs')
 
-    for team_id in unique_team_ids:
-        response = nba_client.fetch_nba_data('teamdetails', team_id=team_id)
-        headers, rows = nba_client.parse_transform_nba_data(response,
-                                                            'TeamBackground')
-        queries.insert_new_data('team_details', 'team_id', headers, rows)
+    if incremental:
+        existing_team_ids = set(
+            storage.get_distinct_records(['team_id'], 'team_details') or []
+            )
+        unique_team_ids = [team_id for team_id in unique_team_ids
+                           if team_id not in existing_team_ids]
+        if not unique_team_ids:
+            print("No new teams to fetch details for.")
+            return
 
-    queries.update_records_from_csv(
+    # Each team is a work unit in the journal. Distinct records are
+    # one-column tuples.
+    journal = get_journal()
+    fetch_requests = [
+        ('teamdetails', {'team_id': team_id})
+        for team_id in unique_team_ids
+        if not journal.is_done(f"teamdetails:{team_id[0]}")
+    ]
+    journal.add_units('team_details', [
+        f"teamdetails:{kwargs['team_id'][0]}" for _, kwargs in fetch_requests
+    ])
+
+    loaded_hashes = storage.get_payload_hashes()
+    payload_hashes = {}
+    failed_units = 0
+    for endpoint, kwargs, response in nba_client.fetch_nba_data_concurrent(
+            fetch_requests, max_workers=max_workers,
+            rate_limiter=rate_limiter):
+        unit_key = f"teamdetails:{kwargs['team_id'][0]}"
+        if response is None:
+            journal.mark_failed('team_details', unit_key, "fetch failed")
+            failed_units += 1
+            continue
+
+        content_hash = utils.get_response_hash(response, endpoint, **kwargs)
+        if _is_unchanged(unit_key, content_hash, loaded_hashes):
+            journal.mark_done('team_details', unit_key)
+            continue
+
+        headers, columns = nba_client.parse_nba_data_columns(
+            response, 'TeamBackground')
+        if storage.upsert_changed_data('team_details', 'team_id', headers,
+                                       columns=columns) is None:
+            journal.mark_failed('team_details', unit_key, "insert failed")
+            failed_units += 1
+            continue
+        journal.mark_done('team_details', unit_key)
+        payload_hashes[unit_key] = content_hash
+
+    storage.update_payload_hashes(payload_hashes)
+    storage.update_records_from_csv(
         'data_pipeline/data/nba_arena_location_data.csv',
         'team_details', 'abbreviation')
 
+    _check_failed_units('team_details', failed_units, len(fetch_requests))
 
-def fetch_and_insert_moon_data():
-    """Queries db for NBA game data and fetches moon data for each game."""
-    moon_data_params_list = astro_client.get_moon_data_params()
-    # Uncomment to save to parameter list to csv for testing.
-    # utils.save_to_csv(moon_data_params_list, 'moon_data_params_list.csv')
 
-    moon_data_params = astro_client.clean_moon_data_params(
-        moon_data_params_list)
+def fetch_and_insert_moon_data(
+        backend='async',
+        max_concurrency=astro_async_client.DEFAULT_MAX_CONCURRENCY,
+        max_gap_days=astro_client.DEFAULT_MAX_GAP_DAYS,
+        incremental=False,
+        shared=False,
+        seasons=None):
+    """Queries db for NBA game data and fetches moon data for each game.
+
+    Args:
+        backend: How to fetch moon data. 'async' fetches all requests
+            concurrently over one shared session, 'api' fetches them one at
+            a time and 'local' computes them offline with the moon ephemeris
+            engine, without any network calls.
+        max_concurrency: Maximum number of requests in flight when using the
+            'async' backend.
+        max_gap_days: Largest number of days between two game dates at an
+            arena that are still fetched in the same request window.
+        incremental: Whether to only fetch moon data for games that have
+            no moon events yet. Defaults to False.
+        shared: Whether to fetch moon data once per date for every arena and
+            derive each arena's altitude and azimuth locally, instead of
+            fetching it once per arena. Defaults to False.
+        seasons: Optional. A list of seasons to fetch moon data for, so the
+            seasons can be fetched as separate stages. Defaults to every
+            season in the team game logs.
+
+    Raises:
+        ValueError: If the backend is not supported.
+        RuntimeError: If any work unit failed. The units that succeeded are
+            kept and the next run resumes the failed ones.
+    """
+    # Games are streamed from the database straight into the planner.
+    moon_data_params_iter = astro_client.iter_moon_data_params(
+        new_games_only=incremental, seasons=seasons)
+    if shared:
+        moon_data_params, arena_days_requested = (
+            astro_client.plan_shared_moon_data_windows(
+                moon_data_params_iter, max_gap_days=max_gap_days))
+    else:
+        moon_data_params = astro_client.plan_moon_data_windows(
+            moon_data_params_iter, max_gap_days=max_gap_days)
+    # Each request window is a work unit in the journal. Windows are
+    # planned anew on every run, so they replace the unfinished ones of the
+    # same seasons.
+    stage = 'moon_data'
+    if seasons is not None:
+        stage += f":{','.join(seasons)}"
+    journal = get_journal()
+    unit_keys = [f"moon_data:{lat},{lon}:{from_date}:{to_date}"
+                 for lat, lon, from_date, to_date, _ in moon_data_params]
+    journal.add_units(stage, unit_keys, replace_unfinished=True)
+    pending = [(params, unit_key)
+               for params, unit_key in zip(moon_data_params, unit_keys)
+               if not journal.is_done(unit_key)]
+    if len(pending) < len(moon_data_params):
+        print(f"Skipping {len(moon_data_params) - len(pending)} moon data "
+              f"requests, already ingested.")
+
+    if not moon_data_params:
+        print("No games to fetch moon data for.")
+        return
+    if not pending:
+        print("All moon data requests were already ingested; nothing to "
+              "fetch.")
+        return
     # Uncomment to save to parameter list to csv for testing.
     # utils.save_to_csv(moon_data_params, 'moon_data_params.csv')
 
-    for params in moon_data_params:
-        latitude, longitude, from_date, to_date, game_id_dates = params
-        moon_data = astro_client.fetch_moon_data(latitude, longitude,
-                                                 from_date, to_date)
-        headers, rows = astro_client.parse_transform_moon_data(moon_data,
-                                                               game_id_dates)
-        queries.insert_new_data('moon_events', 'moon_event_id', headers, rows)
+    if backend == 'async':
+        responses = astro_async_client.fetch_moon_data_batch(
+            [params[:4] for params, _ in pending],
+            max_concurrency=max_concurrency)
+    elif backend == 'local':
+        responses = moon_ephemeris.fetch_moon_data_batch(
+            [params[:4] for params, _ in pending])
+    elif backend == 'api':
+        responses = (astro_client.fetch_moon_data(*params[:4])
+                     for params, _ in pending)
+    else:
+        raise ValueError(f"Unsupported moon data backend: {backend}")
+
+    loaded_hashes = storage.get_payload_hashes()
+    payload_hashes = {}
+    response_bytes = 0
+    field_errors = []
+    failed_units = 0
+    for (params, unit_key), moon_data in zip(pending, responses):
+        if moon_data is None:
+            journal.mark_failed(stage, unit_key, "fetch failed")
+            failed_units += 1
+            continue
+
+        if shared:
+            response_bytes += len(json.dumps(moon_data))
+
+        # Locally computed moon data is not cached, so it is hashed as is.
+        if backend == 'local':
+            content_hash = utils.get_response_hash(moon_data)
+        else:
+            latitude, longitude, from_date, to_date = params[:4]
+            content_hash = utils.get_response_hash(
+                moon_data, 'moon_data', from_date=from_date,
+                to_date=to_date, time="00:00:00", latitude=latitude,
+                longitude=longitude)
+        if _is_unchanged(unit_key, content_hash, loaded_hashes):
+            journal.mark_done(stage, unit_key)
+            continue
+
+        if shared:
+            arena_responses, errors = moon_ephemeris.derive_arena_responses(
+                moon_data, params[4])
+            field_errors.append(errors)
+        else:
+            arena_responses = [(moon_data, params[4])]
+
+        inserted = True
+        for arena_moon_data, game_id_dates in arena_responses:
+            headers, rows = astro_client.parse_transform_moon_data(
+                arena_moon_data, game_id_dates)
+            records_written = storage.upsert_changed_data(
+                'moon_events', 'moon_event_id', headers, records=rows)
+            inserted = inserted and records_written is not None
+
+        if not inserted:
+            journal.mark_failed(stage, unit_key, "insert failed")
+            failed_units += 1
+            continue
+        journal.mark_done(stage, unit_key)
+        payload_hashes[unit_key] = content_hash
+
+    storage.update_payload_hashes(payload_hashes)
+
+    if shared:
+        # Savings are only comparable when every planned window was fetched.
+        if len(pending) == len(moon_data_params) and not failed_units:
+            astro_client.report_shared_response_bytes(
+                moon_data_params, response_bytes, arena_days_requested)
+        moon_ephemeris.report_shared_field_errors(field_errors)
+
+    _check_failed_units(stage, failed_units, len(pending))
 
 
 if __name__ == "__main__":
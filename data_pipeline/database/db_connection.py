@@ -5,13 +5,23 @@ configuration file and establish a connection to a PostgreSQL database using
 these configurations. It supports connecting to a specific database for
 regular operations or to a default administrative database for administrative
 tasks like creating or deleting databases.
+
+Regular operations check connections out of a process-wide pool, so a run
+opens a handful of connections instead of one per query. The configuration
+file is only read once.
 """
 
 import os
 import configparser
+import functools
+import threading
+import time
+from contextlib import contextmanager
 
 from psycopg2 import connect, Error
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.extensions import (ISOLATION_LEVEL_AUTOCOMMIT,
+                                 TRANSACTION_STATUS_UNKNOWN)
+from psycopg2.pool import ThreadedConnectionPool
 
 
 # Define the path to the configuration file relative to this module.
@@ -20,12 +30,20 @@ CONFIG_FILE_PATH = os.path.abspath(
         os.path.dirname(__file__), '..', 'config', 'db_credentials.ini')
 )
 
+# Defaults for the connection pool. Connections idle for longer than
+# HEALTH_CHECK_INTERVAL_SECONDS are pinged before being handed out.
+DEFAULT_MIN_CONNECTIONS = 1
+DEFAULT_MAX_CONNECTIONS = 8
+HEALTH_CHECK_INTERVAL_SECONDS = 30
+
 
+@functools.lru_cache(maxsize=None)
 def get_database_config():
     """Fetches the database configuration from a .ini file.
 
     Reads database credentials from a configuration file and returns them as
-    a dictionary.
+    a dictionary. The file is only read on the first call; later calls
+    return the cached configuration.
 
     Returns:
         A dictionary containing database configuration.
@@ -95,6 +113,198 @@ def connect_to_database(config=None,
         return None, None
 
 
+class ConnectionPool:
+    """Thread-safe pool of autocommit connections to the database.
+
+    Checkouts block while all max_connections connections are in use. A
+    connection that has been idle for a while is pinged before it is handed
+    out and replaced if it has gone bad.
+
+    Attributes:
+        min_connections: Number of connections opened up front.
+        max_connections: Largest number of connections open at once.
+        checkouts: Number of connections handed out.
+        wait_seconds: Total time callers spent waiting for a connection.
+        peak_in_use: Largest number of connections in use at once.
+        replaced: Number of broken connections that were replaced.
+    """
+
+    def __init__(self,
+                 config,
+                 min_connections=DEFAULT_MIN_CONNECTIONS,
+                 max_connections=DEFAULT_MAX_CONNECTIONS):
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.peak_in_use = 0
+        self.replaced = 0
+        self._in_use = 0
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(max_connections)
+        self._pool = ThreadedConnectionPool(
+            min_connections, max_connections,
+            dbname=config['dbname'],
+            user=config['user'],
+            password=config['password'],
+            host=config['host']
+            )
+
+    def _is_healthy(self, conn):
+        """Checks whether a connection can still be used."""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if (last_used is not None
+                and time.monotonic() - last_used
+                < HEALTH_CHECK_INTERVAL_SECONDS):
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            return True
+        except Error:
+            return False
+
+    def _checkout(self):
+        """Checks out a healthy connection, waiting for one if needed."""
+        wait_start = time.monotonic()
+        self._available.acquire()
+        waited = time.monotonic() - wait_start
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                self._pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+                self.replaced += 1
+                conn = self._pool.getconn()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        except Exception:
+            self._available.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self._in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+        return conn
+
+    def _checkin(self, conn):
+        """Returns a connection to the pool, ending any open transaction.
+
+        A connection whose transaction cannot be ended, such as one the
+        server dropped, is closed, so the pool opens a new one in its place.
+        """
+        try:
+            close = bool(conn.closed)
+            if not close and not conn.autocommit:
+                try:
+                    conn.rollback()
+                    conn.autocommit = True
+                except Error as e:
+                    print(f"Closing connection that failed to roll back: "
+                          f"{e}")
+                    close = True
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._available.release()
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection for the duration of a with block.
+
+        Yields:
+            An autocommit connection to the database.
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    def report(self):
+        """Prints the pool's checkout count, wait time and peak usage."""
+        print(f"Connection pool checkouts: {self.checkouts}")
+        print(f"Connection pool wait time: {self.wait_seconds:.2f}s")
+        print(f"Connection pool peak usage: "
+              f"{self.peak_in_use}/{self.max_connections}")
+        print(f"Connection pool connections replaced: {self.replaced}")
+
+    def close(self):
+        """Closes every connection in the pool."""
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """Returns the process-wide connection pool, creating it on first use.
+
+    Returns:
+        The shared ConnectionPool instance.
+
+    Raises:
+        psycopg2.Error: If the pool cannot open its first connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(get_database_config(),
+                                   DEFAULT_MIN_CONNECTIONS,
+                                   DEFAULT_MAX_CONNECTIONS)
+        return _pool
+
+
+@contextmanager
+def get_connection():
+    """Checks a connection out of the process-wide pool.
+
+    Yields:
+        An autocommit connection to the database, returned to the pool when
+        the with block exits.
+
+    Raises:
+        psycopg2.Error: If no connection to the database can be opened.
+    """
+    with get_connection_pool().connection() as conn:
+        yield conn
+
+
+def report_connection_pool():
+    """Reports on the process-wide connection pool if it is open.
+
+    No pool is created just to report on it, so this is safe to call when
+    the database could not be reached.
+    """
+    with _pool_lock:
+        if _pool is not None:
+            _pool.report()
+
+
+def close_connection_pool():
+    """Closes the process-wide connection pool if it is open.
+
+    A new pool is created the next time a connection is needed.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
 if __name__ == "__main__":
     # Example usage: Connect to the database and print the connection status
     conn, _ = connect_to_database()
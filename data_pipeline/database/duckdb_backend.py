@@ -0,0 +1,680 @@
+"""Module for storing pipeline data in an embedded DuckDB database.
+
+This module implements the pipeline's storage operations on DuckDB, an
+embedded columnar database that runs inside the Python process and keeps
+the whole database in one file, so the pipeline and analytics queries run
+without a PostgreSQL server. Tables are created from the same schemas as on
+PostgreSQL with the PostgreSQL-only parts translated: the game log tables
+are not partitioned, identity columns draw from sequences and secondary
+indexes are left out, as DuckDB skips data with per-column zone maps
+instead. The analysis view is stored as a table that is rebuilt on refresh.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from data_pipeline.database.schema import (ALL_TABLE_SCHEMAS,
+                                           ALL_VIEW_SCHEMAS, ANALYSIS_VIEW,
+                                           get_conflict_columns,
+                                           get_partition_by_sql,
+                                           get_table_schema)
+from data_pipeline.utils import dataset
+from data_pipeline.utils.content_hash import ROW_HASH_COLUMN, hash_rows
+
+# Define the default path of the database file.
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data',
+                                     'nba_moon_data.duckdb')
+
+# Identity columns are created with a default drawn from a sequence, which
+# is how DuckDB numbers rows.
+IDENTITY_SQL = 'GENERATED ALWAYS AS IDENTITY'
+
+# Number of rows per record batch when exporting a dataset.
+EXPORT_FETCH_SIZE = 10000
+
+_database_path = DEFAULT_DATABASE_PATH
+_connection = None
+_connection_lock = threading.Lock()
+
+# Writes are serialized, as concurrent writes to the same table can fail
+# with transaction conflicts in DuckDB.
+_write_lock = threading.Lock()
+
+
+def _quote(identifier):
+    """Quotes a table or column name for use in SQL."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _join_columns(columns):
+    """Quotes and joins column names into a comma-separated list."""
+    return ', '.join(map(_quote, columns))
+
+
+def set_database_path(path):
+    """Sets the database file to use, closing any open connection.
+
+    Args:
+        path: Path to the DuckDB database file. It is created on first use.
+    """
+    global _database_path
+    close_connection()
+    _database_path = path
+
+
+def _get_database_connection():
+    """Returns the process-wide database connection, opening it if needed."""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(_database_path)),
+                        exist_ok=True)
+            _connection = duckdb.connect(_database_path)
+        return _connection
+
+
+@contextmanager
+def get_connection():
+    """Opens a cursor on the process-wide database connection.
+
+    Each cursor is a separate connection to the same database, so threads
+    can run queries at the same time.
+
+    Yields:
+        A DuckDB connection, closed when the with block exits.
+    """
+    cur = _get_database_connection().cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+def close_connection():
+    """Closes the process-wide database connection if it is open."""
+    global _connection
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+
+def report():
+    """Prints the database file and its size, including its write-ahead log.
+    """
+    size = sum(os.path.getsize(path)
+               for path in (_database_path, f"{_database_path}.wal")
+               if os.path.exists(path))
+    print(f"DuckDB database: {os.path.normpath(_database_path)}")
+    print(f"DuckDB database size: {size} bytes")
+
+
+def get_table_creation_sql(table_schema):
+    """Translates a table's PostgreSQL creation SQL for DuckDB.
+
+    Args:
+        table_schema: A dictionary containing the table name, creation SQL
+            and partition layout.
+
+    Returns:
+        A list of SQL statements that create the table.
+    """
+    table_name = table_schema['table_name']
+    creation_sql = table_schema['table_creation_sql']
+    statements = []
+
+    if table_schema['partitioning'] is not None:
+        creation_sql = creation_sql.replace(
+            get_partition_by_sql(table_schema['partitioning']), '')
+
+    if IDENTITY_SQL in creation_sql:
+        sequence = f"{table_name}_{table_schema['primary_key']}_seq"
+        statements.append(f"CREATE SEQUENCE IF NOT EXISTS {sequence};")
+        creation_sql = creation_sql.replace(
+            IDENTITY_SQL, f"DEFAULT nextval('{sequence}')")
+
+    statements.append(creation_sql)
+    return statements
+
+
+def setup_database_schema(with_indexes=True):
+    """Sets up the database file with all tables.
+
+    The analysis view is created as an empty table, which
+    `refresh_analysis_view` fills.
+
+    Args:
+        with_indexes: Unused, as secondary indexes are not created on
+            DuckDB. Accepted for compatibility with `setup`.
+    """
+    with _write_lock, get_connection() as cur:
+        for table in ALL_TABLE_SCHEMAS:
+            try:
+                for statement in get_table_creation_sql(table):
+                    cur.execute(statement)
+                print(f"{table['table_name']} created successfully.")
+            except duckdb.Error as e:
+                print(f"Failed to create {table['table_name']}: {e}")
+
+        for view in ALL_VIEW_SCHEMAS:
+            try:
+                cur.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_quote(view['view_name'])} "
+                    f"AS SELECT * FROM ({view['view_query']}) LIMIT 0;")
+                print(f"{view['view_name']} created successfully.")
+            except duckdb.Error as e:
+                print(f"Failed to create {view['view_name']}: {e}")
+
+
+def wipe_database_schema():
+    """Wipes the database by deleting the database file."""
+    close_connection()
+    for path in (_database_path, f"{_database_path}.wal"):
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"{os.path.normpath(_database_path)} deleted successfully.")
+
+
+def create_all_indexes():
+    """Does nothing, as secondary indexes are not created on DuckDB."""
+    print("Skipping secondary indexes on DuckDB.")
+
+
+def _to_data_frame(headers, records=None, columns=None):
+    """Builds a DataFrame of rows or columns to insert.
+
+    Rows are kept as object columns, so missing values stay None and are
+    cast to the table's column types on insert.
+    """
+    if columns is not None:
+        return pd.DataFrame(dict(zip(headers, columns)))
+    return pd.DataFrame(list(records), columns=headers, dtype=object)
+
+
+def upsert_changed_data(table_name,
+                        primary_key,
+                        headers,
+                        records=None,
+                        columns=None):
+    """Inserts new records and updates the records that changed.
+
+    A hash of each record's values is stored in the table's row hash
+    column. Existing records are only updated when their hash differs from
+    the stored one, then records with new keys are inserted, both in one
+    transaction.
+
+    Args:
+        table_name: Name of the table to upsert data into.
+        primary_key: The primary key column of the table.
+        headers: List of column names of the records, without the row hash.
+        records: Optional. An iterable of tuples representing the records.
+        columns: Optional. A list of NumPy arrays, one per header. Used
+            instead of records when given.
+
+    Returns:
+        The number of records inserted or updated, or None if the upsert
+        failed.
+    """
+    if columns is None:
+        records = list(records)
+    data = _to_data_frame(headers, records=records, columns=columns)
+    data[ROW_HASH_COLUMN] = hash_rows(headers, records=records,
+                                      columns=columns)
+    headers = list(headers) + [ROW_HASH_COLUMN]
+
+    table = _quote(table_name)
+    conflict_columns = get_conflict_columns(table_name, primary_key)
+    key_condition = ' AND '.join(
+        f"target.{_quote(column)} = new_rows.{_quote(column)}"
+        for column in conflict_columns)
+    updates = ', '.join(
+        f"{_quote(header)} = new_rows.{_quote(header)}"
+        for header in headers if header not in conflict_columns)
+    row_hash = _quote(ROW_HASH_COLUMN)
+
+    try:
+        with _write_lock, get_connection() as cur:
+            cur.register('new_rows', data)
+            cur.begin()
+            records_updated = cur.execute(
+                f"UPDATE {table} AS target SET {updates} FROM new_rows "
+                f"WHERE {key_condition} AND target.{row_hash} "
+                f"IS DISTINCT FROM new_rows.{row_hash};").fetchone()[0]
+            records_added = cur.execute(
+                f"INSERT INTO {table} ({_join_columns(headers)}) "
+                f"SELECT {_join_columns(headers)} FROM new_rows "
+                f"ON CONFLICT ({_join_columns(conflict_columns)}) "
+                f"DO NOTHING;").fetchone()[0]
+            cur.commit()
+            cur.unregister('new_rows')
+
+        records_written = records_added + records_updated
+        print(f"Records added or updated: {records_written}")
+        print(f"Records unchanged: {len(data) - records_written}")
+        return records_written
+
+    except duckdb.Error as e:
+        print(f"Error while upserting data: {e}")
+        return None
+
+
+def get_lookup_ids(table_name, keys):
+    """Returns the surrogate keys of values in a lookup table.
+
+    Values that are not in the table yet are added first, so every value
+    gets an ID.
+
+    Args:
+        table_name: Name of a lookup table that declares a unique key.
+        keys: An iterable of values of the table's unique key, as tuples
+            for keys of more than one column. None values are ignored.
+
+    Returns:
+        A dictionary mapping each value to its ID, or an empty dictionary
+        if an error occurs.
+    """
+    table_schema = get_table_schema(table_name)
+    id_column = table_schema['primary_key']
+    key_columns = table_schema['unique_key']
+    single_column = len(key_columns) == 1
+
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    new_keys = pd.DataFrame(
+        [(key,) if single_column else key for key in keys],
+        columns=key_columns)
+
+    table = _quote(table_name)
+    columns = _join_columns(key_columns)
+
+    try:
+        with _write_lock, get_connection() as cur:
+            cur.register('new_keys', new_keys)
+            cur.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"SELECT {columns} FROM new_keys "
+                f"WHERE ({columns}) NOT IN (SELECT {columns} FROM {table}) "
+                f"ON CONFLICT ({columns}) DO NOTHING;")
+            id_rows = cur.execute(
+                f"SELECT {_quote(id_column)}, {columns} FROM {table} "
+                f"WHERE ({columns}) IN (SELECT {columns} FROM new_keys);"
+                ).fetchall()
+            cur.unregister('new_keys')
+
+    except duckdb.Error as e:
+        print(f"Error while looking up {table_name} IDs: {e}")
+        return {}
+
+    return {(key[0] if single_column else tuple(key)): lookup_id
+            for lookup_id, *key in id_rows}
+
+
+def get_distinct_records(column_names, table_name):
+    """Retrieves distinct records for specified columns from a table.
+
+    Args:
+        column_names: List or tuple of column names to get distinct records.
+        table_name: Name of the table to query.
+
+    Returns:
+        A list of tuples representing the distinct records.
+    """
+    try:
+        with get_connection() as cur:
+            return cur.execute(
+                f"SELECT DISTINCT {_join_columns(column_names)} "
+                f"FROM {_quote(table_name)};").fetchall()
+
+    except duckdb.Error as e:
+        print(f"Error while grabbing distinct records: {e}")
+        return None
+
+
+def get_records(table_name,
+                columns=None,
+                where_clause=None,
+                where_params=None):
+    """Fetches records from a table, optionally filtered by a WHERE clause.
+
+    Args:
+        table_name: Name of the table to fetch records from.
+        columns: List of column names to include in the result set. If None,
+                 all columns are included.
+        where_clause: Optional SQL WHERE clause for filtering records, with
+            %s placeholders as in the PostgreSQL backend.
+        where_params: Parameters to substitute into the WHERE clause.
+
+    Returns:
+        A list of tuples representing the fetched records.
+    """
+    fields = _join_columns(columns) if columns else '*'
+    get_records_sql = f"SELECT {fields} FROM {_quote(table_name)}"
+    if where_clause and where_params:
+        get_records_sql += f" WHERE {where_clause.replace('%s', '?')}"
+
+    try:
+        with get_connection() as cur:
+            return cur.execute(get_records_sql,
+                               where_params or None).fetchall()
+
+    except duckdb.Error as e:
+        print(f"Error fetching records: {e}")
+        return None
+
+
+def iter_query_records(query_sql,
+                       params=None,
+                       fetch_size=EXPORT_FETCH_SIZE):
+    """Yields the rows of a query, fetch_size rows at a time.
+
+    Args:
+        query_sql: The SQL query to run, with %s placeholders as in the
+            PostgreSQL backend.
+        params: Optional. Parameters to substitute into the query.
+        fetch_size: Number of rows fetched from the result at a time.
+
+    Yields:
+        The rows of the query, as tuples. Nothing more is yielded if an
+        error occurs.
+    """
+    try:
+        with get_connection() as cur:
+            cur.execute(query_sql.replace('%s', '?'), params)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    except duckdb.Error as e:
+        print(f"Error while reading query records: {e}")
+
+
+def update_records_from_csv(csv_file_path, table_name, key_column):
+    """Updates records in a table from a CSV file.
+
+    The table is updated with a single UPDATE ... FROM join on the key
+    column. Columns of the CSV that the table does not have are ignored,
+    and empty CSV fields set their column to NULL.
+
+    Args:
+        csv_file_path: Path to the CSV file containing the update data.
+        table_name: Name of the table to update.
+        key_column: The key column to match records for updating.
+    """
+    try:
+        df = pd.read_csv(csv_file_path)
+        df.columns = df.columns.str.lower()
+        key_column = key_column.lower()
+
+        with _write_lock, get_connection() as cur:
+            table_columns = [row[0] for row in cur.execute(
+                """SELECT column_name FROM information_schema.columns
+                WHERE table_name = ?;""", [table_name]).fetchall()]
+
+            columns_to_update = [column for column in df.columns
+                                 if column in table_columns
+                                 and column != key_column]
+            if not columns_to_update:
+                print(f"No columns in {csv_file_path} to update "
+                      f"{table_name} with.")
+                return
+            headers = [key_column] + columns_to_update
+            df = df[headers].astype(object).where(df[headers].notna(), None)
+
+            key = _quote(key_column)
+            cur.register('staging', df)
+            records_updated = cur.execute(
+                f"UPDATE {_quote(table_name)} AS target SET "
+                + ', '.join(f"{_quote(column)} = staging.{_quote(column)}"
+                            for column in columns_to_update)
+                + f" FROM staging WHERE target.{key} = staging.{key};"
+                ).fetchone()[0]
+            records_unmatched = cur.execute(
+                f"SELECT COUNT(*) FROM staging WHERE NOT EXISTS ("
+                f"SELECT 1 FROM {_quote(table_name)} AS target "
+                f"WHERE target.{key} = staging.{key});").fetchone()[0]
+            cur.unregister('staging')
+
+        print(f"CSV rows matched: {len(df) - records_unmatched}")
+        print(f"CSV rows unmatched: {records_unmatched}")
+        print(f"Records updated: {records_updated}")
+
+    except (duckdb.Error, FileNotFoundError) as e:
+        print(f"Error updating records: {e}")
+
+
+def get_watermarks(table_name):
+    """Retrieves the latest ingested game per season for a game log table.
+
+    Args:
+        table_name: Name of the game log table.
+
+    Returns:
+        A dictionary mapping each season to a (last_game_date, last_game_id)
+        tuple. Seasons that have not been ingested are not included.
+    """
+    records = get_records('ingestion_watermarks',
+                          columns=['season_year', 'last_game_date',
+                                   'last_game_id'],
+                          where_clause='table_name = %s',
+                          where_params=(table_name,))
+    if records is None:
+        return {}
+
+    return {season: (game_date, game_id)
+            for season, game_date, game_id in records}
+
+
+def update_watermarks(table_name, seasons):
+    """Records the latest game ingested per season for a game log table.
+
+    Args:
+        table_name: Name of the game log table.
+        seasons: A list of seasons to update watermarks for.
+    """
+    try:
+        with _write_lock, get_connection() as cur:
+            updated = cur.execute(
+                f"""INSERT INTO ingestion_watermarks
+                    (table_name, season_year, last_game_date, last_game_id)
+                SELECT DISTINCT ON (season_year)
+                    ?, season_year, game_date, game_id
+                FROM {_quote(table_name)}
+                WHERE season_year IN (SELECT UNNEST(?::VARCHAR[]))
+                ORDER BY season_year, game_date DESC, game_id DESC
+                ON CONFLICT (table_name, season_year) DO UPDATE SET
+                    last_game_date = EXCLUDED.last_game_date,
+                    last_game_id = EXCLUDED.last_game_id,
+                    updated_at = now();""",
+                [table_name, list(seasons)]).fetchone()[0]
+        print(f"Watermarks updated for {updated} seasons in {table_name}.")
+
+    except duckdb.Error as e:
+        print(f"Error while updating watermarks: {e}")
+
+
+def update_games(seasons):
+    """Adds the games of seasons in the team game logs to the games table.
+
+    Args:
+        seasons: A list of seasons to add games for.
+    """
+    try:
+        with _write_lock, get_connection() as cur:
+            updated = cur.execute(
+                """INSERT INTO games (game_id, season_year, game_date)
+                SELECT DISTINCT ON (game_id)
+                    game_id, season_year, game_date::DATE
+                FROM team_game_logs
+                WHERE season_year IN (SELECT UNNEST(?::VARCHAR[]))
+                    AND game_id IS NOT NULL
+                    AND game_date IS NOT NULL
+                ORDER BY game_id
+                ON CONFLICT (game_id) DO UPDATE SET
+                    season_year = EXCLUDED.season_year,
+                    game_date = EXCLUDED.game_date
+                WHERE games.season_year IS DISTINCT FROM EXCLUDED.season_year
+                    OR games.game_date IS DISTINCT FROM EXCLUDED.game_date;""",
+                [list(seasons)]).fetchone()[0]
+        print(f"Games added or updated: {updated}")
+
+    except duckdb.Error as e:
+        print(f"Error while updating games: {e}")
+
+
+def reset_season(table_name, season):
+    """Deletes a season's rows from a game log table so it can be reloaded.
+
+    Args:
+        table_name: Name of the game log table.
+        season: The season, e.g. '2020-21'.
+    """
+    try:
+        with _write_lock, get_connection() as cur:
+            deleted = cur.execute(
+                f"DELETE FROM {_quote(table_name)} WHERE season_year = ?;",
+                [season]).fetchone()[0]
+        print(f"Records deleted from {table_name} for {season}: {deleted}")
+
+    except duckdb.Error as e:
+        print(f"Error while resetting {season} in {table_name}: {e}")
+
+
+def get_payload_hashes():
+    """Retrieves the content hash of the payload last loaded per work unit.
+
+    Returns:
+        A dictionary mapping each work unit key to the hex digest of the
+        payload last loaded for it.
+    """
+    records = get_records('ingestion_payload_hashes',
+                          columns=['unit_key', 'content_hash'])
+    if records is None:
+        return {}
+
+    return dict(records)
+
+
+def update_payload_hashes(payload_hashes):
+    """Records the content hash of the payload loaded per work unit.
+
+    Args:
+        payload_hashes: A dictionary mapping work unit keys to the hex
+            digest of the payload that was loaded for them.
+    """
+    if not payload_hashes:
+        return
+
+    try:
+        with _write_lock, get_connection() as cur:
+            cur.executemany(
+                """INSERT INTO ingestion_payload_hashes
+                    (unit_key, content_hash)
+                VALUES (?, ?)
+                ON CONFLICT (unit_key) DO UPDATE SET
+                    content_hash = EXCLUDED.content_hash,
+                    updated_at = now();""",
+                list(payload_hashes.items()))
+        print(f"Payload hashes updated for {len(payload_hashes)} "
+              f"work units.")
+
+    except duckdb.Error as e:
+        print(f"Error while updating payload hashes: {e}")
+
+
+def delete_payload_hashes(unit_keys):
+    """Forgets the payloads loaded for work units, so they are loaded again.
+
+    Args:
+        unit_keys: A list of work unit keys.
+    """
+    if not unit_keys:
+        return
+
+    try:
+        with _write_lock, get_connection() as cur:
+            deleted = cur.execute(
+                """DELETE FROM ingestion_payload_hashes
+                WHERE unit_key IN (SELECT UNNEST(?::VARCHAR[]));""",
+                [list(unit_keys)]).fetchone()[0]
+        print(f"Payload hashes deleted for {deleted} work units.")
+
+    except duckdb.Error as e:
+        print(f"Error while deleting payload hashes: {e}")
+
+
+def refresh_analysis_view(view_schema=ANALYSIS_VIEW):
+    """Rebuilds the analysis view's table from the current tables.
+
+    Args:
+        view_schema: A dictionary containing the view name and query.
+            Defaults to the analysis view.
+    """
+    view_name = view_schema['view_name']
+    try:
+        with _write_lock, get_connection() as cur:
+            start = time.perf_counter()
+            cur.execute(f"CREATE OR REPLACE TABLE {_quote(view_name)} AS "
+                        f"{view_schema['view_query']};")
+            elapsed = time.perf_counter() - start
+        print(f"{view_name} refreshed in {elapsed:.2f}s.")
+
+    except duckdb.Error as e:
+        print(f"Error while refreshing {view_name}: {e}")
+
+
+def create_analysis_dataset(view_schema=ANALYSIS_VIEW):
+    """Creates a Parquet dataset containing all records of the analysis view.
+
+    Rows are read as Arrow record batches of EXPORT_FETCH_SIZE rows and each
+    batch is written before the next one is read.
+
+    Args:
+        view_schema: A dictionary containing the view name. Defaults to the
+            analysis view.
+
+    Returns:
+        The number of rows written, or None if the export failed.
+    """
+    view_name = view_schema['view_name']
+    row_count = 0
+
+    try:
+        with get_connection() as cur:
+            start = time.perf_counter()
+            reader = cur.execute(
+                f"SELECT * FROM {_quote(view_name)};"
+                ).to_arrow_reader(EXPORT_FETCH_SIZE)
+            schema = dataset.get_dataset_schema(reader.schema)
+
+            def cast_batches():
+                nonlocal row_count
+                for batch in reader:
+                    row_count += batch.num_rows
+                    yield from pa.Table.from_batches([batch]).cast(
+                        schema).to_batches()
+
+            dataset.write_dataset(cast_batches(), schema)
+            elapsed = time.perf_counter() - start
+
+        print(f"{row_count} rows saved to {dataset.DATASET_DIR} "
+              f"in {elapsed:.2f}s.")
+        if elapsed > 0:
+            print(f"Export throughput: {row_count / elapsed:,.0f} rows/s")
+        return row_count
+
+    except (duckdb.Error, OSError, pa.ArrowException) as e:
+        print(f"Error while exporting {view_name}: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    pass
@@ -1,74 +1,352 @@
 """Module for performing database queries.
 
 This module facilitates the insertion, update, and retrieval of data from
-a PostgreSQL database. It provides functions to insert new records, update
+a PostgreSQL database. It provides functions to upsert records, update
 existing records from a CSV file, retrieve distinct records, and fetch
 records based on specific conditions. It uses psycopg2 for database
 connection and operations.
 """
 
+import io
+import time
+from datetime import date, datetime
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from psycopg2 import sql, Error
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_values
+
+from data_pipeline.database import db_connection, setup
+from data_pipeline.database.schema import (ANALYSIS_VIEW,
+                                           get_conflict_columns, get_season,
+                                           get_table_schema)
+from data_pipeline.utils import dataset
+from data_pipeline.utils.content_hash import ROW_HASH_COLUMN, hash_rows
+
+# Batches smaller than this are inserted with execute_values, where setting
+# up a staging table would cost more than it saves.
+BULK_INSERT_MIN_RECORDS = 1000
+
+# Characters that must be escaped in COPY text format.
+COPY_TEXT_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+COPY_NULL = '\\N'
+
+# Number of rows fetched from the server at a time when exporting a dataset.
+EXPORT_FETCH_SIZE = 10000
+
+# Integer columns are staged as NUMERIC, so values such as 5.0 are rounded
+# on insert the way parameterized inserts round them, instead of making
+# COPY fail.
+STAGING_TYPE_OVERRIDES = {
+    'smallint': 'NUMERIC',
+    'integer': 'NUMERIC',
+    'bigint': 'NUMERIC',
+}
+
+
+def create_partitions(table_name, headers, records=None, columns=None):
+    """Creates the partitions that a batch of rows will be routed to.
+
+    Does nothing for tables that are not partitioned.
+
+    Args:
+        table_name: Name of the table the rows are inserted into.
+        headers: List of column names of the rows.
+        records: Optional. An iterable of tuples, one per row.
+        columns: Optional. A list of NumPy arrays, one per header. Used
+            instead of records when given.
+    """
+    table_schema = get_table_schema(table_name)
+    if table_schema is None or table_schema['partitioning'] is None:
+        return
+
+    partitioning = table_schema['partitioning']
+    column_index = headers.index(partitioning['column'])
+    if columns is not None:
+        values = set(columns[column_index].tolist())
+    else:
+        values = {record[column_index] for record in records}
+    values.discard(None)
+
+    if partitioning['strategy'] == 'range':
+        seasons = {get_season(value) for value in values}
+    else:
+        seasons = values
+
+    for season in sorted(seasons):
+        setup.create_partition(table_schema, season)
+
+
+def _format_copy_value(value):
+    """Formats a single value as a field in COPY text format."""
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, str):
+        return value.translate(COPY_TEXT_ESCAPES)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _format_copy_column(column):
+    """Formats a NumPy column as a list of fields in COPY text format."""
+    if np.issubdtype(column.dtype, np.datetime64):
+        return np.where(np.isnat(column), COPY_NULL,
+                        np.datetime_as_string(column)).tolist()
+    if column.dtype.kind in 'iuf':
+        return column.astype(str).tolist()
+    return [_format_copy_value(value) for value in column]
+
+
+def _build_copy_buffer(records=None, columns=None):
+    """Builds a COPY text format buffer from rows or columns.
+
+    Args:
+        records: Optional. An iterable of tuples, one per row.
+        columns: Optional. A list of NumPy arrays, one per column.
+
+    Returns:
+        A tuple of the buffer, positioned at its start, and the number of
+        rows it holds.
+    """
+    if columns is not None:
+        fields = [_format_copy_column(column) for column in columns]
+        lines = ['\t'.join(row) for row in zip(*fields)]
+    else:
+        lines = ['\t'.join([_format_copy_value(value) for value in record])
+                 for record in records]
+
+    buffer = io.StringIO()
+    for line in lines:
+        buffer.write(line)
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer, len(lines)
+
+
+def _copy_to_staging_table(cur, table_name, headers, buffer):
+    """Creates a staging table for a table and COPYs a buffer into it.
+
+    The staging table has the given columns with the types they have in
+    the table, and is dropped when the current transaction commits, so it
+    must be used with autocommit turned off.
+
+    Args:
+        cur: A cursor on the connection that will own the staging table.
+        table_name: Name of the table the staged rows are meant for.
+        headers: List of column names in the buffer.
+        buffer: A file-like object holding rows in COPY text format.
+
+    Returns:
+        The sql.Identifier of the staging table.
+    """
+    cur.execute(
+        """SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped""",
+        (table_name,)
+        )
+    column_types = dict(cur.fetchall())
+
+    staging_table = sql.Identifier(f"{table_name}_staging")
+    staging_columns = sql.SQL(', ').join(
+        sql.SQL('{} {}').format(
+            sql.Identifier(header),
+            sql.SQL(STAGING_TYPE_OVERRIDES.get(column_types[header],
+                                               column_types[header]))
+            )
+        for header in headers
+        )
+
+    cur.execute(sql.SQL(
+        "CREATE TEMP TABLE {staging} ({columns}) ON COMMIT DROP;"
+        ).format(staging=staging_table, columns=staging_columns))
+
+    cur.copy_expert(sql.SQL(
+        "COPY {staging} ({columns}) FROM STDIN;"
+        ).format(
+            staging=staging_table,
+            columns=sql.SQL(', ').join(map(sql.Identifier, headers))
+            ).as_string(cur.connection), buffer)
+
+    return staging_table
 
-from data_pipeline.database import db_connection
-from data_pipeline.utils import utils
 
+def _get_upsert_sql(table_name, primary_key, headers, source):
+    """Builds an INSERT that only updates existing rows whose hash changed.
 
-def insert_new_data(table_name, primary_key, headers, records):
-    """Inserts new records into a specified table.
+    Args:
+        table_name: Name of the table to upsert into.
+        primary_key: The primary key column of the table.
+        headers: List of column names, including the row hash column.
+        source: An sql.Composable that produces the rows, such as VALUES %s
+            or a SELECT from a staging table.
+
+    Returns:
+        The sql.Composed statement, which returns one row for each row it
+        inserted or updated.
+    """
+    conflict_columns = get_conflict_columns(table_name, primary_key)
+    update_columns = [header for header in headers
+                      if header not in conflict_columns]
+    return sql.SQL(
+        """INSERT INTO {table} AS target ({columns})
+        {source}
+        ON CONFLICT ({conflict_columns}) DO UPDATE SET {updates}
+        WHERE target.{row_hash} IS DISTINCT FROM EXCLUDED.{row_hash}
+        RETURNING 1;"""
+        ).format(
+            table=sql.Identifier(table_name),
+            columns=sql.SQL(', ').join(map(sql.Identifier, headers)),
+            source=source,
+            conflict_columns=sql.SQL(', ').join(
+                map(sql.Identifier, conflict_columns)),
+            updates=sql.SQL(', ').join(
+                sql.SQL('{column} = EXCLUDED.{column}').format(
+                    column=sql.Identifier(column))
+                for column in update_columns),
+            row_hash=sql.Identifier(ROW_HASH_COLUMN)
+            )
+
+
+def upsert_changed_data(table_name,
+                        primary_key,
+                        headers,
+                        records=None,
+                        columns=None):
+    """Inserts new records and updates the records that changed.
+
+    A hash of each record's values is stored in the table's row hash
+    column. Records whose key already exists are only updated when their
+    hash differs from the stored one, so unchanged records are not written.
+    Batches of BULK_INSERT_MIN_RECORDS or more are streamed with COPY FROM
+    STDIN into a temporary staging table and merged from there.
 
     Args:
-        table_name: Name of the table to insert data into.
+        table_name: Name of the table to upsert data into.
         primary_key: The primary key column of the table.
-        headers: List of column names for the insert operation.
-        records: List of tuples representing the records to be inserted.
+        headers: List of column names of the records, without the row hash.
+        records: Optional. An iterable of tuples representing the records.
+        columns: Optional. A list of NumPy arrays, one per header, as
+            returned by `nba_client.parse_nba_data_columns`. Used instead
+            of records when given.
+
+    Returns:
+        The number of records inserted or updated, or None if the upsert
+        failed.
     """
-    conn = None
+    if columns is None:
+        records = list(records)
+    row_hashes = hash_rows(headers, records=records, columns=columns)
+    row_count = len(row_hashes)
+    headers = list(headers) + [ROW_HASH_COLUMN]
+    if columns is not None:
+        columns = list(columns) + [row_hashes]
+    else:
+        records = [tuple(record) + (row_hash,)
+                   for record, row_hash in zip(records, row_hashes.tolist())]
+
+    create_partitions(table_name, headers, records=records, columns=columns)
+
     try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return
-
-        record_count_sql = sql.SQL(
-            "SELECT COUNT(*) FROM {}"
-            ).format(sql.Identifier(table_name))
-
-        insert_sql = sql.SQL(
-            """INSERT INTO {table} ({columns})
-            VALUES ({values})
-            ON CONFLICT ({primary_key}) DO NOTHING;"""
-            ).format(
-                table=sql.Identifier(table_name),
-                columns=sql.SQL(', ').join(
-                    map(sql.Identifier, headers)),
-                values=sql.SQL(', ').join(
-                    sql.Placeholder() * len(headers)),
-                primary_key=sql.Identifier(primary_key)
-                )
+        with db_connection.get_connection() as conn:
+            if row_count < BULK_INSERT_MIN_RECORDS:
+                if columns is not None:
+                    records = list(zip(*(column.tolist()
+                                         for column in columns)))
+                upsert_sql = _get_upsert_sql(table_name, primary_key,
+                                             headers, sql.SQL('VALUES %s'))
+                with conn.cursor() as cur:
+                    written_rows = (execute_values(cur, upsert_sql, records,
+                                                   fetch=True)
+                                    if records else [])
+            else:
+                buffer, _ = _build_copy_buffer(records, columns)
+
+                # Run in one transaction so the staging table is dropped on
+                # commit. The pool restores autocommit when it is checked
+                # in.
+                conn.autocommit = False
+                with conn.cursor() as cur:
+                    staging_table = _copy_to_staging_table(cur, table_name,
+                                                           headers, buffer)
+                    cur.execute(_get_upsert_sql(
+                        table_name, primary_key, headers,
+                        sql.SQL('SELECT {columns} FROM {staging}').format(
+                            columns=sql.SQL(', ').join(
+                                map(sql.Identifier, headers)),
+                            staging=staging_table)
+                        ))
+                    written_rows = cur.fetchall()
+                conn.commit()
+
+            print(f"Records added or updated: {len(written_rows)}")
+            print(f"Records unchanged: {row_count - len(written_rows)}")
+            return len(written_rows)
+
+    except Error as e:
+        print(f"Error while upserting data: {e}")
+        return None
 
-        with conn.cursor() as cur:
-            cur.execute(record_count_sql)
-            initial_count = cur.fetchone()[0]
 
-            execute_batch(cur, insert_sql, records)
+def get_lookup_ids(table_name, keys):
+    """Returns the surrogate keys of values in a lookup table.
+
+    Values that are not in the table yet are added first, so every value
+    gets an ID. Only missing values are inserted, as every attempted insert
+    takes a value from the table's identity sequence, even if it conflicts.
+
+    Args:
+        table_name: Name of a lookup table that declares a unique key.
+        keys: An iterable of values of the table's unique key, as tuples
+            for keys of more than one column. None values are ignored.
+
+    Returns:
+        A dictionary mapping each value to its ID, or an empty dictionary
+        if an error occurs.
+    """
+    table_schema = get_table_schema(table_name)
+    id_column = table_schema['primary_key']
+    key_columns = table_schema['unique_key']
+    single_column = len(key_columns) == 1
 
-            cur.execute(record_count_sql)
-            final_count = cur.fetchone()[0]
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}
+    rows = [(key,) if single_column else key for key in keys]
 
-            records_added = final_count - initial_count
-            records_skipped = len(records) - records_added
+    table = sql.Identifier(table_name)
+    columns = sql.SQL(', ').join(map(sql.Identifier, key_columns))
 
-            print(f"Records added: {records_added}")
-            print(f"Records skipped: {records_skipped}")
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, sql.SQL(
+                    """INSERT INTO {table} ({columns})
+                    SELECT {columns} FROM (VALUES %s) AS new_keys ({columns})
+                    WHERE ({columns}) NOT IN (SELECT {columns} FROM {table})
+                    ON CONFLICT ({columns}) DO NOTHING;"""
+                    ).format(table=table, columns=columns), rows)
+
+                id_rows = execute_values(cur, sql.SQL(
+                    """SELECT {id_column}, {columns} FROM {table}
+                    WHERE ({columns}) IN (VALUES %s);"""
+                    ).format(id_column=sql.Identifier(id_column),
+                             table=table, columns=columns),
+                    rows, fetch=True)
 
     except Error as e:
-        print(f"Error while inserting data: {e}")
+        print(f"Error while looking up {table_name} IDs: {e}")
+        return {}
 
-    finally:
-        if conn:
-            conn.close()
+    return {(key[0] if single_column else tuple(key)): lookup_id
+            for lookup_id, *key in id_rows}
 
 
 def get_distinct_records(column_names, table_name):
@@ -81,100 +359,122 @@ def get_distinct_records(column_names, table_name):
     Returns:
         A list of tuples representing the distinct records.
     """
-    conn = None
     try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return None
-
-        if not isinstance(column_names, (list, tuple)):
-            raise ValueError(
-                "column_names must be a list or tuple of column names"
-                )
-
-        columns = sql.SQL(", ").join(
-            [sql.Identifier(column) for column in column_names]
-            )
+        with db_connection.get_connection() as conn:
+            if not isinstance(column_names, (list, tuple)):
+                raise ValueError(
+                    "column_names must be a list or tuple of column names"
+                    )
 
-        get_distinct_sql = sql.SQL(
-            "SELECT DISTINCT {column} FROM {table};"
-            ).format(
-                column=columns,
-                table=sql.Identifier(table_name)
+            columns = sql.SQL(", ").join(
+                [sql.Identifier(column) for column in column_names]
                 )
 
-        with conn.cursor() as cur:
-            cur.execute(get_distinct_sql)
-            unique_records = [row for row in cur.fetchall()]
-            return unique_records
+            get_distinct_sql = sql.SQL(
+                "SELECT DISTINCT {column} FROM {table};"
+                ).format(
+                    column=columns,
+                    table=sql.Identifier(table_name)
+                    )
+
+            with conn.cursor() as cur:
+                cur.execute(get_distinct_sql)
+                unique_records = [row for row in cur.fetchall()]
+                return unique_records
 
     except Error as e:
         print(f"Error while grabbing distinct records: {e}")
         return None
 
-    finally:
-        if conn:
-            conn.close()
-
 
 def update_records_from_csv(csv_file_path, table_name, key_column):
     """Updates records in a table from a CSV file.
 
+    The CSV is loaded into a temporary staging table with COPY and the
+    table is updated with a single UPDATE ... FROM join on the key column.
+    Columns of the CSV that the table does not have are ignored, and empty
+    CSV fields set their column to NULL.
+
     Args:
         csv_file_path: Path to the CSV file containing the update data.
         table_name: Name of the table to update.
         key_column: The key column to match records for updating.
     """
-    conn = None
     try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return
-
         df = pd.read_csv(csv_file_path)
         df.columns = df.columns.str.lower()
+        key_column = key_column.lower()
 
-        with conn.cursor() as cur:
-            cur.execute(sql.SQL(
-                """SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name = {}"""
-                ).format(
-                    sql.Literal(table_name)
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL(
+                    """SELECT column_name
+                    FROM information_schema.columns
+                    WHERE table_name = {}"""
+                    ).format(
+                        sql.Literal(table_name)
+                        )
                     )
-                )
-            table_columns = [row[0] for row in cur.fetchall()]
-
-        columns_to_update = set(df.columns) & set(table_columns)
-        columns_to_update.discard(key_column.lower())
-
-        for _, row in df.iterrows():
-            set_clauses = sql.SQL(", ").join([sql.SQL("{} = {}").format(
-                sql.Identifier(col), sql.Placeholder()
-                ) for col in columns_to_update])
-            values = [
-                row[col] for col in columns_to_update
-                ] + [row[key_column.lower()]]
-
+                table_columns = [row[0] for row in cur.fetchall()]
+
+            columns_to_update = [column for column in df.columns
+                                 if column in table_columns
+                                 and column != key_column]
+            if not columns_to_update:
+                print(f"No columns in {csv_file_path} to update "
+                      f"{table_name} with.")
+                return
+            headers = [key_column] + columns_to_update
+
+            df = df[headers].astype(object).where(df[headers].notna(), None)
+            buffer, row_count = _build_copy_buffer(
+                df.itertuples(index=False, name=None))
+
+            # Run in one transaction so the staging table is dropped on
+            # commit. The pool restores autocommit when it is checked in.
+            conn.autocommit = False
             with conn.cursor() as cur:
-                update_query = sql.SQL(
-                    "UPDATE {} SET {} WHERE {} = {}").format(
-                        sql.Identifier(table_name),
-                        set_clauses,
-                        sql.Identifier(key_column),
-                        sql.Placeholder()
+                staging_table = _copy_to_staging_table(cur, table_name,
+                                                       headers, buffer)
+
+                cur.execute(sql.SQL(
+                    """UPDATE {table} AS target SET {set_clauses}
+                    FROM {staging} AS staging
+                    WHERE target.{key} = staging.{key};"""
+                    ).format(
+                        table=sql.Identifier(table_name),
+                        set_clauses=sql.SQL(', ').join(
+                            sql.SQL("{column} = staging.{column}").format(
+                                column=sql.Identifier(column))
+                            for column in columns_to_update),
+                        staging=staging_table,
+                        key=sql.Identifier(key_column)
+                        )
+                    )
+                records_updated = cur.rowcount
+
+                cur.execute(sql.SQL(
+                    """SELECT COUNT(*) FROM {staging} AS staging
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {table} AS target
+                        WHERE target.{key} = staging.{key}
+                    );"""
+                    ).format(
+                        staging=staging_table,
+                        table=sql.Identifier(table_name),
+                        key=sql.Identifier(key_column)
                         )
-                cur.execute(update_query, values)
+                    )
+                records_unmatched = cur.fetchone()[0]
+            conn.commit()
+
+            print(f"CSV rows matched: {row_count - records_unmatched}")
+            print(f"CSV rows unmatched: {records_unmatched}")
+            print(f"Records updated: {records_updated}")
 
     except (Error, FileNotFoundError) as e:
         print(f"Error updating records: {e}")
 
-    finally:
-        if conn:
-            conn.close()
-
 
 def get_records(table_name,
                 columns=None,
@@ -192,82 +492,350 @@ def get_records(table_name,
     Returns:
         A list of tuples representing the fetched records.
     """
-    conn = None
     try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return None
-
-        with conn.cursor() as cur:
-            if not columns:
-                columns_sql = sql.SQL("*")
-            else:
-                columns_sql = sql.SQL(", ").join(map(sql.Identifier, columns))
-
-            get_records_sql = sql.SQL(
-                "SELECT {fields} FROM {table}"
-                ).format(fields=columns_sql, table=sql.Identifier(table_name))
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                if not columns:
+                    columns_sql = sql.SQL("*")
+                else:
+                    columns_sql = sql.SQL(", ").join(
+                        map(sql.Identifier, columns))
 
-            if where_clause and where_params:
                 get_records_sql = sql.SQL(
-                    "{base_sql} WHERE {where}"
-                    ).format(
-                        base_sql=get_records_sql,
-                        where=sql.SQL(where_clause)
-                        )
-
-            cur.execute(
-                get_records_sql, where_params if where_params else None
-                )
+                    "SELECT {fields} FROM {table}"
+                    ).format(fields=columns_sql,
+                             table=sql.Identifier(table_name))
+
+                if where_clause and where_params:
+                    get_records_sql = sql.SQL(
+                        "{base_sql} WHERE {where}"
+                        ).format(
+                            base_sql=get_records_sql,
+                            where=sql.SQL(where_clause)
+                            )
+
+                cur.execute(
+                    get_records_sql, where_params if where_params else None
+                    )
 
-            return cur.fetchall()
+                return cur.fetchall()
 
     except Error as e:
         print(f"Error fetching records: {e}")
         return None
 
-    finally:
-        if conn:
-            conn.close()
 
+def iter_query_records(query_sql,
+                       params=None,
+                       fetch_size=EXPORT_FETCH_SIZE):
+    """Yields the rows of a query as they are read from the server.
+
+    Rows are read through a server-side cursor, fetch_size rows at a time,
+    so only one batch is held in memory however many rows the query
+    returns. The connection stays checked out until the iterator is
+    exhausted or closed.
 
-def create_all_records_all_tables_csv():
-    """Creates a csv containing all joined records from database."""
-    conn = None
+    Args:
+        query_sql: The SQL query to run, with %s placeholders.
+        params: Optional. Parameters to substitute into the query.
+        fetch_size: Number of rows fetched from the server at a time.
+
+    Yields:
+        The rows of the query, as tuples. Nothing more is yielded if an
+        error occurs.
+    """
     try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return
+        with db_connection.get_connection() as conn:
+            conn.autocommit = False
+            with conn.cursor(name='query_records') as cur:
+                cur.itersize = fetch_size
+                cur.execute(query_sql, params)
+                yield from cur
+            conn.commit()
 
-        with conn.cursor() as cur:
-            # Directly using table and column names since they are static
-            join_query = """
-                SELECT pgl.*, tgl.*, td.*, me.*
-                FROM player_game_logs pgl
-                FULL OUTER JOIN team_game_logs tgl
-                    ON pgl.team_id_game_id = tgl.team_id_game_id
-                FULL OUTER JOIN team_details td
-                    ON tgl.team_id = td.team_id
-                FULL OUTER JOIN moon_events me
-                    ON tgl.game_id = me.game_id;
-            """
+    except Error as e:
+        print(f"Error while reading query records: {e}")
 
-            cur.execute(join_query)
-            records = cur.fetchall()
 
-            columns = [desc[0] for desc in cur.description]
+def get_watermarks(table_name):
+    """Retrieves the latest game ingested per season for a game log table.
 
-            data = [columns] + records
+    Args:
+        table_name: Name of the game log table.
 
-            utils.save_to_csv(data, "all_nba_moon_data.csv")
+    Returns:
+        A dictionary mapping each season to a (last_game_date, last_game_id)
+        tuple. Seasons that have not been ingested are not included.
+    """
+    records = get_records('ingestion_watermarks',
+                          columns=['season_year', 'last_game_date',
+                                   'last_game_id'],
+                          where_clause='table_name = %s',
+                          where_params=(table_name,))
+    if records is None:
+        return {}
+
+    return {season: (game_date, game_id)
+            for season, game_date, game_id in records}
+
+
+def update_watermarks(table_name, seasons):
+    """Records the latest game ingested per season for a game log table.
+
+    Watermarks are computed from the rows already in the table, so they only
+    ever cover games that were actually inserted.
+
+    Args:
+        table_name: Name of the game log table.
+        seasons: A list of seasons to update watermarks for.
+    """
+    try:
+        with db_connection.get_connection() as conn:
+            update_watermarks_sql = sql.SQL(
+                """INSERT INTO ingestion_watermarks
+                    (table_name, season_year, last_game_date, last_game_id)
+                SELECT DISTINCT ON (season_year)
+                    {table_name}, season_year, game_date, game_id
+                FROM {table}
+                WHERE season_year = ANY({seasons})
+                ORDER BY season_year, game_date DESC, game_id DESC
+                ON CONFLICT (table_name, season_year) DO UPDATE SET
+                    last_game_date = EXCLUDED.last_game_date,
+                    last_game_id = EXCLUDED.last_game_id,
+                    updated_at = CURRENT_TIMESTAMP;"""
+                ).format(
+                    table_name=sql.Literal(table_name),
+                    table=sql.Identifier(table_name),
+                    seasons=sql.Placeholder()
+                    )
+
+            with conn.cursor() as cur:
+                cur.execute(update_watermarks_sql, (list(seasons),))
+                print(f"Watermarks updated for {cur.rowcount} seasons "
+                      f"in {table_name}.")
 
     except Error as e:
-        print(f"Error fetching records: {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"Error while updating watermarks: {e}")
+
+
+def update_games(seasons):
+    """Adds the games of seasons in the team game logs to the games table.
+
+    Games are taken from the rows already in the team game logs, so they
+    only ever cover games that were actually inserted. A game whose date or
+    season changed is updated.
+
+    Args:
+        seasons: A list of seasons to add games for.
+    """
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """INSERT INTO games (game_id, season_year, game_date)
+                    SELECT DISTINCT ON (game_id)
+                        game_id, season_year, game_date::date
+                    FROM team_game_logs
+                    WHERE season_year = ANY(%s)
+                        AND game_id IS NOT NULL
+                        AND game_date IS NOT NULL
+                    ORDER BY game_id
+                    ON CONFLICT (game_id) DO UPDATE SET
+                        season_year = EXCLUDED.season_year,
+                        game_date = EXCLUDED.game_date
+                    WHERE (games.season_year, games.game_date)
+                        IS DISTINCT FROM
+                        (EXCLUDED.season_year, EXCLUDED.game_date);""",
+                    (list(seasons),))
+                print(f"Games added or updated: {cur.rowcount}")
+
+    except Error as e:
+        print(f"Error while updating games: {e}")
+
+
+def reset_season(table_name, season):
+    """Removes a season's rows from a game log table so it can be reloaded.
+
+    A partitioned table has the season's partition swapped for an empty
+    one. Other tables have the season's rows deleted.
+
+    Args:
+        table_name: Name of the game log table.
+        season: The season, e.g. '2020-21'.
+    """
+    table_schema = get_table_schema(table_name)
+    if table_schema['partitioning'] is not None:
+        setup.reset_partition(table_schema, season)
+        return
+
+    try:
+        with db_connection.get_connection() as conn:
+            delete_season_sql = sql.SQL(
+                "DELETE FROM {table} WHERE season_year = %s;"
+                ).format(table=sql.Identifier(table_name))
+            with conn.cursor() as cur:
+                cur.execute(delete_season_sql, (season,))
+                print(f"Records deleted from {table_name} for {season}: "
+                      f"{cur.rowcount}")
+
+    except Error as e:
+        print(f"Error while resetting {season} in {table_name}: {e}")
+
+
+def get_payload_hashes():
+    """Retrieves the content hash of the payload last loaded per work unit.
+
+    Returns:
+        A dictionary mapping each work unit key to the hex digest of the
+        payload last loaded for it.
+    """
+    records = get_records('ingestion_payload_hashes',
+                          columns=['unit_key', 'content_hash'])
+    if records is None:
+        return {}
+
+    return dict(records)
+
+
+def update_payload_hashes(payload_hashes):
+    """Records the content hash of the payload loaded per work unit.
+
+    Args:
+        payload_hashes: A dictionary mapping work unit keys to the hex
+            digest of the payload that was loaded for them.
+    """
+    if not payload_hashes:
+        return
+
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """INSERT INTO ingestion_payload_hashes
+                        (unit_key, content_hash)
+                    VALUES %s
+                    ON CONFLICT (unit_key) DO UPDATE SET
+                        content_hash = EXCLUDED.content_hash,
+                        updated_at = CURRENT_TIMESTAMP;""",
+                    list(payload_hashes.items()))
+                print(f"Payload hashes updated for {len(payload_hashes)} "
+                      f"work units.")
+
+    except Error as e:
+        print(f"Error while updating payload hashes: {e}")
+
+
+def delete_payload_hashes(unit_keys):
+    """Forgets the payloads loaded for work units, so they are loaded again.
+
+    Args:
+        unit_keys: A list of work unit keys.
+    """
+    if not unit_keys:
+        return
+
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """DELETE FROM ingestion_payload_hashes
+                    WHERE unit_key = ANY(%s);""",
+                    (list(unit_keys),))
+                print(f"Payload hashes deleted for {cur.rowcount} work "
+                      f"units.")
+
+    except Error as e:
+        print(f"Error while deleting payload hashes: {e}")
+
+
+def refresh_analysis_view(view_schema=ANALYSIS_VIEW):
+    """Recomputes the analysis view from the current tables.
+
+    Once the view holds data it is refreshed concurrently, so readers keep
+    seeing the previous rows until the refresh finishes. The first refresh
+    of a view created WITH NO DATA cannot be concurrent.
+
+    Args:
+        view_schema: A dictionary containing the view name. Defaults to the
+            analysis view.
+    """
+    view_name = view_schema['view_name']
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT relispopulated FROM pg_class "
+                            "WHERE oid = %s::regclass;", (view_name,))
+                populated = cur.fetchone()[0]
+
+                refresh_sql = sql.SQL(
+                    "REFRESH MATERIALIZED VIEW {concurrently} {view};"
+                    ).format(
+                        concurrently=sql.SQL(
+                            "CONCURRENTLY" if populated else ""),
+                        view=sql.Identifier(view_name)
+                        )
+
+                start = time.perf_counter()
+                cur.execute(refresh_sql)
+                elapsed = time.perf_counter() - start
+                print(f"{view_name} refreshed in {elapsed:.2f}s.")
+
+    except Error as e:
+        print(f"Error while refreshing {view_name}: {e}")
+
+
+def create_analysis_dataset(view_schema=ANALYSIS_VIEW):
+    """Creates a Parquet dataset containing all records of the analysis view.
+
+    Rows are read through a server-side cursor, EXPORT_FETCH_SIZE rows at a
+    time, and each batch is written to the dataset before the next one is
+    fetched, so memory use stays flat however large the view is.
+
+    Args:
+        view_schema: A dictionary containing the view name. Defaults to the
+            analysis view.
+
+    Returns:
+        The number of rows written, or None if the export failed.
+    """
+    view_name = view_schema['view_name']
+    row_count = 0
+
+    try:
+        with db_connection.get_connection() as conn:
+            conn.autocommit = False
+            with conn.cursor(name=f"{view_name}_export") as cur:
+                start = time.perf_counter()
+                cur.execute(sql.SQL("SELECT * FROM {};").format(
+                    sql.Identifier(view_name)))
+
+                # The first fetch runs the query and fills the description
+                rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+                source_schema = dataset.get_source_schema(cur.description)
+                schema = dataset.get_dataset_schema(source_schema)
+
+                def fetch_batches(rows):
+                    nonlocal row_count
+                    while rows:
+                        row_count += len(rows)
+                        yield dataset.to_record_batch(rows, source_schema,
+                                                      schema)
+                        rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+
+                dataset.write_dataset(fetch_batches(rows), schema)
+                elapsed = time.perf_counter() - start
+            conn.commit()
+
+        print(f"{row_count} rows saved to {dataset.DATASET_DIR} "
+              f"in {elapsed:.2f}s.")
+        if elapsed > 0:
+            print(f"Export throughput: {row_count / elapsed:,.0f} rows/s")
+        return row_count
+
+    except (Error, OSError, pa.ArrowException) as e:
+        print(f"Error while exporting {view_name}: {e}")
+        return None
 
 
 if __name__ == "__main__":
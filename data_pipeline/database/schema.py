@@ -1,15 +1,94 @@
 """Module that defines the database schemas.
 
 This module defines the database schemas for storing NBA player and game logs,
-team details, and moon event data.
+team details, and moon event data, along with the games, arenas and lookup
+tables that moon events refer to. Each table may also declare secondary
+indexes, which are created separately from the table so that bulk loads can
+build them once after loading.
+
+The game log tables are partitioned by season, either as a list on
+season_year or as ranges of game_date, so queries scoped to a season or
+date range only scan the partitions they need and a season can be reloaded
+by swapping out its partition. Partitions are created as rows for new
+seasons arrive. The ingested tables keep a hash of each row's values, so
+reloading data only rewrites the rows that changed.
 """
 
+# Partition layout for the game log tables. 'list' partitions on the
+# season_year value and 'range' partitions on game_date, with each season
+# running from SEASON_START_MONTH_DAY of its first year. Set to None to
+# create the game log tables without partitions.
+GAME_LOG_PARTITIONING = {
+    'strategy': 'list',
+    'column': 'season_year',
+}
+SEASON_START_MONTH_DAY = (7, 1)
+
+
+def get_primary_key_sql(primary_key, partitioning):
+    """Builds a primary key clause that includes the partition column.
+
+    Args:
+        primary_key: The table's own key column.
+        partitioning: The table's partition layout, or None.
+
+    Returns:
+        The PRIMARY KEY clause for a CREATE TABLE statement.
+    """
+    columns = [primary_key]
+    if partitioning is not None:
+        columns.append(partitioning['column'])
+    return f"PRIMARY KEY ({', '.join(columns)})"
+
+
+def get_partition_by_sql(partitioning):
+    """Builds the PARTITION BY clause for a partition layout, if any."""
+    if partitioning is None:
+        return ""
+    return (f" PARTITION BY {partitioning['strategy'].upper()} "
+            f"({partitioning['column']})")
+
+
+def get_season(game_date):
+    """Returns the season, e.g. '2020-21', that a game date falls in."""
+    start_month, start_day = SEASON_START_MONTH_DAY
+    year = game_date.year
+    if (game_date.month, game_date.day) < (start_month, start_day):
+        year -= 1
+    return f"{year}-{(year + 1) % 100:02d}"
+
+
+def get_partition(table_schema, season):
+    """Describes the partition of a table that holds one season.
+
+    Args:
+        table_schema: A dictionary containing the table name and its
+            partition layout.
+        season: The season, e.g. '2020-21'.
+
+    Returns:
+        A tuple of the partition's table name and its FOR VALUES clause.
+    """
+    partition_name = f"{table_schema['table_name']}_{season.replace('-', '_')}"
+    if table_schema['partitioning']['strategy'] == 'list':
+        return partition_name, f"FOR VALUES IN ('{season}')"
+
+    start_month, start_day = SEASON_START_MONTH_DAY
+    first_year = int(season[:4])
+    return partition_name, (
+        f"FOR VALUES FROM ('{first_year}-{start_month:02d}-{start_day:02d}') "
+        f"TO ('{first_year + 1}-{start_month:02d}-{start_day:02d}')"
+        )
+
+
 # Define schema for player_game_logs table
 PLAYER_GAME_LOGS_TABLE = {
     'table_name': 'player_game_logs',
-    'table_creation_sql': """
+    'primary_key': 'player_id_game_id',
+    'partitioning': GAME_LOG_PARTITIONING,
+    'table_creation_sql': f"""
     CREATE TABLE IF NOT EXISTS player_game_logs (
-        player_id_game_id TEXT PRIMARY KEY,
+        player_id_game_id TEXT NOT NULL,
         season_year VARCHAR(7),
         player_id INT,
         player_name VARCHAR(100),
@@ -78,17 +157,55 @@ PLAYER_GAME_LOGS_TABLE = {
         td3_rank INT,
         wnba_fantasy_pts_rank INT,
         available_flag INT,
-        team_id_game_id TEXT
-    );
-    """
+        team_id_game_id TEXT,
+        row_hash BIGINT,
+        {get_primary_key_sql('player_id_game_id', GAME_LOG_PARTITIONING)}
+    ){get_partition_by_sql(GAME_LOG_PARTITIONING)};
+    """,
+    'indexes': [
+        {
+            'index_name': 'player_game_logs_team_id_game_id_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS player_game_logs_team_id_game_id_idx
+            ON player_game_logs (team_id_game_id);
+            """
+        },
+        {
+            'index_name': 'player_game_logs_game_id_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS player_game_logs_game_id_idx
+            ON player_game_logs (game_id);
+            """
+        },
+        {
+            # Covers per-player game log slices without reading the table.
+            'index_name': 'player_game_logs_player_id_game_date_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS
+                player_game_logs_player_id_game_date_idx
+            ON player_game_logs (player_id, game_date)
+            INCLUDE (game_id, team_id, min, pts, reb, ast, plus_minus);
+            """
+        },
+        {
+            'index_name': 'player_game_logs_season_year_game_date_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS
+                player_game_logs_season_year_game_date_idx
+            ON player_game_logs (season_year, game_date DESC, game_id DESC);
+            """
+        },
+    ]
 }
 
 # Define schema for team_game_logs table.
 TEAM_GAME_LOGS_TABLE = {
     'table_name': 'team_game_logs',
-    'table_creation_sql': """
+    'primary_key': 'team_id_game_id',
+    'partitioning': GAME_LOG_PARTITIONING,
+    'table_creation_sql': f"""
     CREATE TABLE IF NOT EXISTS team_game_logs (
-        team_id_game_id TEXT PRIMARY KEY,
+        team_id_game_id TEXT NOT NULL,
         season_year VARCHAR(7),
         team_id INT,
         team_abbreviation VARCHAR(3),
@@ -145,14 +262,42 @@ TEAM_GAME_LOGS_TABLE = {
         pfd_rank INT,
         pts_rank INT,
         plus_minus_rank INT,
-        available_flag INT
-    );
-    """
+        available_flag INT,
+        row_hash BIGINT,
+        {get_primary_key_sql('team_id_game_id', GAME_LOG_PARTITIONING)}
+    ){get_partition_by_sql(GAME_LOG_PARTITIONING)};
+    """,
+    'indexes': [
+        {
+            'index_name': 'team_game_logs_game_id_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS team_game_logs_game_id_idx
+            ON team_game_logs (game_id) INCLUDE (matchup, game_date);
+            """
+        },
+        {
+            'index_name': 'team_game_logs_team_id_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS team_game_logs_team_id_idx
+            ON team_game_logs (team_id);
+            """
+        },
+        {
+            'index_name': 'team_game_logs_season_year_game_date_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS
+                team_game_logs_season_year_game_date_idx
+            ON team_game_logs (season_year, game_date DESC, game_id DESC);
+            """
+        },
+    ]
 }
 
 # Define schema for team_details table.
 TEAM_DETAILS_TABLE = {
     'table_name': 'team_details',
+    'primary_key': 'team_id',
+    'partitioning': None,
     'table_creation_sql': """
     CREATE TABLE IF NOT EXISTS team_details (
         team_id BIGINT PRIMARY KEY,
@@ -167,41 +312,303 @@ TEAM_DETAILS_TABLE = {
         headcoach VARCHAR(100),
         dleagueaffiliation VARCHAR(100),
         latitude DOUBLE PRECISION,
-        longitude DOUBLE PRECISION
+        longitude DOUBLE PRECISION,
+        row_hash BIGINT
+    );
+    """,
+    'indexes': [
+        {
+            'index_name': 'team_details_abbreviation_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS team_details_abbreviation_idx
+            ON team_details (abbreviation) INCLUDE (latitude, longitude);
+            """
+        },
+    ]
+}
+
+# Define schemas for the lookup tables that moon_events refers to. Each has
+# a small surrogate key and a unique key that ingestion resolves values to.
+ARENAS_TABLE = {
+    'table_name': 'arenas',
+    'primary_key': 'arena_id',
+    'unique_key': ['latitude', 'longitude'],
+    'partitioning': None,
+    'table_creation_sql': """
+    CREATE TABLE IF NOT EXISTS arenas (
+        arena_id SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        latitude DOUBLE PRECISION NOT NULL,
+        longitude DOUBLE PRECISION NOT NULL,
+        UNIQUE (latitude, longitude)
+    );
+    """
+}
+
+MOON_PHASES_TABLE = {
+    'table_name': 'moon_phases',
+    'primary_key': 'phase_id',
+    'unique_key': ['phase_string'],
+    'partitioning': None,
+    'table_creation_sql': """
+    CREATE TABLE IF NOT EXISTS moon_phases (
+        phase_id SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        phase_string TEXT NOT NULL UNIQUE
+    );
+    """
+}
+
+CONSTELLATIONS_TABLE = {
+    'table_name': 'constellations',
+    'primary_key': 'constellation_id',
+    'unique_key': ['constellation_name'],
+    'partitioning': None,
+    'table_creation_sql': """
+    CREATE TABLE IF NOT EXISTS constellations (
+        constellation_id SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        constellation_name TEXT NOT NULL UNIQUE
+    );
+    """
+}
+
+# Define schema for games table, the game dimension that moon events refer
+# to. The game log tables hold one row per player or team and game, so games
+# are kept in their own table with one row each, filled from the team game
+# logs.
+GAMES_TABLE = {
+    'table_name': 'games',
+    'primary_key': 'game_id',
+    'partitioning': None,
+    'table_creation_sql': """
+    CREATE TABLE IF NOT EXISTS games (
+        game_id VARCHAR(15) PRIMARY KEY,
+        season_year VARCHAR(7) NOT NULL,
+        game_date DATE NOT NULL
     );
     """
 }
 
-# Define schema for moon_events table.
+# Define schema for moon_events table. There is one event per arena and
+# date, so rows are identified by (arena_id, date) rather than by the
+# surrogate key.
 MOON_EVENTS_TABLE = {
     'table_name': 'moon_events',
+    'primary_key': 'moon_event_id',
+    'unique_key': ['arena_id', 'date'],
+    'partitioning': None,
     'table_creation_sql': """
     CREATE TABLE IF NOT EXISTS moon_events (
-        moon_event_id TEXT PRIMARY KEY,
-        date TIMESTAMP,
-        latitude DOUBLE PRECISION,
-        longitude DOUBLE PRECISION,
-        body_id TEXT,
-        body_name TEXT,
-        distance_from_earth_au DOUBLE PRECISION,
-        distance_from_earth_km DOUBLE PRECISION,
-        horizontal_position_altitude_degrees DOUBLE PRECISION,
-        horizontal_position_azimuth_degrees DOUBLE PRECISION,
-        equatorial_position_right_ascension TEXT,
-        equatorial_position_declination TEXT,
-        position_constellation_name TEXT,
-        elongation DOUBLE PRECISION,
-        magnitude DOUBLE PRECISION,
-        phase_string TEXT,
-        game_id VARCHAR(15)
+        moon_event_id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        arena_id SMALLINT NOT NULL REFERENCES arenas,
+        date DATE NOT NULL,
+        constellation_id SMALLINT REFERENCES constellations,
+        phase_id SMALLINT REFERENCES moon_phases,
+        distance_from_earth_au REAL,
+        distance_from_earth_km REAL,
+        horizontal_position_altitude_degrees REAL,
+        horizontal_position_azimuth_degrees REAL,
+        equatorial_position_right_ascension REAL,
+        equatorial_position_declination REAL,
+        elongation REAL,
+        magnitude REAL,
+        game_id VARCHAR(15) REFERENCES games,
+        row_hash BIGINT,
+        UNIQUE (arena_id, date)
+    );
+    """,
+    'indexes': [
+        {
+            'index_name': 'moon_events_game_id_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS moon_events_game_id_idx
+            ON moon_events (game_id);
+            """
+        },
+    ]
+}
+
+INGESTION_WATERMARKS_TABLE = {
+    'table_name': 'ingestion_watermarks',
+    'primary_key': None,
+    'partitioning': None,
+    'table_creation_sql': """
+    CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+        table_name TEXT,
+        season_year VARCHAR(7),
+        last_game_date TIMESTAMP,
+        last_game_id VARCHAR(15),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (table_name, season_year)
+    );
+    """
+}
+
+# Define schema for the table that records the content hash of the payload
+# last loaded for each ingestion work unit, such as one endpoint and season.
+# It lives in the database, so wiping the database also forgets what was
+# loaded.
+INGESTION_PAYLOAD_HASHES_TABLE = {
+    'table_name': 'ingestion_payload_hashes',
+    'primary_key': 'unit_key',
+    'partitioning': None,
+    'table_creation_sql': """
+    CREATE TABLE IF NOT EXISTS ingestion_payload_hashes (
+        unit_key TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     """
 }
 
+# Define the materialized view that analysis reads from. It has one row per
+# player-game, with the home team's arena location and the moon event at
+# that arena on the game date.
+ANALYSIS_VIEW_QUERY = """
+    WITH player_games AS (
+        SELECT
+            pgl.*,
+            CASE
+                WHEN pgl.matchup LIKE '% @ %'
+                    THEN split_part(pgl.matchup, ' @ ', 2)
+                ELSE split_part(pgl.matchup, ' vs. ', 1)
+            END AS home_team
+        FROM player_game_logs pgl
+    )
+    SELECT
+        pg.player_id_game_id, pg.season_year, pg.player_id, pg.player_name,
+        pg.team_abbreviation, pg.game_id, pg.game_date, pg.matchup, pg.wl,
+        pg.min, pg.fgm, pg.fga, pg.fg_pct, pg.fg3m, pg.fg3a, pg.fg3_pct,
+        pg.ftm, pg.fta, pg.ft_pct, pg.oreb, pg.dreb, pg.reb, pg.ast, pg.tov,
+        pg.stl, pg.blk, pg.blka, pg.pf, pg.pfd, pg.pts, pg.plus_minus,
+        pg.nba_fantasy_pts, pg.available_flag, pg.home_team,
+        td.latitude, td.longitude,
+        me.distance_from_earth_au, me.distance_from_earth_km,
+        me.horizontal_position_altitude_degrees,
+        me.horizontal_position_azimuth_degrees,
+        me.equatorial_position_right_ascension,
+        me.equatorial_position_declination,
+        c.constellation_name AS position_constellation_name,
+        me.elongation, me.magnitude, mp.phase_string
+    FROM player_games pg
+    LEFT JOIN team_details td
+        ON td.abbreviation = pg.home_team
+    LEFT JOIN arenas a
+        ON a.latitude = td.latitude
+        AND a.longitude = td.longitude
+    LEFT JOIN moon_events me
+        ON me.arena_id = a.arena_id
+        AND me.date = pg.game_date::date
+    LEFT JOIN constellations c
+        ON c.constellation_id = me.constellation_id
+    LEFT JOIN moon_phases mp
+        ON mp.phase_id = me.phase_id
+    """
+
+# Define the query that plans moon data requests. It has one row per game,
+# with the game date and the location of the home team's arena, taken from
+# the row of the home team, whose matchup reads 'HOME vs. AWAY'. Games whose
+# home team has no location yet have NULL coordinates. The matchup is checked
+# with strpos rather than LIKE, as a literal % would clash with the query's
+# %s placeholders.
+MOON_DATA_PARAMS_QUERY = """
+    SELECT tgl.game_id, tgl.game_date, td.latitude, td.longitude
+    FROM team_game_logs tgl
+    LEFT JOIN team_details td
+        ON td.abbreviation = tgl.team_abbreviation
+    WHERE strpos(tgl.matchup, ' vs. ') > 0
+    """
+
+# Condition added to MOON_DATA_PARAMS_QUERY to skip games that already have
+# a moon event at their arena on their date.
+NEW_MOON_DATA_PARAMS_CONDITION = """
+    AND NOT EXISTS (
+        SELECT 1
+        FROM moon_events me
+        JOIN arenas a
+            ON a.arena_id = me.arena_id
+        WHERE a.latitude = td.latitude
+            AND a.longitude = td.longitude
+            AND me.date = tgl.game_date::date
+    )
+    """
+
+# Condition added to MOON_DATA_PARAMS_QUERY to plan only the games of the
+# seasons given as its one parameter, a list of seasons.
+SEASON_MOON_DATA_PARAMS_CONDITION = """
+    AND tgl.season_year IN (SELECT UNNEST(%s::VARCHAR[]))
+    """
+
+ANALYSIS_VIEW = {
+    'view_name': 'player_game_moon_data',
+    'view_query': ANALYSIS_VIEW_QUERY,
+    'view_creation_sql': f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS player_game_moon_data AS
+    {ANALYSIS_VIEW_QUERY}
+    WITH NO DATA;
+    """,
+    'indexes': [
+        {
+            # Required to refresh the view concurrently.
+            'index_name': 'player_game_moon_data_player_id_game_id_idx',
+            'index_creation_sql': """
+            CREATE UNIQUE INDEX IF NOT EXISTS
+                player_game_moon_data_player_id_game_id_idx
+            ON player_game_moon_data (player_id_game_id, season_year);
+            """
+        },
+        {
+            'index_name': 'player_game_moon_data_player_name_idx',
+            'index_creation_sql': """
+            CREATE INDEX IF NOT EXISTS player_game_moon_data_player_name_idx
+            ON player_game_moon_data (player_name, season_year);
+            """
+        },
+    ]
+}
+
 # Aggregate all table schemas for easy reference.
 ALL_TABLE_SCHEMAS = [
     PLAYER_GAME_LOGS_TABLE,
     TEAM_GAME_LOGS_TABLE,
     TEAM_DETAILS_TABLE,
+    ARENAS_TABLE,
+    MOON_PHASES_TABLE,
+    CONSTELLATIONS_TABLE,
+    GAMES_TABLE,
     MOON_EVENTS_TABLE,
+    INGESTION_WATERMARKS_TABLE,
+    INGESTION_PAYLOAD_HASHES_TABLE,
 ]
+
+# Aggregate all materialized views, which are built from the tables above.
+ALL_VIEW_SCHEMAS = [
+    ANALYSIS_VIEW,
+]
+
+
+def get_table_schema(table_name):
+    """Returns the schema of a table, or None if the table is not defined."""
+    return next((table for table in ALL_TABLE_SCHEMAS
+                 if table['table_name'] == table_name), None)
+
+
+def get_conflict_columns(table_name, primary_key):
+    """Returns the columns that identify a row for ON CONFLICT clauses.
+
+    Tables with a surrogate primary key declare the columns that identify a
+    row as their unique key. Partitioned tables can only enforce uniqueness
+    on keys that include the partition column, so it is added to the
+    primary key for those tables.
+
+    Args:
+        table_name: Name of the table.
+        primary_key: The table's own key column.
+
+    Returns:
+        A list of column names.
+    """
+    table_schema = get_table_schema(table_name)
+    if table_schema is not None and table_schema.get('unique_key'):
+        return list(table_schema['unique_key'])
+    if table_schema is None or table_schema['partitioning'] is None:
+        return [primary_key]
+    return [primary_key, table_schema['partitioning']['column']]
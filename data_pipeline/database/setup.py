@@ -6,10 +6,13 @@ It includes functionality for setting up and wiping the database schema,
 based on predefined table schemas.
 """
 
+import time
+
 from psycopg2 import sql, Error
 
 from data_pipeline.database import db_connection
-from data_pipeline.database.schema import ALL_TABLE_SCHEMAS
+from data_pipeline.database.schema import (ALL_TABLE_SCHEMAS,
+                                           ALL_VIEW_SCHEMAS, get_partition)
 
 
 def create_database():
@@ -44,7 +47,12 @@ def create_database():
 
 
 def drop_database():
-    """Drops the database if it exists."""
+    """Drops the database if it exists.
+
+    The connection pool is closed first, as the database cannot be dropped
+    while pooled connections to it are open.
+    """
+    db_connection.close_connection_pool()
     conn = None
     try:
         conn, dbname = db_connection.connect_to_database(admin_db=True)
@@ -72,27 +80,19 @@ def create_table(table_schema):
     Args:
         table_schema: A dictionary containing the table name and creation SQL.
     """
-    conn = None
-    try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return
-
-        table_name = table_schema.get('table_name')
-        table_create_sql = table_schema.get('table_creation_sql')
-        if not table_name or not table_create_sql:
-            print("Table schema is missing required information.")
-            return
+    table_name = table_schema.get('table_name')
+    table_create_sql = table_schema.get('table_creation_sql')
+    if not table_name or not table_create_sql:
+        print("Table schema is missing required information.")
+        return
 
-        with conn.cursor() as cur:
-            cur.execute(table_create_sql)
-            print(f"{table_name} created successfully.")
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(table_create_sql)
+                print(f"{table_name} created successfully.")
     except Error as e:
         print(f"Failed to create {table_name}: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 
 def drop_table(table_schema):
@@ -101,41 +101,177 @@ def drop_table(table_schema):
     Args:
         table_schema: A dictionary containing the table name.
     """
-    conn = None
+    table_name = table_schema.get('table_name')
+    if not table_name:
+        print("Table schema does not contain a table name.")
+        return
+
+    drop_table_sql = sql.SQL(
+        "DROP TABLE IF EXISTS {} CASCADE;"
+        ).format(sql.Identifier(table_name))
+
     try:
-        conn, _ = db_connection.connect_to_database()
-        if conn is None:
-            print("Database connection could not be established.")
-            return
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(drop_table_sql)
+                print(f"{table_name} dropped successfully.")
+    except Error as e:
+        print(f"Failed to drop '{table_name}': {e}")
 
-        table_name = table_schema.get('table_name')
-        if not table_name:
-            print("Table schema does not contain a table name.")
-            return
 
-        drop_table_sql = sql.SQL(
-            "DROP TABLE IF EXISTS {} CASCADE;"
-            ).format(sql.Identifier(table_name))
+def create_partition(table_schema, season):
+    """Creates the partition of a partitioned table that holds one season.
 
-        with conn.cursor() as cur:
-            cur.execute(drop_table_sql)
-            print(f"{table_name} dropped successfully.")
+    Args:
+        table_schema: A dictionary containing the table name and its
+            partition layout.
+        season: The season, e.g. '2020-21'.
+    """
+    partition_name, bounds = get_partition(table_schema, season)
+    create_partition_sql = sql.SQL(
+        "CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} {bounds};"
+        ).format(
+            partition=sql.Identifier(partition_name),
+            table=sql.Identifier(table_schema['table_name']),
+            bounds=sql.SQL(bounds)
+            )
+
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(create_partition_sql)
     except Error as e:
-        print(f"Failed to drop '{table_name}': {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"Failed to create {partition_name}: {e}")
+
+
+def reset_partition(table_schema, season):
+    """Swaps a season's partition for an empty one so it can be reloaded.
 
+    The old partition is detached and dropped and an empty partition is
+    created in its place, in one transaction, instead of deleting the
+    season's rows one by one.
 
-def setup_database_schema():
-    """Sets up the database schema by creating the database and all tables."""
+    Args:
+        table_schema: A dictionary containing the table name and its
+            partition layout.
+        season: The season, e.g. '2020-21'.
+    """
+    partition_name, bounds = get_partition(table_schema, season)
+    partition = sql.Identifier(partition_name)
+    table = sql.Identifier(table_schema['table_name'])
+
+    try:
+        with db_connection.get_connection() as conn:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass(%s);", (partition_name,))
+                if cur.fetchone()[0] is not None:
+                    cur.execute(sql.SQL(
+                        "ALTER TABLE {table} DETACH PARTITION {partition};"
+                        ).format(table=table, partition=partition))
+                    cur.execute(sql.SQL(
+                        "DROP TABLE {partition};"
+                        ).format(partition=partition))
+                cur.execute(sql.SQL(
+                    "CREATE TABLE {partition} PARTITION OF {table} {bounds};"
+                    ).format(partition=partition, table=table,
+                             bounds=sql.SQL(bounds)))
+            conn.commit()
+            print(f"{partition_name} reset successfully.")
+    except Error as e:
+        print(f"Failed to reset {partition_name}: {e}")
+
+
+def create_view(view_schema):
+    """Creates a materialized view and its indexes, without any data.
+
+    Args:
+        view_schema: A dictionary containing the view name, creation SQL and
+            indexes.
+    """
+    view_name = view_schema['view_name']
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(view_schema['view_creation_sql'])
+                print(f"{view_name} created successfully.")
+    except Error as e:
+        print(f"Failed to create {view_name}: {e}")
+        return
+
+    create_indexes(view_schema)
+
+
+def drop_view(view_schema):
+    """Drops a materialized view.
+
+    Args:
+        view_schema: A dictionary containing the view name.
+    """
+    view_name = view_schema['view_name']
+    drop_view_sql = sql.SQL(
+        "DROP MATERIALIZED VIEW IF EXISTS {} CASCADE;"
+        ).format(sql.Identifier(view_name))
+
+    try:
+        with db_connection.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(drop_view_sql)
+                print(f"{view_name} dropped successfully.")
+    except Error as e:
+        print(f"Failed to drop '{view_name}': {e}")
+
+
+def create_indexes(table_schema):
+    """Creates the secondary indexes declared in a table or view schema.
+
+    Args:
+        table_schema: A dictionary containing the table or view name and,
+            optionally, a list of indexes with their names and creation SQL.
+    """
+    table_name = table_schema.get('table_name',
+                                  table_schema.get('view_name'))
+    for index in table_schema.get('indexes', []):
+        index_name = index['index_name']
+        try:
+            with db_connection.get_connection() as conn:
+                with conn.cursor() as cur:
+                    start = time.perf_counter()
+                    cur.execute(index['index_creation_sql'])
+                    elapsed = time.perf_counter() - start
+                    print(f"{index_name} on {table_name} created "
+                          f"in {elapsed:.2f}s.")
+        except Error as e:
+            print(f"Failed to create {index_name}: {e}")
+
+
+def create_all_indexes():
+    """Creates the secondary indexes of all tables."""
+    for table in ALL_TABLE_SCHEMAS:
+        create_indexes(table)
+
+
+def setup_database_schema(with_indexes=True):
+    """Sets up the database schema by creating the database and all tables.
+
+    Args:
+        with_indexes: Whether to create the secondary indexes as well. Bulk
+            loads into empty tables can pass False and call
+            `create_all_indexes` once loading is done. Defaults to True.
+    """
     create_database()
     for table in ALL_TABLE_SCHEMAS:
         create_table(table)
+        if with_indexes:
+            create_indexes(table)
+    for view in ALL_VIEW_SCHEMAS:
+        create_view(view)
 
 
 def wipe_database_schema():
     """Wipes the database schema by dropping all tables and the database."""
+    for view in ALL_VIEW_SCHEMAS:
+        drop_view(view)
     for table in ALL_TABLE_SCHEMAS:
         drop_table(table)
     drop_database()
@@ -0,0 +1,235 @@
+"""Module for selecting where the pipeline stores its data.
+
+The pipeline can store its data in PostgreSQL, through the setup and
+queries modules, or in an embedded DuckDB database file, through
+duckdb_backend, which needs no database server. The backend is chosen in
+the optional Storage section of the configuration file, e.g.
+
+    [Storage]
+    backend = duckdb
+    path = data_pipeline/data/nba_moon_data.duckdb
+
+and defaults to PostgreSQL. Each function of this module runs the operation
+of the same name on the selected backend.
+"""
+
+import configparser
+import functools
+
+from data_pipeline.database import (db_connection, duckdb_backend, queries,
+                                    setup)
+from data_pipeline.database.schema import ANALYSIS_VIEW
+
+STORAGE_BACKENDS = ['postgres', 'duckdb']
+DEFAULT_STORAGE_BACKEND = 'postgres'
+
+_storage_backend = None
+
+
+@functools.lru_cache(maxsize=None)
+def get_storage_config():
+    """Fetches the storage configuration from the .ini file.
+
+    A missing file or Storage section selects the default backend, so the
+    DuckDB backend can run without a configuration file when it is selected
+    with `set_storage_backend`.
+
+    Returns:
+        A dictionary with the 'backend' name and, optionally, the 'path' of
+        the DuckDB database file.
+    """
+    config = configparser.ConfigParser()
+    config.read(db_connection.CONFIG_FILE_PATH)
+    storage_config = {'backend': DEFAULT_STORAGE_BACKEND}
+    if config.has_section('Storage'):
+        storage_config.update(config.items('Storage'))
+    return storage_config
+
+
+def set_storage_backend(backend, path=None):
+    """Selects the storage backend for the rest of the process.
+
+    Args:
+        backend: One of STORAGE_BACKENDS.
+        path: Optional. Path to the DuckDB database file. Defaults to
+            `duckdb_backend.DEFAULT_DATABASE_PATH`.
+
+    Raises:
+        ValueError: If the backend is not supported.
+    """
+    global _storage_backend
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unsupported storage backend: {backend}")
+    if backend == 'duckdb':
+        duckdb_backend.set_database_path(
+            path or duckdb_backend.DEFAULT_DATABASE_PATH)
+    _storage_backend = backend
+
+
+def get_storage_backend():
+    """Returns the selected storage backend, reading the config if needed."""
+    if _storage_backend is None:
+        config = get_storage_config()
+        set_storage_backend(config['backend'], config.get('path'))
+    return _storage_backend
+
+
+def _use_duckdb():
+    """Checks whether the DuckDB backend is selected."""
+    return get_storage_backend() == 'duckdb'
+
+
+def setup_database_schema(with_indexes=True):
+    """Creates the database and all tables. See `setup`."""
+    if _use_duckdb():
+        return duckdb_backend.setup_database_schema(with_indexes)
+    return setup.setup_database_schema(with_indexes)
+
+
+def wipe_database_schema():
+    """Drops all tables and the database. See `setup`."""
+    if _use_duckdb():
+        return duckdb_backend.wipe_database_schema()
+    return setup.wipe_database_schema()
+
+
+def create_all_indexes():
+    """Creates the secondary indexes of all tables. See `setup`."""
+    if _use_duckdb():
+        return duckdb_backend.create_all_indexes()
+    return setup.create_all_indexes()
+
+
+def upsert_changed_data(table_name,
+                        primary_key,
+                        headers,
+                        records=None,
+                        columns=None):
+    """Inserts new records and updates changed ones. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.upsert_changed_data(
+            table_name, primary_key, headers, records=records,
+            columns=columns)
+    return queries.upsert_changed_data(table_name, primary_key, headers,
+                                       records=records, columns=columns)
+
+
+def get_lookup_ids(table_name, keys):
+    """Returns the IDs of values in a lookup table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.get_lookup_ids(table_name, keys)
+    return queries.get_lookup_ids(table_name, keys)
+
+
+def get_distinct_records(column_names, table_name):
+    """Retrieves distinct records from a table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.get_distinct_records(column_names, table_name)
+    return queries.get_distinct_records(column_names, table_name)
+
+
+def get_records(table_name, columns=None, where_clause=None,
+                where_params=None):
+    """Fetches records from a table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.get_records(table_name, columns, where_clause,
+                                          where_params)
+    return queries.get_records(table_name, columns, where_clause,
+                               where_params)
+
+
+def iter_query_records(query_sql, params=None):
+    """Yields the rows of a query as they are read. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.iter_query_records(query_sql, params)
+    return queries.iter_query_records(query_sql, params)
+
+
+def update_records_from_csv(csv_file_path, table_name, key_column):
+    """Updates records in a table from a CSV file. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.update_records_from_csv(csv_file_path,
+                                                      table_name, key_column)
+    return queries.update_records_from_csv(csv_file_path, table_name,
+                                           key_column)
+
+
+def get_watermarks(table_name):
+    """Retrieves the watermarks of a game log table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.get_watermarks(table_name)
+    return queries.get_watermarks(table_name)
+
+
+def update_watermarks(table_name, seasons):
+    """Records the watermarks of a game log table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.update_watermarks(table_name, seasons)
+    return queries.update_watermarks(table_name, seasons)
+
+
+def update_games(seasons):
+    """Adds the games of seasons to the games table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.update_games(seasons)
+    return queries.update_games(seasons)
+
+
+def reset_season(table_name, season):
+    """Removes a season's rows from a game log table. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.reset_season(table_name, season)
+    return queries.reset_season(table_name, season)
+
+
+def get_payload_hashes():
+    """Retrieves the hashes of the payloads last loaded. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.get_payload_hashes()
+    return queries.get_payload_hashes()
+
+
+def update_payload_hashes(payload_hashes):
+    """Records the hashes of the payloads loaded. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.update_payload_hashes(payload_hashes)
+    return queries.update_payload_hashes(payload_hashes)
+
+
+def delete_payload_hashes(unit_keys):
+    """Forgets the payloads loaded for work units. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.delete_payload_hashes(unit_keys)
+    return queries.delete_payload_hashes(unit_keys)
+
+
+def refresh_analysis_view(view_schema=ANALYSIS_VIEW):
+    """Recomputes the analysis view. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.refresh_analysis_view(view_schema)
+    return queries.refresh_analysis_view(view_schema)
+
+
+def create_analysis_dataset(view_schema=ANALYSIS_VIEW):
+    """Writes the analysis view as a Parquet dataset. See `queries`."""
+    if _use_duckdb():
+        return duckdb_backend.create_analysis_dataset(view_schema)
+    return queries.create_analysis_dataset(view_schema)
+
+
+def report():
+    """Prints how the backend's connections were used."""
+    if _use_duckdb():
+        return duckdb_backend.report()
+    return db_connection.report_connection_pool()
+
+
+def close():
+    """Closes the backend's open connections."""
+    if _use_duckdb():
+        return duckdb_backend.close_connection()
+    return db_connection.close_connection_pool()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,144 @@
+"""Module for hashing API payloads and the rows parsed from them.
+
+Content hashes let ingestion tell whether data changed since it was last
+loaded without comparing the data itself. A payload hash covers a whole raw
+API response, so an unchanged response can be skipped before it is parsed.
+Row hashes cover the columns of each parsed row, so when a response did
+change, only the rows that differ from the stored ones are written.
+"""
+
+import datetime
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Name of the column that holds each row's hash in the ingested tables.
+ROW_HASH_COLUMN = 'row_hash'
+
+# Hash given to null values, so they differ from every other value,
+# including 'None' and the empty string.
+NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+# Integers up to this size are exactly representable as float64.
+MAX_EXACT_FLOAT_INTEGER = 2 ** 53
+
+# NumPy type to convert each kind of object column to before hashing it,
+# keyed by the kind pandas infers for it.
+_INFERRED_DTYPES = {
+    'boolean': np.float64,
+    'integer': np.int64,
+    'floating': np.float64,
+    'mixed-integer-float': np.float64,
+    'date': 'datetime64[us]',
+    'datetime': 'datetime64[us]',
+    'datetime64': 'datetime64[us]',
+}
+
+
+def hash_payload(raw):
+    """Returns the content hash of a raw payload.
+
+    Args:
+        raw: The JSON encoded payload as bytes.
+
+    Returns:
+        The hex digest of the payload's SHA-256 hash.
+    """
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _hash_value(value):
+    """Hashes a single value of a column holding mixed types."""
+    if isinstance(value, (int, np.integer)) and (
+            abs(int(value)) >= MAX_EXACT_FLOAT_INTEGER):
+        value = str(int(value))
+    elif isinstance(value, (bool, int, float, np.bool_, np.integer,
+                            np.floating)):
+        return _hash_column(np.array([value], dtype=np.float64))[0]
+    elif isinstance(value, (datetime.date, np.datetime64)):
+        return _hash_column(np.array([value], dtype='datetime64[us]'))[0]
+    return _hash_column(np.array([str(value)], dtype=object))[0]
+
+
+def _hash_column(column):
+    """Hashes each value of a column by its value rather than its dtype.
+
+    Numbers are hashed as float64, so 3, 3.0 and numpy.int32(3) hash
+    alike; only integers too large to be represented exactly are hashed as
+    their decimal strings. Dates and datetimes are hashed as microseconds
+    since the epoch, strings by their UTF-8 encoding, and None, NaN and
+    NaT as null.
+
+    Args:
+        column: A NumPy array of values.
+
+    Returns:
+        A NumPy array of unsigned 64-bit hashes, one per value.
+    """
+    kind = column.dtype.kind
+    if kind in 'iu' and len(column) and (
+            column.max() >= MAX_EXACT_FLOAT_INTEGER
+            or column.min() <= -MAX_EXACT_FLOAT_INTEGER):
+        return pd.util.hash_array(column.astype(str).astype(object))
+    if kind in 'biuf':
+        # Adding zero turns -0.0 into 0.0
+        values = column.astype(np.float64) + 0.0
+        hashes = pd.util.hash_array(values.view(np.uint64))
+        hashes[np.isnan(values)] = NULL_HASH
+        return hashes
+    if kind == 'M':
+        values = column.astype('datetime64[us]')
+        hashes = pd.util.hash_array(values.view(np.int64))
+        hashes[np.isnat(values)] = NULL_HASH
+        return hashes
+
+    column = column.astype(object)
+    nulls = np.asarray(pd.isna(column), dtype=bool)
+    values = column[~nulls]
+    hashes = np.full(len(column), NULL_HASH, dtype=np.uint64)
+    inferred = pd.api.types.infer_dtype(values, skipna=False)
+    if inferred == 'empty':
+        return hashes
+    if inferred == 'string':
+        hashes[~nulls] = pd.util.hash_array(values)
+        return hashes
+    try:
+        hashes[~nulls] = _hash_column(
+            values.astype(_INFERRED_DTYPES[inferred]))
+    except (KeyError, TypeError, ValueError, OverflowError):
+        hashes[~nulls] = [_hash_value(value) for value in values]
+    return hashes
+
+
+def hash_rows(headers, records=None, columns=None):
+    """Returns a hash of each row's values, computed in one vectorized pass.
+
+    Values are hashed by what they are rather than by their column's dtype,
+    so a row hashes the same whether it is given as records or as columns,
+    and whether or not a null turned an integer column into a float or
+    object column. See `_hash_column` for how each type of value is hashed.
+
+    Args:
+        headers: List of column names of the rows.
+        records: Optional. A list of tuples, one per row.
+        columns: Optional. A list of NumPy arrays, one per header. Used
+            instead of records when given.
+
+    Returns:
+        A NumPy array of signed 64-bit hashes, one per row, which fit a
+        BIGINT column.
+    """
+    if columns is None:
+        data = pd.DataFrame(list(records), columns=headers, dtype=object)
+        columns = [data.iloc[:, index].to_numpy()
+                   for index in range(len(headers))]
+
+    column_hashes = {index: _hash_column(np.asarray(column))
+                     for index, column in enumerate(columns)}
+    return pd.util.hash_pandas_object(
+        pd.DataFrame(column_hashes), index=False).to_numpy().view(np.int64)
+
+
+if __name__ == "__main__":
+    pass
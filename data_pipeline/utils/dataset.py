@@ -0,0 +1,166 @@
+"""Module for writing and loading the analysis dataset as Parquet.
+
+The analysis data is stored as a Parquet dataset partitioned by season, with
+explicit column types: low-cardinality text columns are dictionary encoded,
+so they load as pandas categoricals, and moon metrics are stored as float32.
+Loading memory-maps the files and reads only the requested columns and
+seasons, instead of parsing and re-inferring the types of a wide csv.
+"""
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Define the directory the analysis dataset is written to
+DATASET_DIR = os.path.join(os.path.dirname(__file__), '..', 'data',
+                           'clean_nba_moon_data')
+
+# Column the dataset is partitioned by, one directory per season
+PARTITION_COLUMN = 'season_year'
+
+# Text columns with few distinct values, stored dictionary encoded
+CATEGORICAL_COLUMNS = [
+    'player_name',
+    'team_abbreviation',
+    'home_team',
+    'wl',
+    'position_constellation_name',
+    'phase_string',
+]
+
+# Moon metrics, stored as float32
+FLOAT32_COLUMNS = [
+    'distance_from_earth_au',
+    'distance_from_earth_km',
+    'horizontal_position_altitude_degrees',
+    'horizontal_position_azimuth_degrees',
+    'equatorial_position_right_ascension',
+    'equatorial_position_declination',
+    'elongation',
+    'magnitude',
+]
+
+# Arrow types of PostgreSQL columns, keyed by type OID. Other types are
+# read as strings.
+POSTGRES_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us'),
+}
+
+
+def get_source_schema(description):
+    """Builds the Arrow schema of query results as the database returns them.
+
+    Args:
+        description: The description of a psycopg2 cursor.
+
+    Returns:
+        A pyarrow schema with one field per result column.
+    """
+    return pa.schema([
+        pa.field(column.name, POSTGRES_TYPES.get(column.type_code,
+                                                 pa.string()))
+        for column in description
+    ])
+
+
+def get_dataset_schema(source_schema):
+    """Builds the schema the dataset is stored with.
+
+    Args:
+        source_schema: The Arrow schema of the query results.
+
+    Returns:
+        A pyarrow schema with categorical and float32 columns applied.
+    """
+    fields = []
+    for field in source_schema:
+        if field.name in CATEGORICAL_COLUMNS:
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif field.name in FLOAT32_COLUMNS:
+            field = field.with_type(pa.float32())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def to_record_batch(rows, source_schema, schema):
+    """Converts rows from the database into a record batch.
+
+    Args:
+        rows: A list of row tuples.
+        source_schema: The Arrow schema of the rows as returned.
+        schema: The Arrow schema to store the rows with.
+
+    Returns:
+        A pyarrow RecordBatch.
+    """
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    arrays = [
+        pa.array(values, type=source_field.type).cast(field.type)
+        for values, source_field, field in zip(columns, source_schema, schema)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_dataset(batches, schema, base_dir=DATASET_DIR):
+    """Writes record batches as a Parquet dataset partitioned by season.
+
+    Batches are written as they arrive, so only one batch is held in memory
+    at a time. The dataset is written to a temporary directory next to
+    base_dir and only replaces the existing dataset once every batch was
+    written, so a failed export leaves the last dataset in place.
+
+    Args:
+        batches: An iterable of pyarrow RecordBatches.
+        schema: The Arrow schema of the batches.
+        base_dir: Directory to write the dataset to.
+    """
+    parent_dir, name = os.path.split(os.path.abspath(base_dir))
+    new_dir = os.path.join(parent_dir, f".{name}.new-{os.getpid()}")
+    shutil.rmtree(new_dir, ignore_errors=True)
+    try:
+        ds.write_dataset(
+            batches, new_dir, schema=schema, format='parquet',
+            partitioning=ds.partitioning(
+                pa.schema([schema.field(PARTITION_COLUMN)]), flavor='hive'))
+    except BaseException:
+        shutil.rmtree(new_dir, ignore_errors=True)
+        raise
+
+    # A directory cannot be renamed over a non-empty one, so the old
+    # dataset is moved aside first and deleted once the new one is in place
+    old_dir = f"{new_dir}.old"
+    if os.path.exists(base_dir):
+        os.rename(base_dir, old_dir)
+    os.rename(new_dir, base_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_dataset(columns=None, seasons=None, base_dir=DATASET_DIR):
+    """Loads the analysis dataset into a DataFrame.
+
+    Args:
+        columns: A list of columns to load. Defaults to every column.
+        seasons: A list of seasons to load, e.g. ['2022-23']. Defaults to
+            every season.
+        base_dir: Directory the dataset was written to.
+
+    Returns:
+        A pandas DataFrame, with dictionary encoded columns as categoricals.
+    """
+    filters = [(PARTITION_COLUMN, 'in', list(seasons))] if seasons else None
+    table = pq.read_table(base_dir, columns=columns, filters=filters,
+                          memory_map=True, partitioning='hive')
+    return table.to_pandas()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,245 @@
+"""Module for journaling ingestion work so interrupted runs can resume.
+
+This module provides a checkpoint journal backed by one SQLite database.
+Ingestion is split into work units, such as one endpoint for one season,
+one team's details or one arena's moon data window, and the journal records
+whether each unit is pending, done or failed. A unit is only marked done
+once its data is stored, and every change is committed straight away, so
+the journal survives the process dying mid-run.
+
+A run that did not finish, because the process died or units failed, is
+resumed by the next run: the database is kept and only the units that are
+not done are processed again. A run that finishes clears the journal for
+the next one.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Define the path to the journal.
+JOURNAL_PATH = os.path.join(os.path.dirname(__file__), '..', 'data',
+                            'ingestion_journal.sqlite3')
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class IngestionJournal:
+    """Durable record of the state of a run's work units.
+
+    Attributes:
+        path: Path to the SQLite database file.
+        resuming: Whether the current run resumes an unfinished one.
+    """
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.resuming = False
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # The write-ahead log keeps each commit cheap while still surviving
+        # the process dying.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL,
+                finished_at REAL
+            )
+            """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_units (
+                unit_key TEXT PRIMARY KEY,
+                stage TEXT,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL
+            )
+            """)
+        self._conn.commit()
+
+        # unit_key -> (stage, status)
+        self._units = {
+            unit_key: (stage, status)
+            for unit_key, stage, status in self._conn.execute(
+                "SELECT unit_key, stage, status FROM work_units")
+        }
+
+    def begin_run(self, fresh=False):
+        """Starts a run, resuming the last one if it did not finish.
+
+        Args:
+            fresh: Whether to discard an unfinished run and start over.
+
+        Returns:
+            True if the run resumes an unfinished one, so its completed
+            work units are skipped and the database must be kept.
+        """
+        with self._lock:
+            last_run = self._conn.execute(
+                "SELECT run_id, finished_at FROM runs "
+                "ORDER BY run_id DESC LIMIT 1"
+                ).fetchone()
+            self.resuming = (not fresh and last_run is not None
+                             and last_run[1] is None)
+
+            if not self.resuming:
+                self._conn.execute("DELETE FROM work_units")
+                self._conn.execute(
+                    "INSERT INTO runs (started_at) VALUES (?)",
+                    (time.time(),))
+                self._conn.commit()
+                self._units.clear()
+
+        if self.resuming:
+            counts = self.get_status_counts()
+            print(f"Resuming unfinished run {last_run[0]}: "
+                  f"{counts[DONE]} work units done, "
+                  f"{counts[FAILED]} failed, {counts[PENDING]} pending.")
+        return self.resuming
+
+    def finish_run(self):
+        """Marks the run finished and clears its units if every one is done.
+
+        Returns:
+            True if the run finished, False if units are left for the next
+            run to resume.
+        """
+        counts = self.get_status_counts()
+        unfinished = counts[PENDING] + counts[FAILED]
+        if unfinished:
+            print(f"{unfinished} work units are unfinished; the next run "
+                  f"resumes them.")
+            return False
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET finished_at = ? WHERE finished_at IS NULL",
+                (time.time(),))
+            self._conn.execute("DELETE FROM work_units")
+            self._conn.commit()
+            self._units.clear()
+        print(f"Run finished with all {counts[DONE]} work units done.")
+        return True
+
+    def _set_status(self, unit_keys, stage, status, error=None):
+        """Records the status of work units."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                """INSERT INTO work_units
+                (unit_key, stage, status, attempts, last_error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (unit_key) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = attempts + excluded.attempts,
+                    last_error = excluded.last_error,
+                    updated_at = excluded.updated_at""",
+                [(unit_key, stage, status, int(status != PENDING), error, now)
+                 for unit_key in unit_keys]
+                )
+            self._conn.commit()
+            for unit_key in unit_keys:
+                self._units[unit_key] = (stage, status)
+
+    def add_units(self, stage, unit_keys, replace_unfinished=False):
+        """Records work units as pending, unless they are already known.
+
+        Args:
+            stage: Name of the stage the units belong to.
+            unit_keys: An iterable of unit keys, e.g. 'teamdetails:123'.
+            replace_unfinished: Whether the units replace the stage's units
+                that are not done, for stages whose units are planned anew
+                on every run. Defaults to False.
+        """
+        unit_keys = set(unit_keys)
+        with self._lock:
+            new_keys = [unit_key for unit_key in unit_keys
+                        if unit_key not in self._units]
+            stale_keys = [
+                unit_key for unit_key, (unit_stage, status)
+                in self._units.items()
+                if replace_unfinished and unit_stage == stage
+                and status != DONE and unit_key not in unit_keys
+            ]
+            if stale_keys:
+                self._conn.executemany(
+                    "DELETE FROM work_units WHERE unit_key = ?",
+                    [(unit_key,) for unit_key in stale_keys])
+                self._conn.commit()
+                for unit_key in stale_keys:
+                    del self._units[unit_key]
+        if new_keys:
+            self._set_status(new_keys, stage, PENDING)
+
+    def is_done(self, unit_key):
+        """Checks whether a work unit is already done."""
+        with self._lock:
+            return self._units.get(unit_key, (None, None))[1] == DONE
+
+    def mark_done(self, stage, unit_key):
+        """Records that a work unit's data is stored."""
+        self._set_status([unit_key], stage, DONE)
+
+    def mark_failed(self, stage, unit_key, error):
+        """Records that a work unit failed, so the next run retries it.
+
+        Args:
+            stage: Name of the stage the unit belongs to.
+            unit_key: The unit's key.
+            error: A description of the failure.
+        """
+        print(f"Work unit {unit_key} failed: {error}")
+        self._set_status([unit_key], stage, FAILED, str(error))
+
+    def get_status_counts(self):
+        """Counts work units by status.
+
+        Returns:
+            A dictionary mapping each status to its number of units.
+        """
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for _, status in self._units.values():
+                counts[status] += 1
+        return counts
+
+    def report(self):
+        """Prints the number of work units in each status."""
+        counts = self.get_status_counts()
+        print(f"Journal work units done: {counts[DONE]}")
+        print(f"Journal work units failed: {counts[FAILED]}")
+        print(f"Journal work units pending: {counts[PENDING]}")
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Returns the process-wide journal, opening it on first use.
+
+    Returns:
+        The shared IngestionJournal instance.
+    """
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = IngestionJournal(JOURNAL_PATH)
+        return _journal
+
+
+if __name__ == "__main__":
+    get_journal().report()
@@ -0,0 +1,109 @@
+"""Module for caching decoded API responses in memory.
+
+This module provides a bounded least-recently-used cache that sits in front
+of the response store. Entries are already-decoded responses keyed on the
+same call identity the response store uses, and the cache is capped by the
+total size of their encoded payloads rather than by entry count, so a few
+large season logs cannot crowd out memory unnoticed. The cache counts hits
+and misses to report its hit rate.
+"""
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the byte size of its entries.
+
+    Attributes:
+        max_bytes: Largest total size of entries to keep.
+        hits: Number of lookups answered from the cache.
+        misses: Number of lookups not found in the cache.
+        evictions: Number of entries evicted to stay within max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for a key, marking it recently used.
+
+        Args:
+            key: The hashed identity of the API call.
+
+        Returns:
+            The cached value, or None if the key is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Caches a value, evicting least recently used entries if needed.
+
+        Values larger than the whole cache are not cached.
+
+        Args:
+            key: The hashed identity of the API call.
+            value: The decoded value to cache.
+            size: Size of the value in bytes, usually its encoded length.
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def hit_rate(self):
+        """Returns the fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """Prints the cache's size, hit and miss counts and hit rate."""
+        print(f"Memory cache entries: {len(self._entries)}")
+        print(f"Memory cache size: {self._total_bytes} bytes")
+        print(f"Memory cache hits: {self.hits}")
+        print(f"Memory cache misses: {self.misses}")
+        print(f"Memory cache evictions: {self.evictions}")
+        print(f"Memory cache hit rate: {self.hit_rate():.1%}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_memory_cache():
+    """Returns the process-wide memory cache, creating it on first use.
+
+    Returns:
+        The shared LRUCache instance.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LRUCache(DEFAULT_MAX_BYTES)
+        return _cache
+
+
+if __name__ == "__main__":
+    pass
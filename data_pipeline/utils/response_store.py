@@ -0,0 +1,273 @@
+"""Module for storing raw API responses in a single compressed file.
+
+This module provides a response store backed by one SQLite database. Each
+response is saved as zlib-compressed JSON under the same hashed identity the
+per-file JSON cache used, so previously fetched responses keep their keys.
+The index of stored keys, sizes and timestamps is loaded once when the store
+is opened, so lookups that miss never touch the disk. Entries can expire
+after a time-to-live, and the oldest entries are evicted once the store
+grows past a size limit. The store counts hits, misses and bytes saved by
+compression. A content hash of each response is kept in the index as well,
+so ingestion can tell whether a response changed since it was last loaded
+without reading it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from data_pipeline.utils.content_hash import hash_payload
+
+# Define the path to the store and its default limits.
+STORE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data',
+                          'api_responses.sqlite3')
+DEFAULT_TTL_SECONDS = None
+DEFAULT_MAX_BYTES = 1024 ** 3
+COMPRESSION_LEVEL = 6
+
+
+class ResponseStore:
+    """Compressed, indexed store for raw API responses.
+
+    Attributes:
+        path: Path to the SQLite database file.
+        ttl_seconds: Age in seconds after which entries expire, or None to
+            keep entries until they are evicted for space.
+        max_bytes: Largest total compressed size to keep before evicting the
+            oldest entries.
+        hits: Number of lookups answered from the store.
+        misses: Number of lookups not found in the store.
+        bytes_saved: Number of bytes compression saved on stored responses.
+    """
+
+    def __init__(self,
+                 path=STORE_PATH,
+                 ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                payload BLOB,
+                raw_size INTEGER,
+                stored_size INTEGER,
+                created_at REAL,
+                content_hash TEXT
+            )
+            """)
+        # Stores written before content hashes were kept get the column,
+        # and their hashes are computed when first asked for.
+        stored_columns = [column[1] for column in self._conn.execute(
+            "PRAGMA table_info(responses)")]
+        if 'content_hash' not in stored_columns:
+            self._conn.execute(
+                "ALTER TABLE responses ADD COLUMN content_hash TEXT")
+        self._conn.commit()
+
+        # key -> (stored_size, raw_size, created_at, content_hash)
+        self._index = {
+            key: (stored_size, raw_size, created_at, content_hash)
+            for key, stored_size, raw_size, created_at, content_hash
+            in self._conn.execute(
+                "SELECT key, stored_size, raw_size, created_at, content_hash "
+                "FROM responses")
+        }
+        self._total_bytes = sum(entry[0] for entry in self._index.values())
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._index and not self._is_expired(key)
+
+    def _is_expired(self, key):
+        """Checks whether an entry has outlived the time-to-live."""
+        if self.ttl_seconds is None:
+            return False
+        return time.time() - self._index[key][2] > self.ttl_seconds
+
+    def _delete(self, keys):
+        """Deletes entries from the database and the index."""
+        self._conn.executemany("DELETE FROM responses WHERE key = ?",
+                               [(key,) for key in keys])
+        self._conn.commit()
+        for key in keys:
+            self._total_bytes -= self._index.pop(key)[0]
+
+    def get(self, key):
+        """Returns the stored response for a key.
+
+        Args:
+            key: The hashed identity of the API call.
+
+        Returns:
+            The decoded response, or None if the key is missing or expired.
+        """
+        raw = self.get_raw(key)
+        return None if raw is None else json.loads(raw)
+
+    def get_raw(self, key):
+        """Returns the stored response for a key as uncompressed JSON bytes.
+
+        Args:
+            key: The hashed identity of the API call.
+
+        Returns:
+            The JSON encoded response, or None if the key is missing or
+            expired.
+        """
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            if self._is_expired(key):
+                self._delete([key])
+                self.misses += 1
+                return None
+
+            row = self._conn.execute(
+                "SELECT payload FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            self.hits += 1
+
+        return zlib.decompress(row[0])
+
+    def get_content_hash(self, key):
+        """Returns the content hash of the stored response for a key.
+
+        Args:
+            key: The hashed identity of the API call.
+
+        Returns:
+            The hex digest of the response's hash, or None if the key is
+            missing or expired.
+        """
+        with self._lock:
+            if key not in self._index or self._is_expired(key):
+                return None
+            content_hash = self._index[key][3]
+        if content_hash is not None:
+            return content_hash
+
+        raw = self.get_raw(key)
+        if raw is None:
+            return None
+        content_hash = hash_payload(raw)
+        with self._lock:
+            if key in self._index:
+                self._conn.execute(
+                    "UPDATE responses SET content_hash = ? WHERE key = ?",
+                    (content_hash, key))
+                self._conn.commit()
+                self._index[key] = self._index[key][:3] + (content_hash,)
+        return content_hash
+
+    def put(self, key, endpoint, response):
+        """Compresses and stores a response, evicting old entries if needed.
+
+        Args:
+            key: The hashed identity of the API call.
+            endpoint: Name of the endpoint the response came from.
+            response: The JSON-serializable response data.
+
+        Returns:
+            The size in bytes of the uncompressed JSON encoded response.
+        """
+        raw = json.dumps(response).encode('utf-8')
+        payload = zlib.compress(raw, COMPRESSION_LEVEL)
+        content_hash = hash_payload(raw)
+        created_at = time.time()
+
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index[key][0]
+            self._conn.execute(
+                """INSERT OR REPLACE INTO responses
+                (key, endpoint, payload, raw_size, stored_size, created_at,
+                 content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (key, endpoint, payload, len(raw), len(payload), created_at,
+                 content_hash)
+                )
+            self._conn.commit()
+            self._index[key] = (len(payload), len(raw), created_at,
+                                content_hash)
+            self._total_bytes += len(payload)
+            self.bytes_saved += len(raw) - len(payload)
+            self._evict_for_space()
+
+        return len(raw)
+
+    def _evict_for_space(self):
+        """Evicts the oldest entries until the store fits within max_bytes."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        remaining = self._total_bytes
+        for key, (stored_size, _, _, _) in sorted(self._index.items(),
+                                               key=lambda item: item[1][2]):
+            if remaining <= self.max_bytes:
+                break
+            evicted.append(key)
+            remaining -= stored_size
+        self._delete(evicted)
+        print(f"Evicted {len(evicted)} responses from the response store.")
+
+    def evict_expired(self):
+        """Deletes every entry that has outlived the time-to-live.
+
+        Returns:
+            The number of entries deleted.
+        """
+        with self._lock:
+            expired = [key for key in self._index if self._is_expired(key)]
+            self._delete(expired)
+        return len(expired)
+
+    def report(self):
+        """Prints the store's size and hit, miss and compression counts."""
+        raw_total = sum(entry[1] for entry in self._index.values())
+        print(f"Response store entries: {len(self._index)}")
+        print(f"Response store size: {self._total_bytes} bytes "
+              f"({raw_total} bytes uncompressed)")
+        print(f"Response store hits: {self.hits}")
+        print(f"Response store misses: {self.misses}")
+        print(f"Response store bytes saved this run: {self.bytes_saved}")
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_response_store():
+    """Returns the process-wide response store, opening it on first use.
+
+    Returns:
+        The shared ResponseStore instance.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResponseStore(STORE_PATH, DEFAULT_TTL_SECONDS,
+                                   DEFAULT_MAX_BYTES)
+        return _store
+
+
+if __name__ == "__main__":
+    get_response_store().report()
@@ -0,0 +1,124 @@
+"""Module for retrying API calls that fail with transient errors.
+
+Timeouts, dropped connections, rate limiting (HTTP 429) and server errors
+(HTTP 5xx) usually succeed when tried again a little later. This module
+retries such calls with exponential backoff and full jitter: before the n-th
+retry it waits a random time between zero and the base delay doubled n
+times, capped at a maximum, so clients that failed together do not retry in
+lockstep. Other errors are raised straight away.
+"""
+
+import asyncio
+import random
+import time
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY_SECONDS = 1.0
+DEFAULT_MAX_DELAY_SECONDS = 30.0
+
+
+class TransientError(Exception):
+    """Raised for failed responses that may succeed when retried.
+
+    Attributes:
+        status_code: The HTTP status code of the response.
+    """
+
+    def __init__(self, status_code, message=None):
+        super().__init__(message or f"Status Code: {status_code}")
+        self.status_code = status_code
+
+
+def is_transient_status(status_code):
+    """Checks whether an HTTP status code is worth retrying."""
+    return status_code == 429 or 500 <= status_code < 600
+
+
+def get_backoff_delay(attempt,
+                      base_delay=DEFAULT_BASE_DELAY_SECONDS,
+                      max_delay=DEFAULT_MAX_DELAY_SECONDS):
+    """Returns how long to wait before retrying, with full jitter.
+
+    Args:
+        attempt: Number of attempts that have failed so far, from 1.
+        base_delay: Largest delay in seconds before the first retry.
+        max_delay: Largest delay in seconds before any retry.
+
+    Returns:
+        A random delay in seconds between zero and
+        min(max_delay, base_delay * 2 ** (attempt - 1)).
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def call_with_retry(function,
+                    transient_errors=(TransientError,),
+                    max_attempts=DEFAULT_MAX_ATTEMPTS,
+                    base_delay=DEFAULT_BASE_DELAY_SECONDS,
+                    max_delay=DEFAULT_MAX_DELAY_SECONDS):
+    """Calls a function, retrying it while it raises transient errors.
+
+    Args:
+        function: The function to call, without arguments.
+        transient_errors: A tuple of exception types to retry on.
+        max_attempts: Number of times to call the function at most.
+        base_delay: Largest delay in seconds before the first retry.
+        max_delay: Largest delay in seconds before any retry.
+
+    Returns:
+        The function's return value.
+
+    Raises:
+        The transient error of the last attempt once max_attempts calls
+        have failed, or any other error straight away.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return function()
+        except transient_errors as e:
+            if attempt == max_attempts:
+                raise
+            delay = get_backoff_delay(attempt, base_delay, max_delay)
+            print(f"Attempt {attempt} of {max_attempts} failed: {e}. "
+                  f"Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+async def call_with_retry_async(function,
+                                transient_errors=(TransientError,),
+                                max_attempts=DEFAULT_MAX_ATTEMPTS,
+                                base_delay=DEFAULT_BASE_DELAY_SECONDS,
+                                max_delay=DEFAULT_MAX_DELAY_SECONDS):
+    """Awaits a coroutine function, retrying it on transient errors.
+
+    The asyncio counterpart to `call_with_retry`, which waits between
+    attempts without blocking the event loop.
+
+    Args:
+        function: The coroutine function to call, without arguments.
+        transient_errors: A tuple of exception types to retry on.
+        max_attempts: Number of times to call the function at most.
+        base_delay: Largest delay in seconds before the first retry.
+        max_delay: Largest delay in seconds before any retry.
+
+    Returns:
+        The coroutine's result.
+
+    Raises:
+        The transient error of the last attempt once max_attempts calls
+        have failed, or any other error straight away.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await function()
+        except transient_errors as e:
+            if attempt == max_attempts:
+                raise
+            delay = get_backoff_delay(attempt, base_delay, max_delay)
+            print(f"Attempt {attempt} of {max_attempts} failed: {e}. "
+                  f"Retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,230 @@
+"""Module for running pipeline stages in dependency order.
+
+This module provides a small DAG runner for the pipeline. Stages are given as
+a dictionary mapping each stage name to the function to run and the names of
+the stages it depends on. Stages whose dependencies have finished run in
+parallel across a thread pool, which suits the pipeline's stages since they
+spend their time waiting on the NBA API, the Astronomy API or the database.
+The runner records each stage's wall time and reports the critical path, the
+longest chain of dependent stages, which bounds how fast the run can be.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_MAX_WORKERS = 4
+
+# Separates a stage group from the unit it runs for, e.g. 'game_logs:2020-21'.
+GROUP_SEPARATOR = ':'
+
+
+def get_stage_group(stage_name):
+    """Returns the group a stage belongs to, e.g. 'game_logs'."""
+    return stage_name.split(GROUP_SEPARATOR, 1)[0]
+
+
+def select_stages(stages, selected_names):
+    """Selects a subset of stages to run.
+
+    A name selects the stage with that name or every stage in the group of
+    that name. Dependencies on stages that are not selected are dropped, as
+    those stages are assumed to have run before.
+
+    Args:
+        stages: A dictionary mapping stage names to stage dictionaries with
+            'function' and 'depends_on' keys.
+        selected_names: A list of stage or group names to run.
+
+    Returns:
+        A dictionary of the selected stages.
+
+    Raises:
+        ValueError: If a name matches no stage or group.
+    """
+    selected = {}
+    for name in selected_names:
+        matches = [stage_name for stage_name in stages
+                   if name in (stage_name, get_stage_group(stage_name))]
+        if not matches:
+            raise ValueError(f"Unknown stage: {name}")
+        for stage_name in matches:
+            selected[stage_name] = stages[stage_name]
+
+    return {
+        stage_name: {
+            'function': stage['function'],
+            'depends_on': [dependency for dependency in stage['depends_on']
+                           if dependency in selected]
+        }
+        for stage_name, stage in stages.items()
+        if stage_name in selected
+    }
+
+
+def _check_stages(stages):
+    """Checks that all dependencies exist and that there are no cycles.
+
+    Raises:
+        ValueError: If a stage depends on an unknown stage or the stages
+            form a cycle.
+    """
+    for stage_name, stage in stages.items():
+        for dependency in stage['depends_on']:
+            if dependency not in stages:
+                raise ValueError(
+                    f"{stage_name} depends on unknown stage {dependency}")
+
+    remaining = {stage_name: set(stage['depends_on'])
+                 for stage_name, stage in stages.items()}
+    while remaining:
+        ready = [stage_name for stage_name, dependencies in remaining.items()
+                 if not dependencies]
+        if not ready:
+            raise ValueError(
+                f"Stages have a dependency cycle: {sorted(remaining)}")
+        for stage_name in ready:
+            del remaining[stage_name]
+        for dependencies in remaining.values():
+            dependencies.difference_update(ready)
+
+
+def get_critical_path(stages, durations):
+    """Finds the longest chain of dependent stages by wall time.
+
+    Args:
+        stages: A dictionary mapping stage names to stage dictionaries.
+        durations: A dictionary mapping stage names to their wall time in
+            seconds. Stages that did not run are left out.
+
+    Returns:
+        A tuple of the critical path's total time in seconds and the list
+        of stage names along it, in run order.
+    """
+    path_times = {}
+    previous = {}
+
+    def path_time(stage_name):
+        if stage_name not in path_times:
+            dependencies = [dependency for dependency
+                            in stages[stage_name]['depends_on']
+                            if dependency in durations]
+            slowest = max(dependencies, key=path_time, default=None)
+            previous[stage_name] = slowest
+            path_times[stage_name] = durations[stage_name] + (
+                path_time(slowest) if slowest else 0.0)
+        return path_times[stage_name]
+
+    if not durations:
+        return 0.0, []
+
+    last = max(durations, key=path_time)
+    path = []
+    stage_name = last
+    while stage_name:
+        path.append(stage_name)
+        stage_name = previous[stage_name]
+    return path_times[last], path[::-1]
+
+
+def run_stages(stages, max_workers=DEFAULT_MAX_WORKERS):
+    """Runs stages in dependency order, in parallel where possible.
+
+    A stage starts as soon as every stage it depends on has finished. If a
+    stage raises an exception, the stages that depend on it are skipped and
+    the others keep running.
+
+    Args:
+        stages: A dictionary mapping stage names to dictionaries with a
+            'function' to call without arguments and a 'depends_on' list of
+            stage names.
+        max_workers: Number of stages that can run at once.
+
+    Returns:
+        A dictionary mapping each stage that finished to its wall time in
+        seconds.
+
+    Raises:
+        ValueError: If a stage depends on an unknown stage or the stages
+            form a cycle.
+    """
+    _check_stages(stages)
+
+    pending = {stage_name: set(stage['depends_on'])
+               for stage_name, stage in stages.items()}
+    durations = {}
+    failed = set()
+    lock = threading.Lock()
+    run_start = time.perf_counter()
+
+    def run_stage(stage_name):
+        print(f"Starting stage {stage_name}...")
+        stage_start = time.perf_counter()
+        stages[stage_name]['function']()
+        duration = time.perf_counter() - stage_start
+        with lock:
+            durations[stage_name] = duration
+        print(f"Finished stage {stage_name} in {duration:.2f}s.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            ready = [stage_name for stage_name, dependencies
+                     in pending.items() if not dependencies]
+            for stage_name in ready:
+                del pending[stage_name]
+                running[executor.submit(run_stage, stage_name)] = stage_name
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage_name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    print(f"Stage {stage_name} failed: {error}")
+                    failed.add(stage_name)
+                    continue
+                for dependencies in pending.values():
+                    dependencies.discard(stage_name)
+
+            # Skip every stage that can no longer run because a stage it
+            # depends on failed or was skipped.
+            blocked = True
+            while blocked:
+                blocked = [stage_name for stage_name, dependencies
+                           in pending.items() if dependencies & failed]
+                for stage_name in blocked:
+                    print(f"Skipping stage {stage_name}.")
+                    del pending[stage_name]
+                    failed.add(stage_name)
+
+    report_stages(stages, durations, time.perf_counter() - run_start)
+    return durations
+
+
+def report_stages(stages, durations, wall_time):
+    """Prints each stage's wall time and the run's critical path.
+
+    Args:
+        stages: A dictionary mapping stage names to stage dictionaries.
+        durations: A dictionary mapping stage names to their wall time in
+            seconds.
+        wall_time: Wall time of the whole run in seconds.
+    """
+    for stage_name in stages:
+        if stage_name in durations:
+            print(f"Stage {stage_name}: {durations[stage_name]:.2f}s")
+        else:
+            print(f"Stage {stage_name}: did not run")
+
+    critical_time, critical_path = get_critical_path(stages, durations)
+    print(f"Total stage time: {sum(durations.values()):.2f}s")
+    print(f"Critical path time: {critical_time:.2f}s "
+          f"({' -> '.join(critical_path)})")
+    print(f"Wall time: {wall_time:.2f}s")
+
+
+if __name__ == "__main__":
+    pass
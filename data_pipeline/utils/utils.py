@@ -1,17 +1,40 @@
 """Module for utility functions used in api module.
 
 This module provides utility functions to save, store, and retrieve data from
-the NBA and Astronomy API in order to limit future API calls.
+the NBA and Astronomy API in order to limit future API calls. Responses are
+kept in the compressed response store; JSON files saved by earlier versions
+are still read and moved into the store the first time they are requested.
+Decoded responses are also kept in an in-memory LRU cache, so repeated
+lookups within one process skip the store entirely.
 """
 import os
 import json
 import hashlib
 import csv
 
+from data_pipeline.utils.content_hash import hash_payload
+from data_pipeline.utils.memory_cache import get_memory_cache
+from data_pipeline.utils.response_store import get_response_store
+
 # Define the base directory for storing JSON data files
 BASE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'json')
 
 
+def generate_cache_key(endpoint, **kwargs):
+    """Generates a cache key based on endpoint and keyword arguments.
+
+    Args:
+        endpoint: Name of endpoint used in nba_api or Astronomy API.
+        kwargs: Additional arguments used in the API call.
+
+    Returns:
+        A hash identifying the API call.
+    """
+    sorted_kwargs = sorted(kwargs.items())
+    identifier = f"{endpoint}_{sorted_kwargs}"
+    return hashlib.sha256(identifier.encode()).hexdigest()
+
+
 def generate_file_name(endpoint, **kwargs):
     """Generates a file name based on endpoint and keyword arguments.
 
@@ -22,9 +45,7 @@ def generate_file_name(endpoint, **kwargs):
     Returns:
         A hashed file name based on arguments used in the API call.
     """
-    sorted_kwargs = sorted(kwargs.items())
-    identifier = f"{endpoint}_{sorted_kwargs}"
-    file_name_hash = hashlib.sha256(identifier.encode()).hexdigest()
+    file_name_hash = generate_cache_key(endpoint, **kwargs)
     file_path = os.path.join(BASE_DIR, f"{file_name_hash}.json")
     return file_path
 
@@ -57,6 +78,95 @@ def check_file_exists(endpoint, **kwargs):
     return os.path.exists(file_path)
 
 
+def load_data_from_file(endpoint, **kwargs):
+    """Loads saved API response data if a file exists for the arguments.
+
+    Args:
+        endpoint: Name of endpoint used in nba_api or Astronomy API.
+        kwargs: Additional arguments used in the API call.
+
+    Returns:
+        The saved response data, or None if no file exists.
+    """
+    if not check_file_exists(endpoint, **kwargs):
+        return None
+    file_path = generate_file_name(endpoint, **kwargs)
+    with open(file_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def load_cached_response(endpoint, **kwargs):
+    """Loads a cached API response from memory or the response store.
+
+    Checks the in-memory cache first, then the response store, and finally
+    a JSON file saved by earlier versions, moving it into the response store
+    when found.
+
+    Args:
+        endpoint: Name of endpoint used in nba_api or Astronomy API.
+        kwargs: Additional arguments used in the API call.
+
+    Returns:
+        The cached response data, or None if the call has not been cached.
+    """
+    memory_cache = get_memory_cache()
+    key = generate_cache_key(endpoint, **kwargs)
+    response = memory_cache.get(key)
+    if response is not None:
+        return response
+
+    store = get_response_store()
+    raw = store.get_raw(key)
+    if raw is not None:
+        response = json.loads(raw)
+        memory_cache.put(key, response, len(raw))
+        return response
+
+    response = load_data_from_file(endpoint, **kwargs)
+    if response is not None:
+        size = store.put(key, endpoint, response)
+        memory_cache.put(key, response, size)
+    return response
+
+
+def save_cached_response(response, endpoint, **kwargs):
+    """Saves an API response to the response store and memory cache.
+
+    Args:
+        response: API response data to store.
+        endpoint: Name of endpoint used in nba_api or Astronomy API.
+        kwargs: Additional arguments used in the API call.
+    """
+    key = generate_cache_key(endpoint, **kwargs)
+    size = get_response_store().put(key, endpoint, response)
+    get_memory_cache().put(key, response, size)
+
+
+def get_response_hash(response, endpoint=None, **kwargs):
+    """Returns the content hash of an API response.
+
+    The hash kept next to the cached response is used when there is one, so
+    cached responses are not serialized again. Responses that are not
+    cached, such as locally computed moon data, are hashed directly.
+
+    Args:
+        response: API response data.
+        endpoint: Optional. Name of endpoint used in nba_api or Astronomy
+            API, if the response was cached under it.
+        kwargs: Additional arguments used in the API call.
+
+    Returns:
+        The hex digest of the response's hash.
+    """
+    content_hash = None
+    if endpoint is not None:
+        key = generate_cache_key(endpoint, **kwargs)
+        content_hash = get_response_store().get_content_hash(key)
+    if content_hash is None:
+        content_hash = hash_payload(json.dumps(response).encode('utf-8'))
+    return content_hash
+
+
 def get_home_team(matchup):
     """Identifies the home team from matchup format from nba_api.
 
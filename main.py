@@ -3,38 +3,281 @@
 This script wipes the existing database schema and sets it up anew. It then
 populates the database with player and team logs, team details including
 geographical locations, and moon phase data associated with each game, for
-specified sports seasons.
+specified sports seasons. In incremental mode the existing tables are kept
+and only games played since each season's watermark are added. If a run
+dies partway through, the next run resumes it from the ingestion journal,
+keeping the database and skipping the work that was already stored, unless
+it is started with --fresh. Seasons can also be reloaded in place, keeping
+the rest of the database, e.g.
+
+    python main.py --seasons 2020-21 --reload
+
+The steps run as stages of a dependency graph, so independent work such as
+the game logs, team details and moon data of different seasons runs in
+parallel. A subset of stages can be run from the command line, e.g.
+
+    python main.py --stages moon_data export --moon-backend local
+
+Data is stored in PostgreSQL, or in an embedded DuckDB file that needs no
+database server with --storage-backend duckdb.
 """
-from data_pipeline.database import setup, queries
+import argparse
+import functools
+
+from data_pipeline.api import nba_client
+from data_pipeline.database import storage
 from data_pipeline.data_ingestion import data_ingestion
+from data_pipeline.utils import scheduler
+from data_pipeline.utils.journal import get_journal
+from data_pipeline.utils.memory_cache import get_memory_cache
+from data_pipeline.utils.response_store import get_response_store
+
+# Seasons to pull data for
+SEASONS = ['2018-19', '2019-20', '2020-21', '2021-22', '2022-23']
+
+# Where moon data comes from: 'async' or 'api' to fetch it from the Astronomy
+# API, or 'local' to compute it offline with the moon ephemeris engine.
+MOON_DATA_BACKEND = 'async'
+
+# Whether to fetch moon data once per date for every arena and derive each
+# arena's altitude and azimuth locally, instead of fetching it per arena.
+SHARE_MOON_DATA = False
+
+# Whether to keep the existing tables and only add games newer than each
+# season's watermark, instead of rebuilding the database from scratch.
+INCREMENTAL = False
+
+STAGE_NAMES = ['setup', 'game_logs', 'team_details', 'moon_data',
+               'indexes', 'analysis_view', 'export']
+
+
+def setup_database(incremental, resuming=False, reload_seasons=None):
+    """Wipes the database unless running incrementally, then sets it up.
+
+    A fresh database is set up without secondary indexes, which the indexes
+    stage builds once all data is loaded. A resumed run keeps the database,
+    as it holds the work units the interrupted run finished. A reload keeps
+    the database and empties the game logs of the seasons to reload.
+    """
+    if resuming:
+        print("Resuming an unfinished run; keeping the database.")
+    elif reload_seasons:
+        print(f"Reloading {', '.join(reload_seasons)}; keeping the other "
+              f"seasons.")
+    elif not incremental:
+        # Wipe and restore database for fresh start
+        storage.wipe_database_schema()
+    storage.setup_database_schema(
+        with_indexes=incremental or bool(reload_seasons))
+    if reload_seasons and not resuming:
+        data_ingestion.reset_player_team_logs(reload_seasons)
+
+
+def build_stages(seasons, incremental, moon_backend,
+                 share_moon_data=SHARE_MOON_DATA, resuming=False,
+                 reload=False):
+    """Builds the pipeline's stages and the dependencies between them.
 
+    Game logs, team details and moon data get one stage per season, as
+    seasons do not depend on each other, so a season's moon data is fetched
+    as soon as its own games and teams are stored. All NBA API fetches
+    share one rate limiter.
 
-def main():
+    Args:
+        seasons: A list of seasons to pull data for.
+        incremental: Whether to keep the existing tables and only ingest
+            new games.
+        moon_backend: How to fetch moon data, see
+            `data_ingestion.fetch_and_insert_moon_data`.
+        share_moon_data: Whether to fetch moon data once per date for every
+            arena. Defaults to SHARE_MOON_DATA.
+        resuming: Whether the run resumes an unfinished one, in which case
+            the database is kept. Defaults to False.
+        reload: Whether to reload the seasons' game logs from the API in
+            place, keeping the rest of the database. Defaults to False.
+
+    Returns:
+        A dictionary mapping stage names to stage dictionaries for
+        `scheduler.run_stages`.
+    """
+    rate_limiter = nba_client.RateLimiter()
+
+    stages = {
+        'setup': {
+            'function': functools.partial(
+                setup_database, incremental, resuming,
+                seasons if reload else None),
+            'depends_on': []
+        },
+    }
+
+    # Store player logs, team details and moon data for each season
+    moon_data_stages = []
+    for season in seasons:
+        game_logs_stage = f"game_logs{scheduler.GROUP_SEPARATOR}{season}"
+        stages[game_logs_stage] = {
+            'function': functools.partial(
+                data_ingestion.fetch_and_insert_player_team_logs_data,
+                [season], incremental=incremental,
+                rate_limiter=rate_limiter, refresh=reload),
+            'depends_on': ['setup']
+        }
+
+        # Update team_details to include latitude and longitude of home
+        # games
+        team_details_stage = (
+            f"team_details{scheduler.GROUP_SEPARATOR}{season}")
+        stages[team_details_stage] = {
+            'function': functools.partial(
+                data_ingestion.fetch_and_insert_team_details,
+                incremental=incremental, rate_limiter=rate_limiter),
+            'depends_on': [game_logs_stage]
+        }
+
+        # Store moon data for each game based on lat and long
+        moon_data_stage = f"moon_data{scheduler.GROUP_SEPARATOR}{season}"
+        stages[moon_data_stage] = {
+            'function': functools.partial(
+                data_ingestion.fetch_and_insert_moon_data,
+                backend=moon_backend, incremental=incremental,
+                shared=share_moon_data, seasons=[season]),
+            'depends_on': [team_details_stage]
+        }
+        moon_data_stages.append(moon_data_stage)
+
+    # Build secondary indexes once the bulk loads are done
+    stages['indexes'] = {
+        'function': storage.create_all_indexes,
+        'depends_on': moon_data_stages
+    }
+
+    # Recompute the player-game analysis view from the loaded tables
+    stages['analysis_view'] = {
+        'function': storage.refresh_analysis_view,
+        'depends_on': ['indexes']
+    }
+
+    # Write the analysis view's records as a Parquet dataset for analysis
+    stages['export'] = {
+        'function': storage.create_analysis_dataset,
+        'depends_on': ['analysis_view']
+    }
+
+    return stages
+
+
+def main(seasons=None,
+         stages=None,
+         incremental=INCREMENTAL,
+         moon_backend=MOON_DATA_BACKEND,
+         max_workers=scheduler.DEFAULT_MAX_WORKERS,
+         storage_backend=None,
+         share_moon_data=SHARE_MOON_DATA,
+         fresh=False,
+         reload=False):
     """Executes the main script functions.
 
     Steps include wiping and setting up the database schema, fetching and
     inserting data for player and team logs, team details, and moon phases
     for each game.
+
+    Args:
+        seasons: A list of seasons to pull data for. Defaults to SEASONS.
+        stages: A list of stage names to run. Defaults to every stage.
+            Stages that are left out are assumed to have run before.
+        incremental: Whether to keep the existing tables and only ingest
+            new games. Defaults to INCREMENTAL.
+        moon_backend: How to fetch moon data. Defaults to MOON_DATA_BACKEND.
+        max_workers: Number of stages that can run at once.
+        storage_backend: Where to store data, 'postgres' or 'duckdb'.
+            Defaults to the backend selected in the configuration file.
+        share_moon_data: Whether to fetch moon data once per date for every
+            arena and derive each arena's altitude and azimuth locally.
+            Defaults to SHARE_MOON_DATA.
+        fresh: Whether to start over instead of resuming an unfinished run.
+            Defaults to False.
+        reload: Whether to reload the given seasons' game logs from the API
+            in place, keeping the rest of the database. A reload always
+            starts a new run. Defaults to False.
+
+    Raises:
+        ValueError: If both reload and incremental are set.
     """
-    # Wipe and restore database for fresh start
-    setup.wipe_database_schema()
-    setup.setup_database_schema()
+    if reload and incremental:
+        raise ValueError("A reload loads whole seasons and cannot be "
+                         "incremental.")
+    if storage_backend:
+        storage.set_storage_backend(storage_backend)
+
+    # Resume the last run if it did not finish, skipping its stored work
+    journal = get_journal()
+    resuming = journal.begin_run(fresh=fresh or reload)
 
-    # Seasons to pull data for
-    seasons = ['2018-19', '2019-20', '2020-21', '2021-22', '2022-23']
+    pipeline_stages = build_stages(seasons or SEASONS, incremental,
+                                   moon_backend, share_moon_data, resuming,
+                                   reload)
+    if stages:
+        pipeline_stages = scheduler.select_stages(pipeline_stages, stages)
 
-    # Store player logs and team game logs for seasons
-    data_ingestion.fetch_and_insert_player_team_logs_data(seasons)
+    durations = scheduler.run_stages(pipeline_stages,
+                                     max_workers=max_workers)
+    # Report the work units before a finished run clears them
+    journal.report()
+    if len(durations) == len(pipeline_stages):
+        journal.finish_run()
+    else:
+        print("Some stages did not finish; the next run resumes them.")
 
-    # Update team_details to include latitude and longitude of home games
-    data_ingestion.fetch_and_insert_team_details()
+    # Report how well cached API responses and connections were reused
+    get_memory_cache().report()
+    get_response_store().report()
+    storage.report()
+    storage.close()
 
-    # Store moon data for each game based on lat and long
-    data_ingestion.fetch_and_insert_moon_data()
 
-    # Create csv containing all joined records for analysis
-    queries.create_all_records_all_tables_csv()
+def parse_args(argv=None):
+    """Parses the command line arguments for the main script."""
+    parser = argparse.ArgumentParser(
+        description="Populate the NBA and moon data database.")
+    parser.add_argument('--stages', nargs='+', choices=STAGE_NAMES,
+                        help="Stages to run. Defaults to every stage.")
+    parser.add_argument('--seasons', nargs='+', default=SEASONS,
+                        help="Seasons to pull data for, e.g. 2022-23.")
+    parser.add_argument('--incremental', action='store_true',
+                        default=INCREMENTAL,
+                        help="Keep existing tables and only add new games.")
+    parser.add_argument('--moon-backend', default=MOON_DATA_BACKEND,
+                        choices=['async', 'api', 'local'],
+                        help="Where to get moon data from.")
+    parser.add_argument('--share-moon-data', action='store_true',
+                        default=SHARE_MOON_DATA,
+                        help="Fetch moon data once per date for every "
+                             "arena and derive altitude and azimuth "
+                             "locally.")
+    parser.add_argument('--workers', type=int,
+                        default=scheduler.DEFAULT_MAX_WORKERS,
+                        help="Number of stages that can run at once.")
+    parser.add_argument('--storage-backend',
+                        choices=storage.STORAGE_BACKENDS,
+                        help="Where to store data. Defaults to the backend "
+                             "selected in the configuration file.")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Start over instead of resuming an unfinished "
+                             "run.")
+    parser.add_argument('--reload', action='store_true',
+                        help="Reload the given seasons' game logs from the "
+                             "API, keeping the rest of the database.")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(seasons=args.seasons,
+         stages=args.stages,
+         incremental=args.incremental,
+         moon_backend=args.moon_backend,
+         max_workers=args.workers,
+         storage_backend=args.storage_backend,
+         share_moon_data=args.share_moon_data,
+         fresh=args.fresh,
+         reload=args.reload)
@@ -0,0 +1,156 @@
+"""Benchmarks moon response parsing on a full-year payload.
+
+Compares `astro_client.parse_transform_moon_data` against the original
+per-position implementation, which parsed and formatted every date with
+strptime and strftime and walked the nested fields of every position,
+game day or not. The payload is a year of daily positions computed by the
+local ephemeris backend, so no API calls or database are needed; lookup
+IDs are served from memory. Both implementations are checked to produce
+the same values for every game day before they are timed.
+
+Run from the repository root with:
+    python -m tests.benchmark_parse_moon_data
+"""
+
+import contextlib
+import io
+import timeit
+from datetime import datetime, timedelta
+
+from data_pipeline.api import astro_client, moon_ephemeris
+
+ITERATIONS = 200
+GAME_DAY_COUNTS = [45, 365]
+
+# Fields both implementations write, compared between their rows.
+SHARED_FIELDS = ['date', 'distance_from_earth_au',
+                 'distance_from_earth_km',
+                 'horizontal_position_altitude_degrees',
+                 'horizontal_position_azimuth_degrees',
+                 'equatorial_position_right_ascension',
+                 'equatorial_position_declination', 'elongation',
+                 'magnitude', 'game_id']
+
+
+def parse_transform_moon_data_old(response, game_id_dates):
+    """The per-position implementation the vectorized parser replaced."""
+    game_date_dict = {
+        game_date.strftime('%Y-%m-%d'): game_id
+        for game_id, game_date in game_id_dates
+    }
+
+    observer_location = response.get('data', {}
+                                     ).get('observer', {}
+                                           ).get('location', {})
+    latitude = observer_location.get('latitude')
+    longitude = observer_location.get('longitude')
+
+    headers = [
+        'moon_event_id', 'date', 'latitude', 'longitude', 'body_id',
+        'body_name', 'distance_from_earth_au', 'distance_from_earth_km',
+        'horizontal_position_altitude_degrees',
+        'horizontal_position_azimuth_degrees',
+        'equatorial_position_right_ascension',
+        'equatorial_position_declination',
+        'position_constellation_name', 'elongation', 'magnitude',
+        'phase_string', 'game_id'
+    ]
+
+    rows = []
+
+    for row in response.get('data', {}).get('rows', []):
+        body = row.get('body', {})
+        for position in row.get('positions', []):
+            date_str = position.get('date')
+            date_obj = datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%S.%f%z')
+            date_key = date_obj.strftime('%Y-%m-%d')
+
+            game_id = game_date_dict.get(date_key)
+            if game_id is None:
+                continue
+
+            moon_event_id = f"{date_str}_{latitude}_{longitude}"
+
+            event_row = [
+                moon_event_id, date_str, latitude, longitude,
+                body.get('id'), body.get('name'),
+                position.get('distance', {}).get('fromEarth', {}).get('au'),
+                position.get('distance', {}).get('fromEarth', {}).get('km'),
+                position.get('position', {}).get('horizontal', {}).get(
+                    'altitude', {}).get('degrees'),
+                position.get('position', {}).get('horizontal', {}).get(
+                    'azimuth', {}).get('degrees'),
+                position.get('position', {}).get('equatorial', {}).get(
+                    'rightAscension', {}).get('hours'),
+                position.get('position', {}).get('equatorial', {}).get(
+                    'declination', {}).get('degrees'),
+                position.get('position', {}).get('constellation', {}).get(
+                    'name'),
+                position.get('extraInfo', {}).get('elongation'),
+                position.get('extraInfo', {}).get('magnitude'),
+                position.get('extraInfo', {}).get('phase', {}).get('string'),
+                game_id
+            ]
+            rows.append(event_row)
+
+    return headers, rows
+
+
+def get_lookup_ids(table_name, keys):
+    """Serves lookup IDs from memory in place of the database."""
+    return {key: index for index, key in enumerate(
+        {key for key in keys if key is not None})}
+
+
+def get_game_id_dates(game_day_count):
+    """Spreads game days evenly over 2023."""
+    step = 365 / game_day_count
+    return [(f"00223{index:05d}",
+             datetime(2023, 1, 1) + timedelta(days=int(index * step)))
+            for index in range(game_day_count)]
+
+
+def time_per_call(parse, response, game_id_dates):
+    """Returns the mean seconds per call, with progress output muted."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds = timeit.timeit(lambda: parse(response, game_id_dates),
+                                number=ITERATIONS)
+    return seconds / ITERATIONS
+
+
+def get_shared_values(headers, rows, fields):
+    """Returns the given fields of each row, with dates cut to the day."""
+    indexes = [headers.index(field) for field in fields]
+    return [tuple(str(row[index])[:10] if field == 'date' else row[index]
+                  for field, index in zip(fields, indexes))
+            for row in rows]
+
+
+def main():
+    """Checks both parsers agree, then prints their time per call."""
+    astro_client.storage.get_lookup_ids = get_lookup_ids
+    response = moon_ephemeris.fetch_moon_data(
+        40.75, -73.99, '2023-01-01', '2023-12-31')
+    positions = response['data']['rows'][0]['positions']
+    print(f"Payload: {len(positions)} positions")
+
+    for game_day_count in GAME_DAY_COUNTS:
+        game_id_dates = get_game_id_dates(game_day_count)
+        old = parse_transform_moon_data_old(response, game_id_dates)
+        new = astro_client.parse_transform_moon_data(response,
+                                                     game_id_dates)
+        if (get_shared_values(*old, SHARED_FIELDS)
+                != get_shared_values(*new, SHARED_FIELDS)):
+            raise AssertionError("Parsers disagree on the parsed values.")
+
+        old_seconds = time_per_call(parse_transform_moon_data_old,
+                                    response, game_id_dates)
+        new_seconds = time_per_call(astro_client.parse_transform_moon_data,
+                                    response, game_id_dates)
+        print(f"{game_day_count} game days: "
+              f"{old_seconds * 1000:.2f} ms -> {new_seconds * 1000:.2f} ms "
+              f"per call ({old_seconds / new_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
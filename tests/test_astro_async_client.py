@@ -0,0 +1,115 @@
+"""Tests for the asyncio Astronomy API client."""
+
+import asyncio
+import threading
+
+import aiohttp
+import pytest
+
+from data_pipeline.api import astro_async_client, astro_client
+from data_pipeline.utils import retry
+
+
+class FakeResponse:
+    """Stands in for an aiohttp response."""
+
+    def __init__(self, status, data=None):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def json(self):
+        return self.data
+
+    async def text(self):
+        return 'error'
+
+
+class FakeSession:
+    """Returns queued responses, raising queued exceptions."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, params=None):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Replaces the response store with a dict, recording I/O threads."""
+    cached = {}
+    io_threads = []
+
+    def load_cached_response(endpoint, **kwargs):
+        io_threads.append(threading.current_thread())
+        return cached.get(tuple(sorted(kwargs.items())))
+
+    def save_cached_response(response, endpoint, **kwargs):
+        io_threads.append(threading.current_thread())
+        cached[tuple(sorted(kwargs.items()))] = response
+
+    monkeypatch.setattr(astro_async_client.utils, 'load_cached_response',
+                        load_cached_response)
+    monkeypatch.setattr(astro_async_client.utils, 'save_cached_response',
+                        save_cached_response)
+    monkeypatch.setattr(retry, 'get_backoff_delay', lambda *args: 0)
+    return cached, io_threads
+
+
+def fetch(session):
+    return asyncio.run(astro_async_client.fetch_moon_data(
+        session, asyncio.Semaphore(1), 40.0, -75.0, '2023-01-01',
+        '2023-01-02'))
+
+
+def test_fetch_moon_data_retries_transient_errors(cache):
+    session = FakeSession([aiohttp.ClientConnectionError('reset'),
+                           FakeResponse(503),
+                           FakeResponse(200, {'data': 1})])
+
+    assert fetch(session) == {'data': 1}
+    assert session.responses == []
+
+
+def test_fetch_moon_data_does_not_retry_client_errors(cache):
+    session = FakeSession([FakeResponse(404), FakeResponse(200, {})])
+
+    assert fetch(session) is None
+    assert len(session.responses) == 1
+
+
+def test_fetch_moon_data_uses_store_off_the_event_loop(cache):
+    cached, io_threads = cache
+    session = FakeSession([FakeResponse(200, {'data': 1})])
+
+    fetch(session)
+    assert fetch(FakeSession([])) == {'data': 1}
+    assert len(cached) == 1
+    assert io_threads
+    assert threading.main_thread() not in io_threads
+
+
+def test_fetch_moon_data_batch_collects_errors_per_request(monkeypatch):
+    async def fake_fetch_moon_data(session, semaphore, latitude, longitude,
+                                   from_date, to_date, time):
+        if latitude == 2:
+            raise RuntimeError("boom")
+        return {'latitude': latitude}
+
+    monkeypatch.setattr(astro_client, 'get_auth_string', lambda: 'auth')
+    monkeypatch.setattr(astro_async_client, 'fetch_moon_data',
+                        fake_fetch_moon_data)
+    requests = [(latitude, 0.0, '2023-01-01', '2023-01-02')
+                for latitude in (1, 2, 3)]
+
+    assert astro_async_client.fetch_moon_data_batch(requests) == [
+        {'latitude': 1}, None, {'latitude': 3}]
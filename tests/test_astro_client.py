@@ -0,0 +1,194 @@
+"""Tests for planning and parsing Astronomy API moon data."""
+
+from datetime import datetime
+
+import pytest
+
+from data_pipeline.api import astro_client
+
+ARENA = (40.0, -75.0)
+OTHER_ARENA = (34.0, -118.0)
+
+
+def game(game_id, date, location=ARENA):
+    return (game_id, datetime.strptime(date, '%Y-%m-%d'), *location)
+
+
+def test_plan_moon_data_windows_merges_close_game_dates():
+    games = [game('1', '2023-01-01'), game('2', '2023-01-05'),
+             game('3', '2023-01-30'), game('4', '2023-01-31')]
+
+    windows = astro_client.plan_moon_data_windows(games, max_gap_days=14)
+
+    assert [window[:4] for window in windows] == [
+        (40.0, -75.0, '2023-01-01', '2023-01-05'),
+        (40.0, -75.0, '2023-01-30', '2023-01-31'),
+    ]
+    assert [game_id for game_id, _ in windows[0][4]] == ['1', '2']
+
+
+def test_plan_moon_data_windows_splits_by_location_and_sorts():
+    games = [game('2', '2023-01-03'), game('1', '2023-01-01'),
+             game('3', '2023-01-02', OTHER_ARENA)]
+
+    windows = astro_client.plan_moon_data_windows(games)
+
+    assert sorted(window[:4] for window in windows) == [
+        (34.0, -118.0, '2023-01-02', '2023-01-02'),
+        (40.0, -75.0, '2023-01-01', '2023-01-03'),
+    ]
+
+
+def test_plan_moon_data_windows_caps_window_length():
+    games = [game(str(day), f'2023-01-{day:02d}') for day in range(1, 11)]
+
+    windows = astro_client.plan_moon_data_windows(games, max_window_days=4)
+
+    assert [window[2:4] for window in windows] == [
+        ('2023-01-01', '2023-01-04'), ('2023-01-05', '2023-01-08'),
+        ('2023-01-09', '2023-01-10')]
+
+
+def test_iter_moon_data_params_filters_seasons_and_locations(monkeypatch):
+    queries = []
+
+    def iter_query_records(query_sql, params=None):
+        queries.append((query_sql, params))
+        return iter([game('1', '2023-01-01'),
+                     ('2', datetime(2023, 1, 2), None, None)])
+
+    monkeypatch.setattr(astro_client.storage, 'iter_query_records',
+                        iter_query_records)
+
+    params = astro_client.get_moon_data_params(seasons=['2022-23'])
+
+    assert params == [game('1', '2023-01-01')]
+    query_sql, query_params = queries[0]
+    assert 'season_year' in query_sql and '%' not in query_sql.replace(
+        '%s', '')
+    assert query_params == (['2022-23'],)
+    astro_client.get_moon_data_params()
+    assert queries[1][1] is None
+
+
+def test_get_days_requested_counts_inclusive_days():
+    windows = [(0, 0, '2023-01-01', '2023-01-05'),
+               (0, 0, '2023-02-01', '2023-02-01')]
+
+    assert astro_client.get_days_requested(windows) == 6
+
+
+@pytest.fixture
+def lookup_ids(monkeypatch):
+    def get_lookup_ids(table_name, keys):
+        keys = sorted({key for key in keys if key is not None}, key=str)
+        return {key: f"{table_name}:{key}" for key in keys}
+
+    monkeypatch.setattr(astro_client.storage, 'get_lookup_ids',
+                        get_lookup_ids)
+
+
+def position(date, altitude='10.00', phase='Full Moon'):
+    return {
+        'date': date,
+        'distance': {'fromEarth': {'au': '0.00257', 'km': '384400.0'}},
+        'position': {
+            'horizontal': {'altitude': {'degrees': altitude},
+                           'azimuth': {'degrees': '180.00'}},
+            'equatorial': {'rightAscension': {'hours': '12.50'},
+                           'declination': {'degrees': '-5.00'}},
+            'constellation': {'name': 'Virgo'},
+        },
+        'extraInfo': {'elongation': 170.1, 'magnitude': -12.6,
+                      'phase': {'string': phase}},
+    }
+
+
+def moon_response(positions):
+    return {'data': {
+        'observer': {'location': {'latitude': 40.0, 'longitude': -75.0}},
+        'rows': [{'positions': positions}],
+    }}
+
+
+def test_parse_transform_moon_data_keeps_game_days_only(lookup_ids):
+    response = moon_response([
+        position('2023-01-01T00:00:00.000-05:00'),
+        position('2023-01-02T00:00:00.000-05:00', altitude='-3.00'),
+        position('2023-01-03T00:00:00.000-05:00'),
+    ])
+    game_id_dates = [('g1', datetime(2023, 1, 2)),
+                     ('g0', datetime(2023, 1, 3)),
+                     ('g2', datetime(2023, 1, 3))]
+
+    headers, rows = astro_client.parse_transform_moon_data(response,
+                                                          game_id_dates)
+
+    assert len(rows) == 2
+    assert len(headers) == len(rows[0])
+    first = dict(zip(headers, rows[0]))
+    assert first == {
+        'arena_id': 'arenas:(40.0, -75.0)', 'date': '2023-01-02',
+        'constellation_id': 'constellations:Virgo',
+        'phase_id': 'moon_phases:Full Moon',
+        'distance_from_earth_au': '0.00257',
+        'distance_from_earth_km': '384400.0',
+        'horizontal_position_altitude_degrees': '-3.00',
+        'horizontal_position_azimuth_degrees': '180.00',
+        'equatorial_position_right_ascension': '12.50',
+        'equatorial_position_declination': '-5.00',
+        'elongation': 170.1, 'magnitude': -12.6, 'game_id': 'g1',
+    }
+    # The last game listed for a date wins.
+    assert dict(zip(headers, rows[1]))['game_id'] == 'g2'
+
+
+def test_parse_transform_moon_data_handles_missing_fields(lookup_ids):
+    incomplete = position('2023-01-02T00:00:00.000-05:00')
+    del incomplete['position']
+    incomplete['extraInfo'] = None
+    response = moon_response([
+        position(None), {'date': ''}, {}, incomplete])
+
+    headers, rows = astro_client.parse_transform_moon_data(
+        response, [('g1', datetime(2023, 1, 2))])
+
+    assert len(rows) == 1
+    row = dict(zip(headers, rows[0]))
+    assert row['distance_from_earth_km'] == '384400.0'
+    assert row['constellation_id'] is None
+    assert row['horizontal_position_altitude_degrees'] is None
+    assert row['phase_id'] is None
+    assert row['magnitude'] is None
+
+
+def test_parse_transform_moon_data_without_positions(lookup_ids):
+    headers, rows = astro_client.parse_transform_moon_data(
+        {'data': {}}, [('g1', datetime(2023, 1, 2))])
+
+    assert headers[-1] == 'game_id'
+    assert rows == []
+
+
+@pytest.mark.parametrize('location, resolved', [
+    ({'latitude': 40.0, 'longitude': -75.0}, False),
+    ({'latitude': None, 'longitude': -75.0}, True),
+    ({}, True),
+])
+def test_parse_transform_moon_data_skips_unresolved_arenas(
+        monkeypatch, capsys, location, resolved):
+    def get_lookup_ids(table_name, keys):
+        # A failed lookup returns no IDs
+        return {key: 1 for key in keys} if resolved else {}
+
+    monkeypatch.setattr(astro_client.storage, 'get_lookup_ids',
+                        get_lookup_ids)
+    response = moon_response([position('2023-01-02T00:00:00.000-05:00')])
+    response['data']['observer']['location'] = location
+
+    headers, rows = astro_client.parse_transform_moon_data(
+        response, [('g1', datetime(2023, 1, 2))])
+
+    assert headers[0] == 'arena_id'
+    assert rows == []
+    assert 'Could not resolve the arena' in capsys.readouterr().out
@@ -0,0 +1,106 @@
+"""Tests for payload and row content hashes."""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from data_pipeline.utils.content_hash import hash_payload, hash_rows
+
+HEADERS = ['id', 'points', 'game_date', 'name']
+
+
+def test_hash_payload_is_stable():
+    assert hash_payload(b'{"a": 1}') == hash_payload(b'{"a": 1}')
+    assert hash_payload(b'{"a": 1}') != hash_payload(b'{"a": 2}')
+
+
+def test_records_and_columns_hash_alike():
+    records = [(1, 20.5, datetime.datetime(2023, 1, 1), 'a'),
+               (2, None, None, None)]
+    columns = [np.array([1, 2]),
+               np.array([20.5, np.nan]),
+               np.array(['2023-01-01', 'NaT'], dtype='datetime64[s]'),
+               np.array(['a', None], dtype=object)]
+
+    assert (hash_rows(HEADERS, records=records).tolist()
+            == hash_rows(HEADERS, columns=columns).tolist())
+
+
+@pytest.mark.parametrize('column', [
+    np.array([3, 4], dtype=np.int64),
+    np.array([3, 4], dtype=np.int32),
+    np.array([3.0, 4.0]),
+    np.array([3, 4.0], dtype=object),
+    np.array([np.int64(3), np.float64(4)], dtype=object),
+])
+def test_equal_numbers_hash_alike_whatever_the_dtype(column):
+    expected = hash_rows(['value'], records=[(3,), (4,)])
+
+    assert hash_rows(['value'], columns=[column]).tolist() == expected.tolist()
+
+
+def test_a_null_does_not_change_the_other_rows_hashes():
+    # A null turns an int64 column into an object or float64 column
+    without_null = hash_rows(['value'], columns=[np.array([1, 2])])
+    with_none = hash_rows(['value'],
+                          columns=[np.array([1, 2, None], dtype=object)])
+    with_nan = hash_rows(['value'], columns=[np.array([1, 2, np.nan])])
+
+    assert with_none[:2].tolist() == without_null.tolist()
+    assert with_nan.tolist() == with_none.tolist()
+
+
+def test_dates_hash_alike_whatever_their_type():
+    expected = hash_rows(['day'], records=[(datetime.date(2023, 1, 1),)])
+
+    for column in [np.array(['2023-01-01'], dtype='datetime64[D]'),
+                   np.array(['2023-01-01'], dtype='datetime64[ns]'),
+                   np.array([datetime.datetime(2023, 1, 1)], dtype=object)]:
+        assert hash_rows(['day'], columns=[column]).tolist() == (
+            expected.tolist())
+
+
+def test_null_differs_from_none_and_empty_strings():
+    hashes = hash_rows(['value'], records=[(None,), ('None',), ('',)])
+
+    assert len(set(hashes.tolist())) == 3
+
+
+def test_changed_values_and_column_order_change_the_hash():
+    hashes = hash_rows(['a', 'b'], records=[(1, 2), (1, 3), (2, 1)])
+
+    assert len(set(hashes.tolist())) == 3
+
+
+def test_mixed_type_columns_are_hashed_by_value():
+    records = [(1, 'x'), (2.5, 'y'), ('z', None)]
+    columns = [np.array([1.0, 2.5, 'z'], dtype=object),
+               np.array(['x', 'y', None], dtype=object)]
+
+    assert (hash_rows(['a', 'b'], records=records).tolist()
+            == hash_rows(['a', 'b'], columns=columns).tolist())
+
+
+def test_hashes_fit_a_bigint_column():
+    hashes = hash_rows(['value'], records=[(value,) for value in range(5)])
+
+    assert hashes.dtype == np.int64
+    assert len(hashes) == 5
+
+
+def test_no_rows_give_no_hashes():
+    assert len(hash_rows(HEADERS, records=[])) == 0
+    assert len(hash_rows(HEADERS, columns=[np.array([])] * 4)) == 0
+
+
+def test_large_integers_are_hashed_exactly():
+    large = 2 ** 53
+    records = [(large,), (large + 1,)]
+    hashes = hash_rows(['value'], records=records)
+
+    assert hashes[0] != hashes[1]
+    assert hashes.tolist() == hash_rows(
+        ['value'], columns=[np.array([large, large + 1])]).tolist()
+    assert hash_rows(['value'], records=[(2 ** 70,), ('x',)])[0] != (
+        hash_rows(['value'], records=[(2 ** 70 + 1,), ('x',)])[0])
@@ -0,0 +1,55 @@
+"""Tests for writing and loading the analysis dataset."""
+
+import os
+
+import pyarrow as pa
+import pytest
+
+from data_pipeline.utils import dataset
+
+SCHEMA = pa.schema([('season_year', pa.string()), ('pts', pa.int64())])
+
+
+def batch(season, points):
+    return pa.RecordBatch.from_pydict(
+        {'season_year': [season] * len(points), 'pts': points},
+        schema=SCHEMA)
+
+
+def test_write_dataset_replaces_the_existing_dataset(tmp_path):
+    base_dir = str(tmp_path / 'dataset')
+    dataset.write_dataset([batch('2021-22', [1, 2])], SCHEMA, base_dir)
+    dataset.write_dataset([batch('2022-23', [3])], SCHEMA, base_dir)
+
+    data = dataset.load_dataset(base_dir=base_dir)
+
+    assert data['pts'].tolist() == [3]
+    assert os.listdir(tmp_path) == ['dataset']
+
+
+def test_failed_write_keeps_the_last_dataset(tmp_path):
+    base_dir = str(tmp_path / 'dataset')
+    dataset.write_dataset([batch('2021-22', [1, 2])], SCHEMA, base_dir)
+
+    def failing_batches():
+        yield batch('2022-23', [3])
+        raise OSError('connection lost')
+
+    with pytest.raises(OSError):
+        dataset.write_dataset(failing_batches(), SCHEMA, base_dir)
+
+    data = dataset.load_dataset(base_dir=base_dir)
+    assert sorted(data['pts'].tolist()) == [1, 2]
+    assert os.listdir(tmp_path) == ['dataset']
+
+
+def test_load_dataset_filters_seasons_and_columns(tmp_path):
+    base_dir = str(tmp_path / 'dataset')
+    dataset.write_dataset([batch('2021-22', [1]), batch('2022-23', [2])],
+                          SCHEMA, base_dir)
+
+    data = dataset.load_dataset(columns=['pts'], seasons=['2022-23'],
+                                base_dir=base_dir)
+
+    assert list(data.columns) == ['pts']
+    assert data['pts'].tolist() == [2]
@@ -0,0 +1,109 @@
+"""Tests for the PostgreSQL connection pool."""
+
+import pytest
+from psycopg2 import InterfaceError, OperationalError
+
+from data_pipeline.database import db_connection
+
+CONFIG = {'dbname': 'nba', 'user': 'user', 'password': 'secret',
+          'host': 'localhost'}
+
+
+class FakeCursor:
+    """Answers the pool's health check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query_sql):
+        pass
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection."""
+
+    def __init__(self, rollback_error=None):
+        self.closed = 0
+        self.autocommit = True
+        self.rollback_error = rollback_error
+
+    def get_transaction_status(self):
+        return 0
+
+    def set_isolation_level(self, level):
+        self.autocommit = True
+
+    def cursor(self):
+        return FakeCursor()
+
+    def rollback(self):
+        if self.rollback_error is not None:
+            raise self.rollback_error
+
+
+class FakeThreadedPool:
+    """Hands out queued connections and records the ones put back."""
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.connections = []
+        self.returned = []
+
+    def getconn(self):
+        return self.connections.pop(0)
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(db_connection, 'ThreadedConnectionPool',
+                        FakeThreadedPool)
+    return db_connection.ConnectionPool(CONFIG, max_connections=1)
+
+
+def use(pool, conn):
+    """Checks a connection out and leaves a transaction open on it."""
+    pool._pool.connections.append(conn)
+    with pool.connection() as checked_out:
+        checked_out.autocommit = False
+
+
+def test_checkin_ends_open_transactions(pool):
+    conn = FakeConnection()
+
+    use(pool, conn)
+
+    assert pool._pool.returned == [(conn, False)]
+    assert conn.autocommit is True
+
+
+@pytest.mark.parametrize('error', [OperationalError('server closed'),
+                                   InterfaceError('connection already '
+                                                  'closed')])
+def test_checkin_closes_connections_that_fail_to_roll_back(pool, error):
+    broken = FakeConnection(rollback_error=error)
+
+    use(pool, broken)
+
+    # The connection is handed back to be closed and its slot is freed
+    assert pool._pool.returned == [(broken, True)]
+    assert pool._in_use == 0
+    conn = FakeConnection()
+    use(pool, conn)
+    assert pool._pool.returned[-1] == (conn, False)
+
+
+def test_report_does_not_open_a_pool(monkeypatch, capsys):
+    def unreachable(*args, **kwargs):
+        raise OperationalError('could not connect to server')
+
+    monkeypatch.setattr(db_connection, '_pool', None)
+    monkeypatch.setattr(db_connection, 'ConnectionPool', unreachable)
+
+    db_connection.report_connection_pool()
+
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,71 @@
+"""Tests for the embedded DuckDB storage backend."""
+
+import pytest
+
+from data_pipeline.database import duckdb_backend, schema
+
+
+@pytest.fixture
+def database(tmp_path):
+    previous_path = duckdb_backend._database_path
+    duckdb_backend.set_database_path(str(tmp_path / 'test.duckdb'))
+    duckdb_backend.setup_database_schema()
+    yield duckdb_backend
+    duckdb_backend.set_database_path(previous_path)
+
+
+def test_table_creation_sql_drops_partitioning():
+    statements = duckdb_backend.get_table_creation_sql(
+        schema.PLAYER_GAME_LOGS_TABLE)
+
+    assert len(statements) == 1
+    assert 'PARTITION BY' not in statements[0]
+    assert 'CREATE TABLE IF NOT EXISTS player_game_logs' in statements[0]
+
+
+def test_table_creation_sql_draws_identity_from_a_sequence():
+    statements = duckdb_backend.get_table_creation_sql(
+        schema.MOON_EVENTS_TABLE)
+
+    assert statements[0] == ("CREATE SEQUENCE IF NOT EXISTS "
+                             "moon_events_moon_event_id_seq;")
+    assert duckdb_backend.IDENTITY_SQL not in statements[1]
+    assert ("moon_event_id INTEGER DEFAULT "
+            "nextval('moon_events_moon_event_id_seq') PRIMARY KEY"
+            in statements[1])
+
+
+def test_table_creation_sql_keeps_plain_tables():
+    assert duckdb_backend.get_table_creation_sql(schema.GAMES_TABLE) == [
+        schema.GAMES_TABLE['table_creation_sql']]
+
+
+def test_schema_creates_tables_and_foreign_keys(database):
+    with database.get_connection() as cur:
+        tables = {name for name, in cur.execute(
+            "SELECT table_name FROM duckdb_tables();").fetchall()}
+        foreign_keys = cur.execute(
+            """SELECT constraint_text FROM duckdb_constraints()
+            WHERE table_name = 'moon_events'
+                AND constraint_type = 'FOREIGN KEY'
+            ORDER BY constraint_text;""").fetchall()
+
+    assert tables >= {table['table_name']
+                      for table in schema.ALL_TABLE_SCHEMAS}
+    # REFERENCES without a column list resolves to the primary key.
+    assert [text for text, in foreign_keys] == [
+        'FOREIGN KEY (arena_id) REFERENCES arenas(arena_id)',
+        'FOREIGN KEY (constellation_id) '
+        'REFERENCES constellations(constellation_id)',
+        'FOREIGN KEY (game_id) REFERENCES games(game_id)',
+        'FOREIGN KEY (phase_id) REFERENCES moon_phases(phase_id)',
+    ]
+
+
+def test_get_lookup_ids_adds_missing_values(database):
+    first = database.get_lookup_ids('moon_phases', ['Full Moon', None])
+    second = database.get_lookup_ids('moon_phases',
+                                     ['Full Moon', 'New Moon'])
+
+    assert set(second) == {'Full Moon', 'New Moon'}
+    assert second['Full Moon'] == first['Full Moon']
@@ -0,0 +1,106 @@
+"""Tests for the ingestion checkpoint journal."""
+
+import pytest
+
+from data_pipeline.utils.journal import IngestionJournal
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'journal.sqlite3')
+
+
+def test_first_run_does_not_resume(journal_path):
+    journal = IngestionJournal(journal_path)
+
+    assert journal.begin_run() is False
+    assert journal.resuming is False
+
+
+def test_unfinished_run_resumes_with_its_done_units(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin_run()
+    journal.add_units('teams', ['team:1', 'team:2'])
+    journal.mark_done('teams', 'team:1')
+    journal.close()
+
+    # A new instance stands in for the next process after a crash
+    journal = IngestionJournal(journal_path)
+
+    assert journal.begin_run() is True
+    assert journal.is_done('team:1')
+    assert not journal.is_done('team:2')
+    assert journal.get_status_counts() == {'pending': 1, 'done': 1,
+                                           'failed': 0}
+
+
+def test_failed_units_keep_the_run_unfinished(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin_run()
+    journal.add_units('teams', ['team:1'])
+    journal.mark_failed('teams', 'team:1', 'timeout')
+
+    assert journal.finish_run() is False
+    journal.close()
+
+    journal = IngestionJournal(journal_path)
+    assert journal.begin_run() is True
+    assert not journal.is_done('team:1')
+
+
+def test_fresh_run_discards_an_unfinished_run(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin_run()
+    journal.add_units('teams', ['team:1'])
+    journal.mark_done('teams', 'team:1')
+
+    assert journal.begin_run(fresh=True) is False
+    assert not journal.is_done('team:1')
+    assert journal.get_status_counts() == {'pending': 0, 'done': 0,
+                                           'failed': 0}
+
+
+def test_finished_run_clears_its_units(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin_run()
+    journal.add_units('teams', ['team:1'])
+    journal.mark_done('teams', 'team:1')
+
+    assert journal.finish_run() is True
+    assert not journal.is_done('team:1')
+    journal.close()
+
+    journal = IngestionJournal(journal_path)
+    assert journal.get_status_counts()['done'] == 0
+    assert journal.begin_run() is False
+
+
+def test_add_units_keeps_the_status_of_known_units(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin_run()
+    journal.add_units('teams', ['team:1'])
+    journal.mark_done('teams', 'team:1')
+    journal.add_units('teams', ['team:1', 'team:2'])
+
+    assert journal.is_done('team:1')
+    assert journal.get_status_counts()['pending'] == 1
+
+
+def test_add_units_can_replace_a_stages_unfinished_units(journal_path):
+    journal = IngestionJournal(journal_path)
+    journal.begin_run()
+    journal.add_units('moon', ['moon:a', 'moon:b', 'moon:c'])
+    journal.add_units('teams', ['team:1'])
+    journal.mark_done('moon', 'moon:a')
+    journal.mark_failed('moon', 'moon:b', 'timeout')
+
+    journal.add_units('moon', ['moon:d'], replace_unfinished=True)
+
+    # Done units and other stages' units are kept; the rest are replaced
+    assert journal.is_done('moon:a')
+    assert journal.get_status_counts() == {'pending': 2, 'done': 1,
+                                           'failed': 0}
+    journal.close()
+    journal = IngestionJournal(journal_path)
+    assert journal.get_status_counts() == {'pending': 2, 'done': 1,
+                                           'failed': 0}
@@ -0,0 +1,82 @@
+"""Tests for the pipeline's entry point."""
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    recorded = []
+
+    def record(name):
+        return lambda *args, **kwargs: recorded.append((name, args, kwargs))
+
+    for name in ['wipe_database_schema', 'setup_database_schema']:
+        monkeypatch.setattr(main.storage, name, record(name))
+    monkeypatch.setattr(main.data_ingestion, 'reset_player_team_logs',
+                        record('reset_player_team_logs'))
+    return recorded
+
+
+def test_setup_database_wipes_for_a_full_load(calls):
+    main.setup_database(incremental=False)
+
+    assert [name for name, _, _ in calls] == [
+        'wipe_database_schema', 'setup_database_schema']
+    assert calls[1][2] == {'with_indexes': False}
+
+
+def test_setup_database_reload_keeps_database_and_resets_seasons(calls):
+    main.setup_database(incremental=False, reload_seasons=['2020-21'])
+
+    assert calls == [
+        ('setup_database_schema', (), {'with_indexes': True}),
+        ('reset_player_team_logs', (['2020-21'],), {}),
+    ]
+
+
+def test_setup_database_resumed_reload_does_not_reset_again(calls):
+    main.setup_database(incremental=False, resuming=True,
+                        reload_seasons=['2020-21'])
+
+    assert [name for name, _, _ in calls] == ['setup_database_schema']
+
+
+def test_reload_passes_seasons_to_setup_and_refreshes_game_logs():
+    stages = main.build_stages(['2020-21'], incremental=False,
+                               moon_backend='local', reload=True)
+
+    assert stages['setup']['function'].args[2] == ['2020-21']
+    separator = main.scheduler.GROUP_SEPARATOR
+    game_logs = stages[f"game_logs{separator}2020-21"]['function']
+    assert game_logs.keywords['refresh'] is True
+
+
+def test_reload_cannot_be_incremental():
+    with pytest.raises(ValueError):
+        main.main(incremental=True, reload=True)
+
+
+def test_parse_args_reload():
+    args = main.parse_args(['--seasons', '2020-21', '--reload'])
+
+    assert args.seasons == ['2020-21']
+    assert args.reload is True
+
+
+def test_moon_data_stages_wait_only_on_their_own_season():
+    separator = main.scheduler.GROUP_SEPARATOR
+    stages = main.build_stages(['2020-21', '2021-22'], incremental=False,
+                               moon_backend='local')
+
+    for season in ['2020-21', '2021-22']:
+        moon_data = stages[f"moon_data{separator}{season}"]
+        team_details = stages[f"team_details{separator}{season}"]
+        assert moon_data['depends_on'] == [
+            f"team_details{separator}{season}"]
+        assert team_details['depends_on'] == [
+            f"game_logs{separator}{season}"]
+        assert moon_data['function'].keywords['seasons'] == [season]
+    assert stages['indexes']['depends_on'] == [
+        f"moon_data{separator}2020-21", f"moon_data{separator}2021-22"]
@@ -0,0 +1,46 @@
+"""Tests for the in-memory LRU response cache."""
+
+from data_pipeline.utils.memory_cache import LRUCache
+
+
+def test_get_counts_hits_and_misses():
+    cache = LRUCache(max_bytes=100)
+    cache.put('a', {'value': 1}, 10)
+
+    assert cache.get('a') == {'value': 1}
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate() == 0.5
+
+
+def test_put_evicts_least_recently_used_to_stay_under_cap():
+    cache = LRUCache(max_bytes=30)
+    cache.put('a', 'A', 10)
+    cache.put('b', 'B', 10)
+    cache.put('c', 'C', 10)
+    cache.get('a')
+    cache.put('d', 'D', 10)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['A', 'C', 'D']
+    assert cache.evictions == 1
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = LRUCache(max_bytes=30)
+    cache.put('a', 'A', 20)
+    cache.put('a', 'A2', 5)
+    cache.put('b', 'B', 25)
+
+    assert cache.get('a') == 'A2'
+    assert cache.get('b') == 'B'
+    assert cache.evictions == 0
+
+
+def test_values_larger_than_the_cache_are_not_cached():
+    cache = LRUCache(max_bytes=10)
+    cache.put('a', 'A', 5)
+    cache.put('big', 'BIG', 11)
+
+    assert cache.get('big') is None
+    assert cache.get('a') == 'A'
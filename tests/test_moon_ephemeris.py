@@ -0,0 +1,76 @@
+"""Tests for the vectorized lunar ephemeris.
+
+Expected values are the worked examples in Meeus, Astronomical Algorithms:
+example 47.a for the moon and example 25.a for the sun.
+"""
+
+import numpy as np
+import pytest
+
+from data_pipeline.api import moon_ephemeris
+
+# 1992 April 12, 0h TD.
+MOON_EXAMPLE_JD = 2448724.5
+# 1992 October 13, 0h TD.
+SUN_EXAMPLE_JD = 2448908.5
+
+
+def test_julian_day():
+    utc_times = np.array(['2000-01-01T12:00:00', '1992-04-12T00:00:00'],
+                         dtype='datetime64[s]')
+
+    np.testing.assert_allclose(moon_ephemeris.julian_day(utc_times),
+                               [2451545.0, MOON_EXAMPLE_JD])
+
+
+def test_moon_geocentric_position_matches_meeus():
+    moon = moon_ephemeris.moon_geocentric_position(
+        np.array([MOON_EXAMPLE_JD]))
+
+    # The apparent longitude, which includes nutation. Only the largest
+    # periodic terms are summed, which is good to a hundredth of a degree.
+    assert moon['longitude'][0] == pytest.approx(133.167265, abs=0.01)
+    assert moon['latitude'][0] == pytest.approx(-3.229126, abs=0.01)
+    assert moon['distance_km'][0] == pytest.approx(368409.7, abs=50)
+    assert moon['obliquity'][0] == pytest.approx(23.440636, abs=1e-3)
+
+
+def test_sun_position_matches_meeus():
+    moon = moon_ephemeris.moon_geocentric_position(
+        np.array([SUN_EXAMPLE_JD]))
+
+    assert moon['sun_longitude'][0] == pytest.approx(199.90895, abs=1e-3)
+    assert moon['sun_distance_km'][0] / moon_ephemeris.AU_KM == (
+        pytest.approx(0.99766, abs=1e-5))
+
+
+def test_moon_geocentric_position_keeps_the_input_shape():
+    jd = MOON_EXAMPLE_JD + np.arange(6.0).reshape(2, 3)
+    moon = moon_ephemeris.moon_geocentric_position(jd)
+    flat_moon = moon_ephemeris.moon_geocentric_position(jd.ravel())
+
+    for field, values in moon.items():
+        np.testing.assert_allclose(values.ravel(), flat_moon[field])
+
+
+def test_compute_moon_positions_broadcasts_locations_and_times():
+    utc_times = np.arange(np.datetime64('2023-01-01T00:00:00'),
+                          np.datetime64('2023-01-11T00:00:00'),
+                          np.timedelta64(1, 'D'))
+    positions = moon_ephemeris.compute_moon_positions(
+        utc_times[:, None], [40.0, 34.0], [-75.0, -118.0])
+
+    for values in positions.values():
+        assert values.shape == (10, 2)
+    assert np.all(np.abs(positions['altitude']) <= 91)
+    assert np.all((positions['azimuth'] >= 0) & (positions['azimuth'] < 360))
+    assert np.all((positions['elongation'] >= 0)
+                  & (positions['elongation'] <= 180))
+
+
+def test_topocentric_distance_is_within_an_earth_radius():
+    utc_times = np.array(['1992-04-12T00:00:00'], dtype='datetime64[s]')
+    positions = moon_ephemeris.compute_moon_positions(utc_times, 40.0, -75.0)
+
+    assert abs(positions['distance_km'][0] - 368409.7) < (
+        moon_ephemeris.EARTH_RADIUS_KM)
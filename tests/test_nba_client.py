@@ -0,0 +1,235 @@
+"""Tests for the NBA API client."""
+
+import json
+
+import numpy as np
+import pytest
+import requests
+
+from data_pipeline.api import nba_client
+
+
+class FakeClock:
+    """Stands in for time.monotonic and time.sleep."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(nba_client.time, 'monotonic', fake_clock.monotonic)
+    monkeypatch.setattr(nba_client.time, 'sleep', fake_clock.sleep)
+    return fake_clock
+
+
+def test_rate_limiter_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        nba_client.RateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        nba_client.RateLimiter(burst=0)
+
+
+def test_rate_limiter_allows_burst_without_waiting(clock):
+    rate_limiter = nba_client.RateLimiter(rate=1.0, burst=3)
+    for _ in range(3):
+        rate_limiter.acquire()
+
+    assert clock.slept == []
+    assert rate_limiter.requests_made == 3
+    assert rate_limiter.throttled_seconds == 0
+
+
+def test_rate_limiter_waits_for_tokens_after_burst(clock):
+    rate_limiter = nba_client.RateLimiter(rate=2.0, burst=1)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+
+    assert clock.slept == [pytest.approx(0.5), pytest.approx(0.5)]
+    assert rate_limiter.throttled_seconds == pytest.approx(1.0)
+
+
+def test_rate_limiter_refills_up_to_burst(clock):
+    rate_limiter = nba_client.RateLimiter(rate=1.0, burst=2)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+    clock.now += 10
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+
+    assert clock.slept == []
+    assert rate_limiter.requests_made == 4
+
+
+def test_fetch_nba_data_concurrent_yields_every_request(monkeypatch):
+    def fake_fetch_nba_data(endpoint, rate_limiter=None, refresh=False,
+                            **kwargs):
+        return {'endpoint': endpoint, **kwargs}
+
+    monkeypatch.setattr(nba_client, 'fetch_nba_data', fake_fetch_nba_data)
+    fetch_requests = [('teamdetails', {'team_id': team_id})
+                      for team_id in range(5)]
+
+    results = list(nba_client.fetch_nba_data_concurrent(fetch_requests,
+                                                        max_workers=3))
+
+    assert sorted(kwargs['team_id'] for _, kwargs, _ in results) == [
+        0, 1, 2, 3, 4]
+    for endpoint, kwargs, response in results:
+        assert response == {'endpoint': endpoint, **kwargs}
+
+
+@pytest.fixture
+def cached_responses(monkeypatch):
+    saved = {}
+
+    def load_cached_response(endpoint, **kwargs):
+        return saved.get((endpoint, tuple(sorted(kwargs.items()))))
+
+    def save_cached_response(response, endpoint, **kwargs):
+        saved[(endpoint, tuple(sorted(kwargs.items())))] = response
+
+    monkeypatch.setattr(nba_client.utils, 'load_cached_response',
+                        load_cached_response)
+    monkeypatch.setattr(nba_client.utils, 'save_cached_response',
+                        save_cached_response)
+    return saved
+
+
+class FakeEndpoint:
+    """Stands in for an nba_api endpoint class."""
+
+    calls = 0
+
+    def __init__(self, **kwargs):
+        FakeEndpoint.calls += 1
+        self.kwargs = kwargs
+
+    def get_dict(self):
+        return {'resultSets': [{'name': 'TeamDetails', 'headers': ['A'],
+                                'rowSet': [[self.kwargs['team_id']]]}]}
+
+
+def test_fetch_nba_data_caches_the_decoded_response(monkeypatch,
+                                                    cached_responses):
+    monkeypatch.setattr(nba_client.endpoints, 'TeamDetails', FakeEndpoint,
+                        raising=False)
+    FakeEndpoint.calls = 0
+
+    first = nba_client.fetch_nba_data('teamdetails', team_id=7)
+    second = nba_client.fetch_nba_data('teamdetails', team_id=7)
+
+    assert FakeEndpoint.calls == 1
+    assert first == second == FakeEndpoint(team_id=7).get_dict()
+    assert list(cached_responses.values()) == [first]
+
+
+def test_fetch_nba_data_decodes_legacy_string_responses(cached_responses):
+    response = {'resultSets': []}
+    key = ('teamdetails', (('team_id', 7),))
+    cached_responses[key] = json.dumps(response)
+
+    assert nba_client.fetch_nba_data('teamdetails', team_id=7) == response
+    assert cached_responses[key] == response
+
+
+class FailingEndpoint:
+    """Stands in for an nba_api endpoint that cannot be reached."""
+
+    calls = 0
+
+    def __init__(self, **kwargs):
+        FailingEndpoint.calls += 1
+        raise requests.exceptions.ConnectionError("unreachable")
+
+
+def test_fetch_nba_data_raises_after_retries(monkeypatch, clock,
+                                             cached_responses):
+    monkeypatch.setattr(nba_client.endpoints, 'TeamDetails',
+                        FailingEndpoint, raising=False)
+    FailingEndpoint.calls = 0
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        nba_client.fetch_nba_data('teamdetails', team_id=7)
+
+    assert FailingEndpoint.calls == nba_client.retry.DEFAULT_MAX_ATTEMPTS
+    assert len(clock.slept) == nba_client.retry.DEFAULT_MAX_ATTEMPTS - 1
+    assert cached_responses == {}
+
+
+def test_fetch_nba_data_concurrent_yields_none_for_failures(monkeypatch,
+                                                            capsys):
+    def fake_fetch_nba_data(endpoint, rate_limiter=None, refresh=False,
+                            **kwargs):
+        if kwargs['team_id'] == 1:
+            raise requests.exceptions.ConnectionError("unreachable")
+        return kwargs
+
+    monkeypatch.setattr(nba_client, 'fetch_nba_data', fake_fetch_nba_data)
+    fetch_requests = [('teamdetails', {'team_id': team_id})
+                      for team_id in range(3)]
+
+    results = {kwargs['team_id']: response for _, kwargs, response
+               in nba_client.fetch_nba_data_concurrent(fetch_requests)}
+
+    assert results == {0: {'team_id': 0}, 1: None, 2: {'team_id': 2}}
+    assert "Failed to fetch NBA data" in capsys.readouterr().out
+
+
+def test_fetch_nba_data_concurrent_reports_when_closed_early(monkeypatch):
+    reports = []
+    rate_limiter = nba_client.RateLimiter()
+    monkeypatch.setattr(rate_limiter, 'report', lambda: reports.append(1))
+    monkeypatch.setattr(nba_client, 'fetch_nba_data',
+                        lambda endpoint, **kwargs: kwargs)
+    fetch_requests = [('teamdetails', {'team_id': team_id})
+                      for team_id in range(3)]
+
+    results = nba_client.fetch_nba_data_concurrent(
+        fetch_requests, rate_limiter=rate_limiter)
+    next(results)
+    results.close()
+
+    assert reports == [1]
+
+
+def test_parse_nba_data_columns_types_columns_and_builds_keys():
+    response = {'resultSets': [{
+        'name': 'PlayerGameLogs',
+        'headers': ['PLAYER_ID', 'TEAM_ID', 'GAME_ID', 'GAME_DATE', 'PTS',
+                    'PLUS_MINUS'],
+        'rowSet': [
+            [1, 10, '0022300001', '2023-10-24T00:00:00', 20, 1.5],
+            [2, 11, '0022300001', None, 7, None],
+        ]}]}
+
+    headers, columns = nba_client.parse_nba_data_columns(
+        json.dumps(response), 'PlayerGameLogs', 'PLAYER_ID', 'GAME_ID')
+
+    assert headers == ['player_id', 'team_id', 'game_id', 'game_date',
+                       'pts', 'plus_minus', 'team_id_game_id',
+                       'player_id_game_id']
+    assert columns[0].dtype == np.int64
+    assert columns[4].tolist() == [20, 7]
+    assert columns[5].tolist() == [1.5, None]
+    assert columns[3].dtype == np.dtype('datetime64[s]')
+    assert np.isnat(columns[3][1])
+    assert columns[6].tolist() == ['10_0022300001', '11_0022300001']
+    assert columns[7].tolist() == ['1_0022300001', '2_0022300001']
+
+
+def test_parse_nba_data_columns_missing_result_set():
+    response = {'resultSets': []}
+
+    assert nba_client.parse_nba_data_columns(response, 'TeamDetails') == (
+        None, None)
@@ -0,0 +1,111 @@
+"""Tests for the compressed response store."""
+
+import json
+
+import pytest
+
+from data_pipeline.utils import response_store
+from data_pipeline.utils.content_hash import hash_payload
+from data_pipeline.utils.response_store import ResponseStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_store.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'responses.sqlite3')
+
+
+def test_put_and_get_round_trip(store_path):
+    store = ResponseStore(store_path)
+    response = {'resultSets': [{'rowSet': [[1, 'a']] * 100}]}
+
+    size = store.put('key', 'endpoint', response)
+
+    assert store.get('key') == response
+    assert 'key' in store
+    assert size == len(json.dumps(response))
+    assert store.bytes_saved > 0
+    assert store.get('missing') is None
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_entries_persist_across_instances(store_path):
+    store = ResponseStore(store_path)
+    store.put('key', 'endpoint', [1, 2, 3])
+    store.close()
+
+    assert ResponseStore(store_path).get('key') == [1, 2, 3]
+
+
+def test_entries_expire_after_ttl(store_path, clock):
+    store = ResponseStore(store_path, ttl_seconds=60)
+    store.put('old', 'endpoint', 'old')
+    clock[0] += 30
+    store.put('new', 'endpoint', 'new')
+    clock[0] += 40
+
+    assert store.get('old') is None
+    assert 'old' not in store
+    assert store.get('new') == 'new'
+
+
+def test_evict_expired_deletes_only_expired_entries(store_path, clock):
+    store = ResponseStore(store_path, ttl_seconds=60)
+    store.put('old', 'endpoint', 'old')
+    clock[0] += 61
+    store.put('new', 'endpoint', 'new')
+
+    assert store.evict_expired() == 1
+    assert 'new' in store
+
+
+def test_oldest_entries_are_evicted_past_max_bytes(store_path, clock):
+    store = ResponseStore(store_path)
+    for index in range(5):
+        clock[0] += 1
+        store.put(f"key{index}", 'endpoint', f"response {index}")
+    entry_bytes = store._total_bytes // 5
+    store.max_bytes = entry_bytes * 3
+
+    clock[0] += 1
+    store.put('key5', 'endpoint', 'response 5')
+
+    assert [f"key{index}" in store for index in range(6)] == [
+        False, False, False, True, True, True]
+    assert store._total_bytes <= store.max_bytes
+
+
+
+def test_content_hash_is_kept_with_the_response(store_path):
+    store = ResponseStore(store_path)
+    store.put('key', 'endpoint', {'a': 1})
+    store.put('changed', 'endpoint', {'a': 2})
+
+    content_hash = store.get_content_hash('key')
+
+    assert content_hash == hash_payload(json.dumps({'a': 1}).encode())
+    assert store.get_content_hash('changed') != content_hash
+    assert store.get_content_hash('missing') is None
+    store.close()
+    assert ResponseStore(store_path).get_content_hash('key') == content_hash
+
+
+def test_content_hash_is_backfilled_for_older_entries(store_path):
+    store = ResponseStore(store_path)
+    store.put('key', 'endpoint', {'a': 1})
+    store._conn.execute("UPDATE responses SET content_hash = NULL")
+    store._conn.commit()
+    store.close()
+
+    store = ResponseStore(store_path)
+    content_hash = store.get_content_hash('key')
+
+    assert content_hash == hash_payload(json.dumps({'a': 1}).encode())
+    store.close()
+    assert ResponseStore(store_path)._index['key'][3] == content_hash
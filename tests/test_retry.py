@@ -0,0 +1,109 @@
+"""Tests for retrying calls with exponential backoff and jitter."""
+
+import asyncio
+
+import pytest
+
+from data_pipeline.utils import retry
+from data_pipeline.utils.retry import TransientError
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def fake_async_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry.time, 'sleep', delays.append)
+    monkeypatch.setattr(retry.asyncio, 'sleep', fake_async_sleep)
+    return delays
+
+
+def failing(errors, result='ok'):
+    """Returns a function that raises the given errors, then returns."""
+    errors = list(errors)
+    calls = []
+
+    def function():
+        calls.append(None)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    function.calls = calls
+    return function
+
+
+@pytest.mark.parametrize('status_code, transient', [
+    (429, True), (500, True), (503, True), (599, True),
+    (400, False), (404, False), (200, False),
+])
+def test_is_transient_status(status_code, transient):
+    assert retry.is_transient_status(status_code) is transient
+
+
+def test_backoff_delay_doubles_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+
+    delays = [retry.get_backoff_delay(attempt, base_delay=1, max_delay=10)
+              for attempt in range(1, 7)]
+
+    assert delays == [1, 2, 4, 8, 10, 10]
+
+
+def test_backoff_delay_is_jittered_from_zero():
+    delays = [retry.get_backoff_delay(3, base_delay=1, max_delay=10)
+              for _ in range(200)]
+
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_call_with_retry_retries_transient_errors(sleeps):
+    function = failing([TransientError(503), TransientError(429)])
+
+    assert retry.call_with_retry(function, base_delay=1) == 'ok'
+    assert len(function.calls) == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+
+
+def test_call_with_retry_raises_once_attempts_run_out(sleeps):
+    function = failing([TransientError(503)] * 5)
+
+    with pytest.raises(TransientError):
+        retry.call_with_retry(function, max_attempts=3)
+    assert len(function.calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_call_with_retry_raises_other_errors_straight_away(sleeps):
+    function = failing([ValueError('bad')])
+
+    with pytest.raises(ValueError):
+        retry.call_with_retry(function)
+    assert len(function.calls) == 1
+    assert sleeps == []
+
+
+def test_call_with_retry_async_retries_then_raises(sleeps):
+    function = failing([TransientError(500)] * 5)
+
+    async def call():
+        return function()
+
+    with pytest.raises(TransientError):
+        asyncio.run(retry.call_with_retry_async(call, max_attempts=2))
+    assert len(function.calls) == 2
+    assert len(sleeps) == 1
+
+
+def test_call_with_retry_async_returns_the_result(sleeps):
+    function = failing([TransientError(500)], result=[1, 2])
+
+    async def call():
+        return function()
+
+    assert asyncio.run(retry.call_with_retry_async(call)) == [1, 2]
+    assert len(function.calls) == 2
@@ -0,0 +1,96 @@
+"""Tests for running pipeline stages in dependency order."""
+
+import threading
+
+import pytest
+
+from data_pipeline.utils import scheduler
+
+
+def stage(function=lambda: None, depends_on=()):
+    return {'function': function, 'depends_on': list(depends_on)}
+
+
+def recording_stages(order, dependencies):
+    """Builds stages that record their name when they run."""
+    return {
+        stage_name: stage(lambda stage_name=stage_name:
+                          order.append(stage_name), depends_on)
+        for stage_name, depends_on in dependencies.items()
+    }
+
+
+def test_stages_run_after_their_dependencies():
+    order = []
+    stages = recording_stages(order, {
+        'indexes': ['game_logs:2021-22', 'game_logs:2022-23'],
+        'game_logs:2021-22': ['teams'],
+        'game_logs:2022-23': ['teams'],
+        'teams': [],
+    })
+
+    durations = scheduler.run_stages(stages, max_workers=2)
+
+    assert set(durations) == set(stages)
+    assert order[0] == 'teams' and order[-1] == 'indexes'
+
+
+def test_independent_stages_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+    stages = {'a': stage(barrier.wait), 'b': stage(barrier.wait)}
+
+    assert set(scheduler.run_stages(stages, max_workers=2)) == {'a', 'b'}
+
+
+def test_failed_stage_skips_only_its_dependents():
+    def fail():
+        raise RuntimeError('boom')
+
+    order = []
+    stages = recording_stages(order, {
+        'teams': [], 'moon': ['teams'], 'view': ['moon'], 'arenas': []})
+    stages['teams']['function'] = fail
+
+    durations = scheduler.run_stages(stages)
+
+    assert set(durations) == {'arenas'}
+    assert order == ['arenas']
+
+
+@pytest.mark.parametrize('stages', [
+    {'a': stage(depends_on=['missing'])},
+    {'a': stage(depends_on=['b']), 'b': stage(depends_on=['a'])},
+])
+def test_unknown_dependencies_and_cycles_are_rejected(stages):
+    with pytest.raises(ValueError):
+        scheduler.run_stages(stages)
+
+
+def test_select_stages_by_name_or_group_drops_other_dependencies():
+    stages = {
+        'teams': stage(),
+        'game_logs:2021-22': stage(depends_on=['teams']),
+        'game_logs:2022-23': stage(depends_on=['teams']),
+        'indexes': stage(depends_on=['game_logs:2021-22',
+                                     'game_logs:2022-23']),
+    }
+
+    selected = scheduler.select_stages(stages, ['game_logs', 'indexes'])
+
+    assert list(selected) == ['game_logs:2021-22', 'game_logs:2022-23',
+                              'indexes']
+    assert selected['game_logs:2021-22']['depends_on'] == []
+    assert selected['indexes']['depends_on'] == ['game_logs:2021-22',
+                                                 'game_logs:2022-23']
+    with pytest.raises(ValueError):
+        scheduler.select_stages(stages, ['unknown'])
+
+
+def test_critical_path_follows_the_slowest_chain():
+    stages = {'a': stage(), 'b': stage(depends_on=['a']),
+              'c': stage(depends_on=['a']), 'd': stage(depends_on=['b', 'c'])}
+    durations = {'a': 1.0, 'b': 5.0, 'c': 2.0, 'd': 1.0}
+
+    assert scheduler.get_critical_path(stages, durations) == (
+        7.0, ['a', 'b', 'd'])
+    assert scheduler.get_critical_path(stages, {}) == (0.0, [])
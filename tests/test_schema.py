@@ -0,0 +1,80 @@
+"""Tests for the database schema definitions."""
+
+import re
+from datetime import date
+
+import pytest
+
+from data_pipeline.database import schema
+
+SCHEMAS_WITH_INDEXES = [
+    table for table in schema.ALL_TABLE_SCHEMAS + schema.ALL_VIEW_SCHEMAS
+    if table.get('indexes')]
+
+
+@pytest.mark.parametrize(
+    'table_schema', SCHEMAS_WITH_INDEXES,
+    ids=lambda table: table.get('table_name', table.get('view_name')))
+def test_indexes_are_idempotent_and_on_their_table(table_schema):
+    table_name = table_schema.get('table_name',
+                                  table_schema.get('view_name'))
+    for index in table_schema['indexes']:
+        creation_sql = ' '.join(index['index_creation_sql'].split())
+        match = re.match(
+            r'CREATE (?:UNIQUE )?INDEX IF NOT EXISTS (\w+) ON (\w+) ',
+            creation_sql)
+
+        assert match is not None, index['index_name']
+        assert match.groups() == (index['index_name'], table_name)
+
+
+def test_get_season_starts_on_the_season_start_date():
+    assert schema.get_season(date(2021, 6, 30)) == '2020-21'
+    assert schema.get_season(date(2021, 7, 1)) == '2021-22'
+    assert schema.get_season(date(1999, 12, 25)) == '1999-00'
+
+
+def test_get_partition_for_list_and_range_layouts():
+    list_table = {'table_name': 'logs',
+                  'partitioning': {'strategy': 'list',
+                                   'column': 'season_year'}}
+    range_table = {'table_name': 'logs',
+                   'partitioning': {'strategy': 'range',
+                                    'column': 'game_date'}}
+
+    assert schema.get_partition(list_table, '2020-21') == (
+        'logs_2020_21', "FOR VALUES IN ('2020-21')")
+    assert schema.get_partition(range_table, '2020-21') == (
+        'logs_2020_21',
+        "FOR VALUES FROM ('2020-07-01') TO ('2021-07-01')")
+
+
+def test_get_conflict_columns():
+    partitioning = schema.PLAYER_GAME_LOGS_TABLE['partitioning']
+    expected = ['player_id_game_id']
+    if partitioning is not None:
+        expected.append(partitioning['column'])
+
+    assert schema.get_conflict_columns(
+        'player_game_logs', 'player_id_game_id') == expected
+    assert schema.get_conflict_columns(
+        'moon_events', 'moon_event_id') == list(
+            schema.MOON_EVENTS_TABLE['unique_key'])
+    assert schema.get_conflict_columns('team_details', 'team_id') == [
+        'team_id']
+    assert schema.get_conflict_columns('unknown', 'id') == ['id']
+
+
+def test_referenced_tables_are_created_first():
+    created = set()
+    for table in schema.ALL_TABLE_SCHEMAS:
+        referenced = set(re.findall(r'REFERENCES (\w+)',
+                                    table['table_creation_sql']))
+
+        assert referenced <= created, table['table_name']
+        created.add(table['table_name'])
+
+
+def test_moon_events_reference_games():
+    assert re.search(r'game_id VARCHAR\(15\) REFERENCES games\b',
+                     schema.MOON_EVENTS_TABLE['table_creation_sql'])